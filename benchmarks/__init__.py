@@ -0,0 +1,37 @@
+'''
+Benchmarks for the customer and order API.
+
+Each module is a script run from the project root against the database
+in DATABASE_URL, for example:
+
+    python -m benchmarks.order_indexes --rows 5000000
+'''
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django() -> None:
+    """
+    Configures Django with the project settings so benchmarks can use
+    the ORM outside of manage.py.
+    """
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'customer_orders.settings')
+    django.setup()
+
+
+@contextmanager
+def timer(label: str, rows: int = None):
+    """
+    Prints the wall time of the wrapped block and, when rows is given,
+    the throughput in rows per second.
+    """
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    line = f'{label}: {elapsed:.3f}s'
+    if rows:
+        line += f' ({rows / elapsed:,.0f} rows/s)'
+    print(line)
@@ -0,0 +1,91 @@
+'''
+Compares the asyncio SMS worker with a stock RQ worker.
+
+Enqueues --messages send_notification jobs on the sms queue of a scratch
+Redis at REDIS_URL and drains them, first with one RQ worker in burst
+mode, then with one AsyncSmsWorker process, both against the stub
+gateway. With gateway latency the RQ worker is bound to one message per
+round trip while the async worker overlaps up to --concurrency of them:
+
+    REDIS_URL=redis://localhost:6379 python -m benchmarks.async_worker \\
+        --messages 2000 --latency-ms 50 --concurrency 200
+
+The rate limiter is lifted for the run; the dedupe keys of the run are
+deleted afterwards.
+'''
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from benchmarks import setup_django, stub_gateway
+
+QUEUE = 'sms'
+
+
+def enqueue(queue, send_notification, messages: int, run: str) -> None:
+    from rq import Queue
+
+    for start in range(0, messages, 1000):
+        queue.enqueue_many([
+            Queue.prepare_data(
+                send_notification,
+                args=(f'benchmark:{run}:{i}', f'+2547{i:08d}',
+                      f'Order for item {i} at Kshs 100 Created'))
+            for i in range(start, min(start + 1000, messages))])
+
+
+def report(label: str, messages: int, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {elapsed:.3f}s ({messages / elapsed:,.0f} messages/s)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    server = stub_gateway.start(latency_ms=args.latency_ms)
+    os.environ['SMS_GATEWAY_URL'] = server.url
+    os.environ['SMS_RATE_LIMIT'] = '1000000'
+    os.environ['SMS_RATE_BURST'] = '1000000'
+    setup_django()
+    import django_rq
+    from rq import SimpleWorker
+
+    from customer_orders_app.async_worker import AsyncSmsWorker
+    from customer_orders_app.delivery import send_notification
+
+    queue = django_rq.get_queue(QUEUE)
+    connection = queue.connection
+    run = uuid.uuid4().hex
+
+    enqueue(queue, send_notification, args.messages, f'{run}:rq')
+    start = time.perf_counter()
+    SimpleWorker([queue], connection=connection).work(burst=True)
+    report('rq worker', args.messages, start)
+
+    enqueue(queue, send_notification, args.messages, f'{run}:async')
+    start = time.perf_counter()
+    worker = AsyncSmsWorker(
+        QUEUE, concurrency=args.concurrency, threads=args.threads,
+        burst=True)
+    asyncio.run(worker.run())
+    report(
+        f'async worker (concurrency {args.concurrency})',
+        args.messages, start)
+
+    print(f'gateway requests: {server.requests:,}, '
+          f'async failures: {worker.failed}')
+    keys = list(connection.scan_iter(f'sms:dedupe:benchmark:{run}:*'))
+    if keys:
+        connection.delete(*keys)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+Compares creating orders one request at a time through add-order/ with
+creating them in batches through bulk-add-orders/.
+
+Requests go through the Django test client against the database in
+DATABASE_URL, so the numbers cover routing, validation, the queries and
+the SMS outbox writes but not the network; no Redis is needed. The
+benchmark customers, their orders and notifications are deleted
+afterwards:
+
+    python -m benchmarks.bulk_orders --orders 2000 --batch 500
+'''
+import argparse
+from unittest.mock import patch
+
+from benchmarks import setup_django, timer
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+
+from customer_orders_app.models import (  # noqa: E402
+    Customer, Order, OrderNotification)
+
+
+def single(client, customers: list, orders: int) -> int:
+    url = reverse('add-order')
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(orders):
+            response = client.post(url, {
+                'customer_id': str(customers[i % len(customers)].id),
+                'item': f'item {i}', 'amount': i}, format='json')
+            assert response.status_code == 201, response.data
+    return len(queries)
+
+
+def bulk(client, customers: list, orders: int, batch: int) -> int:
+    url = reverse('bulk-add-orders')
+    with CaptureQueriesContext(connection) as queries:
+        for start in range(0, orders, batch):
+            data = [
+                {'customer_id': str(customers[i % len(customers)].id),
+                 'item': f'item {i}', 'amount': i}
+                for i in range(start, min(start + batch, orders))
+            ]
+            response = client.post(url, data, format='json')
+            assert response.status_code == 201, response.data
+    return len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--customers', type=int, default=100)
+    args = parser.parse_args()
+
+    customers = [
+        Customer.objects.create(
+            name=f'bench {i}', phone_number=f'+2547{i:08d}')
+        for i in range(args.customers)
+    ]
+    user, _ = User.objects.get_or_create(username='benchmark')
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    # the per user rate limit would stop the benchmark part way
+    throttles = patch.object(APIView, 'get_throttles', return_value=[])
+    throttles.start()
+    try:
+        with timer('add-order/ one at a time', args.orders):
+            queries = single(client, customers, args.orders)
+        print(f'    {queries} queries')
+        with timer(f'bulk-add-orders/ batches of {args.batch}', args.orders):
+            queries = bulk(client, customers, args.orders, args.batch)
+        print(f'    {queries} queries')
+    finally:
+        throttles.stop()
+        OrderNotification.objects.filter(
+            order_id__in=Order.objects.filter(
+                customer__in=customers).values('id')).delete()
+        Customer.objects.filter(
+            id__in=[customer.id for customer in customers]).delete()
+
+
+if __name__ == '__main__':
+    main()
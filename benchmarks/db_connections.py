@@ -0,0 +1,88 @@
+'''
+Load test of a cheap endpoint, to compare database connection settings.
+
+Creates an order and an API token, then sends --requests GET requests
+for the order to view-order/ on a running server, --concurrency at a
+time, and reports throughput and latency (p50, p99). Run it against the
+server started with each setting to compare, with throttling raised out
+of the way, for example:
+
+    THROTTLE_USER_RATE=1000000/min THROTTLE_ORDER_READS_RATE=1000000/min \\
+        DB_CONN_MAX_AGE=0 gunicorn customer_orders.wsgi
+    python -m benchmarks.db_connections --label no-reuse
+
+and again with DB_CONN_MAX_AGE=60, then DB_POOL_SIZE=4 (under uvicorn
+too, with GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker).
+'''
+import argparse
+import asyncio
+import time
+import uuid
+
+from benchmarks import setup_django
+
+setup_django()
+
+import httpx  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from customer_orders_app.models import Customer, Order  # noqa: E402
+
+
+async def load(url: str, params: dict, headers: dict,
+               requests: int, concurrency: int) -> list:
+    timings = []
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(headers=headers, limits=limits) as client:
+        async def send():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(url, params=params)
+                timings.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.status_code
+
+        await asyncio.gather(*(send() for _ in range(concurrency)))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://localhost:8000/api/')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--label', default='')
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex}')
+    token = Token.objects.create(user=user)
+    customer = Customer.objects.create(
+        name='Bench', phone_number='+254700000000')
+    order = Order.objects.create(customer=customer, item='pen', amount=10)
+    try:
+        # one round to open connections on both sides
+        asyncio.run(load(
+            f'{args.url}view-order/', {'order_id': str(order.id)},
+            {'Authorization': f'Token {token.key}'},
+            args.concurrency, args.concurrency))
+        start = time.perf_counter()
+        timings = asyncio.run(load(
+            f'{args.url}view-order/', {'order_id': str(order.id)},
+            {'Authorization': f'Token {token.key}'},
+            args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+    finally:
+        customer.delete()
+        user.delete()
+
+    timings.sort()
+    print(f'{args.label or args.url}: '
+          f'{args.requests / elapsed:,.0f} requests/s, '
+          f'p50 {timings[len(timings) // 2]:.2f} ms, '
+          f'p99 {timings[int(len(timings) * 0.99)]:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Measures the throughput and memory of the streaming order export.
+
+Exports every order with the export-orders/ code path and compares it
+with loading the same orders into a list through select_related, which
+is what a non-streaming export would do. Each export runs twice: once
+timed, once under tracemalloc for its peak memory, which covers Python
+objects but not the database driver's own buffers. With --seed, orders are first added (in bulk, to benchmark
+customers that are deleted afterwards) until the table holds that many:
+
+    python -m benchmarks.export_orders --seed 200000 --output csv
+'''
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import setup_django
+
+setup_django()
+
+from customer_orders_app import exporter  # noqa: E402
+from customer_orders_app.models import Customer, Order  # noqa: E402
+
+BATCH = 10_000
+
+
+def seed(rows: int) -> None:
+    missing = rows - Order.objects.count()
+    if missing <= 0:
+        return
+    customers = Customer.objects.bulk_create(
+        Customer(name=f'export {i}', phone_number=f'+2547{i:08d}')
+        for i in range(100))
+    for start in range(0, missing, BATCH):
+        Order.objects.bulk_create(
+            Order(customer=customers[i % len(customers)],
+                  item=f'item {i % 100}', amount=i % 10_000)
+            for i in range(start, min(start + BATCH, missing)))
+
+
+def measure(label: str, export) -> None:
+    start = time.perf_counter()
+    rows, size = export()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    export()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{label}: {rows:,} rows in {elapsed:.3f}s '
+          f'({rows / elapsed:,.0f} rows/s, {size / 1e6:,.1f} MB written, '
+          f'peak {peak / 1e6:,.1f} MB)')
+
+
+def streaming(output: str):
+    def export():
+        rows = size = 0
+        for line in exporter.RENDERERS[output](exporter.export_rows()):
+            rows += 1
+            size += len(line)
+        if output == 'csv':
+            rows -= 1    # header
+        return rows, size
+    return export
+
+
+def buffered(output: str):
+    def export():
+        orders = list(Order.objects.select_related('customer').order_by(
+            'created_at', 'id'))
+        values = [
+            (order.id, order.item, order.amount, order.created_at,
+             order.customer_id, order.customer.name,
+             order.customer.phone_number)
+            for order in orders]
+        body = ''.join(exporter.RENDERERS[output](values))
+        return len(orders), len(body)
+    return export
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', choices=sorted(exporter.RENDERERS), default='ndjson')
+    args = parser.parse_args()
+
+    try:
+        seed(args.seed)
+        measure('streaming', streaming(args.output))
+        measure('buffered', buffered(args.output))
+    finally:
+        Customer.objects.filter(name__startswith='export ').delete()
+
+
+if __name__ == '__main__':
+    main()
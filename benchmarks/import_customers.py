@@ -0,0 +1,57 @@
+'''
+Measures customer import throughput.
+
+Generates --rows customers as CSV, a share of them with invalid or
+repeated phone numbers, imports them with the import_customers code path
+(COPY on PostgreSQL, bulk_create elsewhere) and prints the report. The
+imported customers are deleted afterwards:
+
+    python -m benchmarks.import_customers --rows 50000
+'''
+import argparse
+import csv
+import io
+import json
+
+from benchmarks import setup_django
+
+setup_django()
+
+from customer_orders_app.importer import import_customers  # noqa: E402
+from customer_orders_app.models import Customer  # noqa: E402
+
+
+def generate(rows: int) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['name', 'phone_number'])
+    for i in range(rows):
+        if i % 100 == 1:
+            phone_number = '0700'            # rejected
+        elif i % 100 == 2:
+            phone_number = f'+2547{i - 2:08d}'  # repeats an earlier row
+        else:
+            phone_number = f'+2547{i:08d}'
+        writer.writerow([f'import {i}', phone_number])
+    buffer.seek(0)
+    return buffer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    stream = generate(args.rows)
+    try:
+        report = import_customers(stream, 'csv', batch_size=args.batch_size)
+        print(json.dumps({
+            key: value for key, value in report.as_dict().items()
+            if key != 'rejects'}, indent=2))
+    finally:
+        Customer.objects.filter(name__startswith='import ').delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+'''
+Compares the query plans of the order access patterns with and without
+the indexes added in migration 0004_order_access_indexes.
+
+Needs PostgreSQL. Seeds the tables with generate_series when they hold
+fewer rows than asked for, then runs EXPLAIN ANALYZE on each query with
+the indexes in place and again inside a transaction that drops them and
+is rolled back, so the database is left untouched:
+
+    python -m benchmarks.order_indexes --rows 5000000 --customers 50000
+'''
+import argparse
+import json
+
+from benchmarks import setup_django, timer
+
+setup_django()
+
+from django.db import connection, transaction  # noqa: E402
+
+from customer_orders_app.models import Customer, Order  # noqa: E402
+from customer_orders_app.pagination import KeysetPagination  # noqa: E402
+
+INDEXES = [
+    'customer_created_idx',
+    'order_customer_created_idx',
+    'order_created_id_idx',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+def seed(customers: int, rows: int) -> None:
+    """
+    Fills the customer and order tables up to the requested sizes.
+    """
+    customer_table = Customer._meta.db_table
+    order_table = Order._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {customer_table}')
+        missing = customers - cursor.fetchone()[0]
+        if missing > 0:
+            with timer('seed customers', missing):
+                cursor.execute(f'''
+                    INSERT INTO {customer_table}
+                        (id, created_at, updated_at, name, phone_number,
+                         order_count, total_amount)
+                    SELECT md5(random()::text || g)::uuid,
+                           now() - random() * interval '730 days',
+                           now(),
+                           'bench ' || g,
+                           '+2547' || lpad(g::text, 8, '0'),
+                           0, 0
+                    FROM generate_series(1, %s) g
+                    ON CONFLICT DO NOTHING''', [missing])
+
+        cursor.execute(f'SELECT count(*) FROM {order_table}')
+        missing = rows - cursor.fetchone()[0]
+        if missing > 0:
+            with timer('seed orders', missing):
+                cursor.execute(f'''
+                    WITH c AS (SELECT array_agg(id) AS ids
+                               FROM {customer_table})
+                    INSERT INTO {order_table}
+                        (id, created_at, updated_at, item, amount,
+                         customer_id)
+                    SELECT md5(random()::text || g)::uuid,
+                           now() - random() * interval '730 days',
+                           now(),
+                           'item ' || (g %% 100),
+                           (random() * 10000)::numeric(10, 2),
+                           c.ids[1 + g %% array_length(c.ids, 1)]
+                    FROM generate_series(1, %s) g, c''', [missing])
+        with timer('analyze'):
+            cursor.execute(f'ANALYZE {customer_table}')
+            cursor.execute(f'ANALYZE {order_table}')
+
+
+def access_patterns() -> dict:
+    """
+    Returns the querysets the API runs, keyed by a short description.
+    """
+    orders = Order.objects.select_related('customer')
+    customer_id = Customer.objects.values_list('id', flat=True).first()
+    middle = Order.objects.order_by('created_at', 'id')[
+        Order.objects.count() // 2]
+
+    keyset = KeysetPagination()
+    keyset.reverse = False
+    return {
+        'get-orders first page': orders.order_by('created_at')[:10],
+        'get-orders keyset deep page': orders.order_by(
+            'created_at', 'id').filter(
+                keyset.after(middle.created_at, middle.id))[:11],
+        'view-order by customer': Order.objects.filter(
+            customer_id=customer_id),
+        'get-customers first page': Customer.objects.all()[:10],
+    }
+
+
+def explain(queryset) -> dict:
+    """
+    Runs EXPLAIN ANALYZE on the queryset and returns the plan node types
+    and the execution time.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    nodes = []
+
+    def walk(node):
+        name = node['Node Type']
+        if 'Index Name' in node:
+            name += f" ({node['Index Name']})"
+        nodes.append(name)
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return {'nodes': nodes, 'ms': plan[0]['Execution Time']}
+
+
+def report(label: str, patterns: dict) -> None:
+    print(f'\n== {label}')
+    for name, queryset in patterns.items():
+        result = explain(queryset)
+        print(f"{name}: {result['ms']:.2f} ms")
+        print('    ' + ' -> '.join(result['nodes']))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--customers', type=int, default=50_000)
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        raise SystemExit('This benchmark needs a PostgreSQL DATABASE_URL')
+
+    seed(args.customers, args.rows)
+    patterns = access_patterns()
+    report('with indexes', patterns)
+
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for index in INDEXES:
+                    cursor.execute(f'DROP INDEX IF EXISTS {index}')
+            report('without indexes', patterns)
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Compares the per-request cost of the session engines.
+
+Sends --requests requests through the session and authentication
+middleware to a view using SessionAuthentication, once per session
+engine, and reports queries and latency (mean, p50, p99) per request.
+Every engine still loads the user, one query per request. With --write
+each request also changes the session, as a login or an expiry refresh
+does. Run it with REDIS_URL set to measure the cache the engines use:
+
+    REDIS_URL=redis://localhost:6379 python -m benchmarks.sessions
+'''
+import argparse
+import statistics
+import time
+import uuid
+from importlib import import_module
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.middleware import (  # noqa: E402
+    AuthenticationMiddleware)
+from django.contrib.auth.models import User  # noqa: E402
+from django.contrib.sessions.middleware import SessionMiddleware  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.authentication import SessionAuthentication  # noqa: E402
+from rest_framework.response import Response  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+
+
+class WhoAmI(APIView):
+    authentication_classes = [SessionAuthentication]
+    throttle_classes = []
+
+    def get(self, request):
+        if request.GET.get('write'):
+            request.session['seen'] = time.time()
+        return Response({'user': request.user.pk})
+
+
+def run(name: str, user, requests: int, write: bool) -> None:
+    with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[name]):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session['_auth_user_id'] = str(user.pk)
+        session['_auth_user_backend'] = (
+            'django.contrib.auth.backends.ModelBackend')
+        session['_auth_user_hash'] = user.get_session_auth_hash()
+        session.create()
+
+        handler = SessionMiddleware(AuthenticationMiddleware(WhoAmI.as_view()))
+        factory = APIRequestFactory()
+        path = '/?write=1' if write else '/'
+        factory.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        # the first request fills the cache of cached_db
+        handler(factory.get(path)).render()
+
+        timings = []
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    response = handler(factory.get(path))
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+                    assert response.status_code == 200, response.status_code
+        finally:
+            session.delete()
+
+    timings.sort()
+    print(f'{name}: '
+          f'{len(queries) / requests:.2f} queries/request, '
+          f'mean {statistics.fmean(timings):.3f} ms, '
+          f'p50 {timings[len(timings) // 2]:.3f} ms, '
+          f'p99 {timings[int(len(timings) * 0.99)]:.3f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument(
+        '--write', action='store_true',
+        help='Change the session on every request')
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex}')
+    try:
+        for name in settings.SESSION_ENGINES:
+            run(name, user, args.requests, args.write)
+    finally:
+        user.delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+'''
+Measures SMS sending throughput of one worker against the stub gateway.
+
+Sends --messages messages in a loop, as a single RQ worker does, first
+with a new connection per message (a bare requests.post, as send_sms
+used to), then through send_sms and its pooled session, and finally as
+one batch through the batcher, where orders sharing one of --distinct
+message texts go out in multi-recipient requests. The stub speaks plain
+HTTP, so the gaps understate the real ones, where every new connection
+also pays a TLS handshake:
+
+    python -m benchmarks.sms_throughput --messages 2000 --latency-ms 5
+'''
+import argparse
+import os
+import time
+
+import requests
+
+from benchmarks import setup_django, stub_gateway
+
+
+def unpooled(url: str, messages: int) -> None:
+    for i in range(messages):
+        requests.post(url, data={
+            'username': 'sandbox', 'to': '+254701036054',
+            'message': f'Order for item {i} at Kshs {i} Created',
+            'from': '44121'})
+
+
+def pooled(sms_sender, messages: int) -> int:
+    failed = 0
+    for i in range(messages):
+        result = sms_sender.send_sms(
+            '+254701036054', {'item': f'item {i}', 'amount': i})
+        failed += not result.ok
+    return failed
+
+
+def batched(sms_batcher, messages: int, distinct: int) -> int:
+    statuses = sms_batcher.send_batch([
+        {'order_id': str(i), 'to': f'+2547{i:08d}',
+         'message': f'Order for item {i % distinct} at Kshs 100 Created'}
+        for i in range(messages)])
+    return sum(not status['ok'] for status in statuses.values())
+
+
+def report(label: str, messages: int, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {elapsed:.3f}s ({messages / elapsed:,.0f} messages/s)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--distinct', type=int, default=10)
+    args = parser.parse_args()
+
+    server = stub_gateway.start(
+        latency_ms=args.latency_ms, fail_rate=args.fail_rate)
+    os.environ['SMS_GATEWAY_URL'] = server.url
+    os.environ.setdefault('SMS_BACKOFF_BASE', '0.01')
+    setup_django()
+    from customer_orders_app import sms_batcher, sms_sender
+
+    start = time.perf_counter()
+    unpooled(server.url, args.messages)
+    report('new connection per message', args.messages, start)
+
+    start = time.perf_counter()
+    failed = pooled(sms_sender, args.messages)
+    report('pooled session (send_sms)', args.messages, start)
+
+    requests_before = server.requests
+    start = time.perf_counter()
+    failed += batched(sms_batcher, args.messages, args.distinct)
+    report('batched (send_batch)', args.messages, start)
+    print(f'batched requests: {server.requests - requests_before:,}')
+    print(f'gateway requests: {server.requests:,}, failed sends: {failed}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+A local stand-in for the Africa's Talking messaging API.
+
+Answers every POST with a success response in the gateway's format,
+optionally after a delay and with a share of 503s, so the SMS code can
+be exercised and benchmarked offline. Point the workers at it with
+SMS_GATEWAY_URL:
+
+    python -m benchmarks.stub_gateway --port 8025 --latency-ms 20
+    SMS_GATEWAY_URL=http://127.0.0.1:8025/version1/messaging python manage.py rqworker
+'''
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    # keep-alive, like the real gateway; without TCP_NODELAY the body,
+    # written after the headers, waits for the client's delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if random.random() < server.fail_rate:
+            self.reply(503, {'error': 'Service Unavailable'})
+            return
+        numbers = form.get('to', [''])[0].split(',')
+        self.reply(201, {'SMSMessageData': {
+            'Message': f'Sent to {len(numbers)}/{len(numbers)}',
+            'Recipients': [
+                {'number': number, 'status': 'Success', 'statusCode': 101,
+                 'cost': 'KES 0.8000', 'messageId': f'ATXid_stub_{i}'}
+                for i, number in enumerate(numbers)]}})
+
+    def reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port: int = 0, latency_ms: float = 0,
+          fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Starts the stub gateway in a background thread.
+
+    Args:
+        port: The port to listen on; 0 picks a free one.
+        latency_ms: How long each response is delayed.
+        fail_rate: The share of requests answered with 503.
+
+    Returns:
+        The running server; its url attribute is the messaging URL.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), GatewayHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.fail_rate = fail_rate
+    server.requests = 0
+    server.lock = threading.Lock()
+    server.url = (
+        f'http://127.0.0.1:{server.server_address[1]}/version1/messaging')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = start(args.port, args.latency_ms, args.fail_rate)
+    print(f'Stub gateway listening on {server.url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
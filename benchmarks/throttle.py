@@ -0,0 +1,120 @@
+'''
+Measures the per-request overhead of the configured throttles.
+
+Runs --requests throttle checks, the way a view checks every class in
+DEFAULT_THROTTLE_CLASSES, for an anonymous GET, an authenticated GET and
+an authenticated POST to a view with an order-writes scope. Each case
+is timed with DRF's cache based AnonRateThrottle and UserRateThrottle
+and with the configured throttles, reporting the time per request
+(mean, p50, p99) and, for the configured throttles, the Redis commands
+each request sends. Point REDIS_URL at the Redis the API uses to include
+the network round trips:
+
+    REDIS_URL=redis://localhost:6379 python -m benchmarks.throttle
+'''
+import argparse
+import statistics
+import time
+import uuid
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.settings import api_settings  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.throttling import (  # noqa: E402
+    AnonRateThrottle, UserRateThrottle)
+
+from customer_orders_app import throttling  # noqa: E402
+from customer_orders_app.redis_client import get_client  # noqa: E402
+
+# a rate no benchmark reaches, so every check admits the request
+RATE = '1000000/h'
+
+
+class BenchUser(AnonymousUser):
+    is_authenticated = True
+
+    def __init__(self):
+        self.pk = f'bench-{uuid.uuid4().hex}'
+
+
+class View:
+    throttle_scopes = {'POST': 'order-writes'}
+
+
+class RedisCommands:
+    """
+    Counts the commands sent through the request Redis client.
+    """
+
+    def __init__(self, client):
+        self.count = 0
+        self.execute_command = client.execute_command
+        client.execute_command = self
+
+    def __call__(self, *args, **options):
+        self.count += 1
+        return self.execute_command(*args, **options)
+
+
+def request_for(method: str, user) -> Request:
+    request = Request(getattr(APIRequestFactory(), method)('/'))
+    request.user = user
+    return request
+
+
+def run(label, throttle_classes, request, requests, commands=None) -> None:
+    timings = []
+    sent = commands.count if commands else 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        # like APIView.check_throttles, every throttle is checked
+        throttles = [throttle() for throttle in throttle_classes]
+        assert all([
+            throttle.allow_request(request, View())
+            for throttle in throttles])
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    line = (f'{label}: mean {statistics.fmean(timings):.0f} us, '
+            f'p50 {timings[len(timings) // 2]:.0f} us, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.0f} us')
+    if commands:
+        line += f', Redis commands {(commands.count - sent) / requests:g}'
+    print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    # an hour's worth at the default user rate
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    drf = [
+        type(throttle.__name__, (throttle,), {'rate': RATE})
+        for throttle in (AnonRateThrottle, UserRateThrottle)]
+    rates = dict.fromkeys(api_settings.DEFAULT_THROTTLE_RATES, RATE)
+    # fail loudly rather than time the cache fallback
+    throttling.take([('throttle:bench:warmup', 1, 1)])
+    commands = RedisCommands(get_client())
+
+    with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+        configured = api_settings.DEFAULT_THROTTLE_CLASSES
+        for case, method, user in [
+                ('anonymous GET', 'get', AnonymousUser()),
+                ('user GET', 'get', BenchUser()),
+                ('user POST, order-writes', 'post', BenchUser())]:
+            request = request_for(method, user)
+            run(f'{case}, DRF cache', drf, request, args.requests)
+            run(f'{case}, configured', configured, request, args.requests,
+                commands)
+
+
+if __name__ == '__main__':
+    main()
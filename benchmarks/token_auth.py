@@ -0,0 +1,110 @@
+'''
+Compares the per-request cost of the API's authentication classes.
+
+Sends --requests authenticated requests to a view that does nothing
+else, with DRF's SessionAuthentication and TokenAuthentication, the
+cached token class and stateless JWTs, and reports queries and latency
+(mean, p50, p99) per request. Run it with REDIS_URL set to measure the
+caches the API uses; without it the cache is in-process memory:
+
+    python -m benchmarks.token_auth --requests 2000
+'''
+import argparse
+import statistics
+import time
+import uuid
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.contrib.auth import get_user  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.contrib.sessions.backends.db import SessionStore  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils.functional import SimpleLazyObject  # noqa: E402
+from rest_framework.authentication import (  # noqa: E402
+    SessionAuthentication, TokenAuthentication)
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.response import Response  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+from rest_framework_simplejwt.authentication import (  # noqa: E402
+    JWTStatelessUserAuthentication)
+
+from customer_orders_app.authentication import (  # noqa: E402
+    CachedTokenAuthentication)
+from customer_orders_app.jwt_auth import RefreshToken  # noqa: E402
+
+
+class WhoAmI(APIView):
+    throttle_classes = []
+
+    def get(self, request):
+        return Response({'user': request.user.pk})
+
+
+def session_request(factory, session_key: str):
+    """
+    Builds a request carrying a session, as the session and
+    authentication middleware would.
+    """
+    request = factory.get('/')
+    request.session = SessionStore(session_key)
+    request.user = SimpleLazyObject(lambda: get_user(request))
+    return request
+
+
+def run(authentication, make_request, requests: int) -> None:
+    view = WhoAmI.as_view(authentication_classes=[authentication])
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = view(make_request())
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+    timings.sort()
+    print(f'{authentication.__name__}: '
+          f'{len(queries) / requests:.2f} queries/request, '
+          f'mean {statistics.fmean(timings):.3f} ms, '
+          f'p50 {timings[len(timings) // 2]:.3f} ms, '
+          f'p99 {timings[int(len(timings) * 0.99)]:.3f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    factory = APIRequestFactory()
+    user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex}')
+    token = Token.objects.create(user=user)
+    access = str(RefreshToken.for_user(user).access_token)
+    session = SessionStore()
+    session['_auth_user_id'] = str(user.pk)
+    session['_auth_user_backend'] = 'django.contrib.auth.backends.ModelBackend'
+    session['_auth_user_hash'] = user.get_session_auth_hash()
+    session.create()
+
+    def with_header(value):
+        return lambda: factory.get('/', HTTP_AUTHORIZATION=value)
+
+    try:
+        run(SessionAuthentication,
+            lambda: session_request(factory, session.session_key),
+            args.requests)
+        run(TokenAuthentication, with_header(f'Token {token.key}'),
+            args.requests)
+        run(CachedTokenAuthentication, with_header(f'Token {token.key}'),
+            args.requests)
+        run(JWTStatelessUserAuthentication, with_header(f'Bearer {access}'),
+            args.requests)
+    finally:
+        session.delete()
+        user.delete()
+
+
+if __name__ == '__main__':
+    main()
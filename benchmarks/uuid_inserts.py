@@ -0,0 +1,84 @@
+'''
+Compares insert throughput of random (version 4) and time ordered
+(version 7) primary keys.
+
+Each run inserts --rows orders in batches into a fresh temporary table
+with a uuid primary key and a customer_id index, the same shape as the
+order table, and prints rows/s and, on PostgreSQL, the size of the two
+indexes afterwards:
+
+    python -m benchmarks.uuid_inserts --rows 1000000
+'''
+import argparse
+import random
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks import setup_django, timer
+
+setup_django()
+
+from django.db import connection, transaction  # noqa: E402
+
+from customer_orders_app.ids import uuid7  # noqa: E402
+
+GENERATORS = {'v4': uuid.uuid4, 'v7': uuid7}
+
+
+def run(version: str, rows: int, customers: int, batch: int) -> None:
+    make_id = GENERATORS[version]
+    table = f'bench_orders_{version}'
+    uuid_type = 'uuid' if connection.vendor == 'postgresql' else 'char(32)'
+    customer_ids = [make_id() for _ in range(customers)]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute(f'''
+            CREATE TABLE {table} (
+                id {uuid_type} PRIMARY KEY,
+                created_at timestamp NOT NULL,
+                updated_at timestamp NOT NULL,
+                item varchar(50) NOT NULL,
+                amount numeric(10, 2) NOT NULL,
+                customer_id {uuid_type} NOT NULL)''')
+        cursor.execute(
+            f'CREATE INDEX {table}_customer ON {table} (customer_id)')
+
+        sql = (
+            f'INSERT INTO {table} '
+            '(id, created_at, updated_at, item, amount, customer_id) '
+            'VALUES (%s, %s, %s, %s, %s, %s)')
+        with timer(f'{version} insert', rows):
+            for start in range(0, rows, batch):
+                now = datetime.now(timezone.utc)
+                values = [
+                    (str(make_id()), now, now, 'item', 100,
+                     str(random.choice(customer_ids)))
+                    for _ in range(min(batch, rows - start))
+                ]
+                with transaction.atomic():
+                    cursor.executemany(sql, values)
+
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT pg_size_pretty(pg_relation_size(%s)), '
+                'pg_size_pretty(pg_relation_size(%s))',
+                [f'{table}_pkey', f'{table}_customer'])
+            pkey, fk = cursor.fetchone()
+            print(f'{version} index sizes: pkey {pkey}, customer_id {fk}')
+        cursor.execute(f'DROP TABLE {table}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=50_000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    for version in GENERATORS:
+        run(version, args.rows, args.customers, args.batch)
+
+
+if __name__ == '__main__':
+    main()
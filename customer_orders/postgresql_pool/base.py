@@ -0,0 +1,168 @@
+'''
+PostgreSQL backend that reuses connections from a pool in each process.
+
+Django opens a connection per thread and, unless CONN_MAX_AGE keeps it,
+closes it at the end of every request; under uvicorn requests do not
+keep to a thread, so connections cannot be kept. This backend takes
+connections from a pool shared by the threads of the process instead,
+and closing one puts it back, rolled back if a transaction was left
+open. It is configured like Django 5.1's pool, with OPTIONS['pool']:
+
+    max_size: the most connections the process opens (default 4)
+    timeout: seconds to wait for a free connection (default 10)
+
+With CONN_HEALTH_CHECKS, a connection that sat in the pool is checked
+with a query before it is handed out.
+'''
+import os
+import threading
+from collections import deque
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+
+# libpq's PQtransactionStatus values, the same with psycopg 2 and 3
+IDLE, UNKNOWN = 0, 4
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class Pool:
+    """
+    At most max_size connections, handed out to one thread at a time.
+    """
+
+    def __init__(self, max_size: int = 4, timeout: float = 10):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = deque()
+        self.slots = threading.BoundedSemaphore(max_size)
+
+    def take(self, connect, check=None):
+        """
+        Hands out an idle connection, or a new one while the pool has
+        fewer than max_size.
+
+        Args:
+            connect: Opens a new connection.
+            check: Returns whether an idle connection still works.
+
+        Returns:
+            A connection, to be put back with give_back.
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise base.Database.OperationalError(
+                f'No database connection was free within {self.timeout}s')
+        try:
+            while self.idle:
+                # the most recently used connection is the likeliest to work
+                connection = self.idle.pop()
+                if check is None or check(connection):
+                    return connection
+                self._discard(connection)
+            return connect()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def give_back(self, connection, discard: bool = False) -> None:
+        """
+        Puts a connection back in the pool, or closes it if it is broken
+        or discard is set.
+        """
+        try:
+            if discard or connection.closed:
+                self._discard(connection)
+                return
+            status = connection.info.transaction_status
+            if status == UNKNOWN:
+                self._discard(connection)
+                return
+            if status != IDLE:
+                try:
+                    connection.rollback()
+                except base.Database.Error:
+                    self._discard(connection)
+                    return
+            self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def close_idle(self) -> None:
+        """
+        Closes the connections waiting in the pool.
+        """
+        while self.idle:
+            self._discard(self.idle.pop())
+
+    @staticmethod
+    def _discard(connection) -> None:
+        try:
+            connection.close()
+        except base.Database.Error:
+            pass
+
+
+def is_usable(connection) -> bool:
+    """
+    Runs a trivial query on a connection, leaving it outside of a
+    transaction.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if connection.info.transaction_status != IDLE:
+            connection.rollback()
+        return True
+    except base.Database.Error:
+        return False
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # PostgreSQL will not drop a database with open connections
+        for key, pool in list(_pools.items()):
+            if key[0] == self.connection.alias:
+                pool.close_idle()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    connection_pool = None
+
+    def get_pool(self, conn_params) -> Pool:
+        # keyed by process, so a forked worker never shares the
+        # connections of its parent, and by database, as the test runner
+        # switches NAME to the test database
+        key = (self.alias, os.getpid(), *(
+            conn_params.get(param)
+            for param in ('dbname', 'host', 'port', 'user')))
+        try:
+            return _pools[key]
+        except KeyError:
+            with _pools_lock:
+                if key not in _pools:
+                    _pools[key] = Pool(
+                        **self.settings_dict['OPTIONS'].get('pool', {}))
+                return _pools[key]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        check = is_usable if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        self.connection_pool = self.get_pool(conn_params)
+        return self.connection_pool.take(
+            partial(super().get_new_connection, conn_params), check)
+
+    def _close(self):
+        if self.connection is not None:
+            # closed inside atomic() the connection stays referenced here,
+            # so it must not be handed to another thread
+            self.connection_pool.give_back(
+                self.connection, discard=self.in_atomic_block)
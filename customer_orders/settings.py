@@ -16,6 +16,7 @@ import os
 from dotenv import load_dotenv
 import dj_database_url
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -69,6 +70,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'customer_orders_app.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -113,17 +115,197 @@ else:
 	"default": dj_database_url.parse(os.environ.get("DATABASE_URL"))
 }
 
+# Read replicas of the primary, as comma separated database URLs, named
+# replica1, replica2, ... GETs to the customer and order list and detail
+# endpoints read from a replica lagging less than REPLICA_MAX_LAG seconds,
+# checked every REPLICA_LAG_CHECK seconds per process. A user who writes
+# reads from the primary for REPLICA_PIN_SECONDS afterwards; the pin is
+# kept in the default cache, so it spans processes only with REDIS_URL.
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(
+        None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASE_REPLICAS.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = {
+        **dj_database_url.parse(url.strip()),
+        # tests read the test database through the replicas
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 2))
+REPLICA_LAG_CHECK = float(os.environ.get('REPLICA_LAG_CHECK', 1))
+REPLICA_PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Order sharding: with ORDER_SHARD_URLS, comma separated database URLs
+# named shard1, shard2, ..., each customer's orders are kept on default
+# or one of the shards, picked by a consistent hash of the customer id.
+# Customers and every other table stay on default. After changing the
+# list, run migrate --database for each new shard, then rebalance_orders.
+ORDER_SHARDS = ['default']
+for number, url in enumerate(filter(
+        None, os.environ.get('ORDER_SHARD_URLS', '').split(',')), 1):
+    ORDER_SHARDS.append(f'shard{number}')
+    DATABASES[f'shard{number}'] = dj_database_url.parse(url.strip())
+
+DATABASE_ROUTERS = [
+    'customer_orders_app.sharding.ShardRouter',
+    'customer_orders_app.routers.ReplicaRouter',
+]
+
+# Each thread keeps its database connection for DB_CONN_MAX_AGE seconds
+# (0 closes it after every request) and checks that it still works before
+# reusing it. A DB_POOL_SIZE above 0 instead gives each process a pool of
+# at most that many PostgreSQL connections shared by its threads, which
+# also works under uvicorn, where DB_CONN_MAX_AGE must be 0 as kept
+# connections are never closed; a request waits up to DB_POOL_TIMEOUT
+# seconds for one. A
+# deployment opens at most workers x threads (or x DB_POOL_SIZE)
+# connections: gunicorn.conf.py sizes the pool to fit DB_MAX_CONNECTIONS.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+for database in DATABASES.values():
+    database.update(CONN_MAX_AGE=DB_CONN_MAX_AGE, CONN_HEALTH_CHECKS=True)
+    if (DB_POOL_SIZE and
+            database['ENGINE'] == 'django.db.backends.postgresql'):
+        database.update(
+            ENGINE='customer_orders.postgresql_pool', CONN_MAX_AGE=0)
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'max_size': DB_POOL_SIZE, 'timeout': DB_POOL_TIMEOUT}
+
+# 4 for random primary keys, 7 for time ordered ones
+UUID_VERSION = int(os.environ.get('UUID_VERSION', 4))
+
+REDIS_URL = os.environ.get('REDIS_URL')
+# seconds Redis gets to connect and to answer when called while serving a
+# request, by the throttles and the JWT revocation list
+REDIS_REQUEST_TIMEOUT = float(os.environ.get('REDIS_REQUEST_TIMEOUT', 0.25))
+
 RQ_QUEUES = {
     'default': {
-        'URL': 'redis://red-cpthasd2ng1s73e15n20:6379'
+        'URL': REDIS_URL or 'redis://red-cpthasd2ng1s73e15n20:6379'
+    },
+    # SMS jobs, for workers started with async_sms_worker
+    'sms': {
+        'URL': REDIS_URL or 'redis://red-cpthasd2ng1s73e15n20:6379'
     },
 }
+# the queue SMS jobs are enqueued on: default, or sms to serve them with
+# the async_sms_worker command instead of rqworker
+SMS_QUEUE = os.environ.get('SMS_QUEUE', 'default')
+
+# Redis backs the cache when REDIS_URL is set, otherwise each process
+# keeps its own in-memory cache. Cache errors are treated as misses so
+# a Redis outage slows requests down instead of failing them.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'SOCKET_CONNECT_TIMEOUT': 1,
+                'SOCKET_TIMEOUT': 1,
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# the most orders accepted by one bulk-add-orders/ request
+BULK_ORDER_MAX_ITEMS = int(os.environ.get('BULK_ORDER_MAX_ITEMS', 1000))
+
+# Order SMS batching: notifications are collected for SMS_BATCH_WINDOW
+# seconds (0 sends one job per order) or until SMS_BATCH_SIZE are waiting,
+# and identical messages share a request of up to SMS_BATCH_MAX_RECIPIENTS.
+# Batching schedules jobs, so workers must run with --with-scheduler.
+SMS_BATCH_WINDOW = float(os.environ.get('SMS_BATCH_WINDOW', 0))
+SMS_BATCH_SIZE = int(os.environ.get('SMS_BATCH_SIZE', 500))
+SMS_BATCH_MAX_RECIPIENTS = int(
+    os.environ.get('SMS_BATCH_MAX_RECIPIENTS', 100))
+
+# Order SMS coalescing: a notification waits SMS_COALESCE_WINDOW seconds
+# (0 sends at once) and is merged with the others for the same number
+# created meanwhile, into one summary SMS; identical ones are sent once.
+SMS_COALESCE_WINDOW = float(os.environ.get('SMS_COALESCE_WINDOW', 0))
+
+# Shared limits on SMS gateway requests across all workers: a token
+# bucket of SMS_RATE_LIMIT requests per second with bursts of up to
+# SMS_RATE_BURST (waits longer than SMS_RATE_MAX_WAIT seconds reschedule
+# the job), and a circuit breaker that opens for SMS_BREAKER_COOLDOWN
+# seconds after SMS_BREAKER_THRESHOLD failures within SMS_BREAKER_WINDOW.
+SMS_RATE_LIMIT = float(os.environ.get('SMS_RATE_LIMIT', 10))
+SMS_RATE_BURST = int(os.environ.get('SMS_RATE_BURST', 20))
+SMS_RATE_MAX_WAIT = float(os.environ.get('SMS_RATE_MAX_WAIT', 1))
+SMS_BREAKER_THRESHOLD = int(os.environ.get('SMS_BREAKER_THRESHOLD', 5))
+SMS_BREAKER_WINDOW = int(os.environ.get('SMS_BREAKER_WINDOW', 60))
+SMS_BREAKER_COOLDOWN = int(os.environ.get('SMS_BREAKER_COOLDOWN', 30))
+
+# The order notification outbox: how many rows the relay moves to RQ per
+# transaction, when a relayed notification that was never reported on
+# is relayed again, how long a failed one waits before it is retried,
+# and how many relays it gets before it is marked failed.
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 500))
+OUTBOX_REQUEUE_AFTER = int(os.environ.get('OUTBOX_REQUEUE_AFTER', 300))
+OUTBOX_RETRY_DELAY = int(os.environ.get('OUTBOX_RETRY_DELAY', 60))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+
+# On PostgreSQL, partition_orders --convert splits the orders table into
+# monthly partitions on created_at. Run daily, partition_orders creates the
+# partitions of the next ORDER_PARTITION_MONTHS_AHEAD months, and
+# archive_orders moves months ending more than ORDER_ARCHIVE_AFTER_MONTHS
+# months ago to gzipped CSV files in ORDER_ARCHIVE_DIR.
+ORDER_PARTITION_MONTHS_AHEAD = int(
+    os.environ.get('ORDER_PARTITION_MONTHS_AHEAD', 3))
+ORDER_ARCHIVE_AFTER_MONTHS = int(
+    os.environ.get('ORDER_ARCHIVE_AFTER_MONTHS', 12))
+ORDER_ARCHIVE_DIR = os.environ.get('ORDER_ARCHIVE_DIR', BASE_DIR / 'archive')
+
+# rows fetched per round trip by the server-side cursor of export-orders/
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# The customer detail cache and the customer ETags rest on per-customer
+# versions kept in the default cache. An in-memory cache is per process,
+# so another process would keep serving the old version: both are only
+# used with REDIS_URL.
+CUSTOMER_CACHE_VERSIONS = bool(REDIS_URL)
+CUSTOMER_DETAIL_CACHE_TIMEOUT = int(
+    os.environ.get('CUSTOMER_DETAIL_CACHE_TIMEOUT', 300))
+# share of customer detail lookups counted as cache hits or misses, with
+# one Redis INCR each; 0 turns the counters off
+CUSTOMER_DETAIL_CACHE_STATS_RATE = float(
+    os.environ.get('CUSTOMER_DETAIL_CACHE_STATS_RATE', 1))
+
+# seconds an API token lookup stays cached; deleting or regenerating the
+# token drops the entry at once, in every process only with REDIS_URL
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 300))
 
 
 SESSION_COOKIE_SECURE = True
 SESSION_COOKIE_AGE = 3600  # 1 hour
 SESSION_COOKIE_HTTPONLY = True
 
+# Where browser sessions are kept: db, cached_db (read from Redis, written
+# to both) or cache (Redis only, lost if Redis loses them). The cache
+# backed engines use the default cache, and so its connection pool, and
+# are only used with REDIS_URL: an in-memory cache is per process. Run
+# migrate_sessions when switching so logged in users stay logged in.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+}
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'db')
+if SESSION_BACKEND not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f'SESSION_BACKEND is {SESSION_BACKEND!r}, it must be one of '
+        f'{", ".join(SESSION_ENGINES)}')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND if REDIS_URL else 'db']
+SESSION_CACHE_ALIAS = 'default'
+
 
 
 # Password validation
@@ -169,19 +351,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # controlling the server from DOS attack using throttling
 
+# Throttle counters live in Redis and are shared by every process;
+# without REDIS_URL, or while Redis is unreachable, the throttle counts
+# in the default cache and retries Redis after THROTTLE_REDIS_RETRY
+# seconds. One throttle applies the anon or user rate and the
+# order-writes or order-reads scope of an endpoint together, in a
+# single Redis call per request.
+THROTTLE_REDIS_RETRY = float(os.environ.get('THROTTLE_REDIS_RETRY', 5))
+
 REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'customer_orders_app.throttling.SlidingWindowThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/hour',
-        'user': '500/hour',
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '100/hour'),
+        'user': os.environ.get('THROTTLE_USER_RATE', '500/hour'),
+        'order-writes': os.environ.get('THROTTLE_ORDER_WRITES_RATE', '60/min'),
+        'order-reads': os.environ.get('THROTTLE_ORDER_READS_RATE', '300/min'),
     },
     # Combined authentication classes
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'customer_orders_app.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -190,6 +381,36 @@ REST_FRAMEWORK = {
     ),
 }
 
+# JWT access tokens let API clients authenticate with a signature check
+# alone. JWT_SIGNING_KEYS lists kid:secret pairs: the first signs new
+# tokens and all of them verify, so a key is rotated by putting the new
+# one first and dropping the old one once its tokens have expired.
+# Revoked tokens are listed in Redis until they expire, and each process
+# rereads the list at most every JWT_REVOCATION_REFRESH seconds.
+JWT_SIGNING_KEYS = dict(
+    pair.split(':', 1)
+    for pair in os.environ.get('JWT_SIGNING_KEYS', '').split(',') if pair
+) or {'default': SECRET_KEY}
+JWT_REVOCATION_REFRESH = float(os.environ.get('JWT_REVOCATION_REFRESH', 5))
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        seconds=int(os.environ.get('JWT_ACCESS_LIFETIME', 300))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        seconds=int(os.environ.get('JWT_REFRESH_LIFETIME', 86400))),
+    'UPDATE_LAST_LOGIN': False,
+    'AUTH_TOKEN_CLASSES': ('customer_orders_app.jwt_auth.AccessToken',),
+    'TOKEN_OBTAIN_SERIALIZER':
+        'customer_orders_app.jwt_auth.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER':
+        'customer_orders_app.jwt_auth.TokenRefreshSerializer',
+}
+
+# list endpoints cache total counts of at least this many rows for a
+# few seconds instead of running COUNT(*) on every page
+LIST_COUNT_CACHE_MIN_ROWS = int(
+    os.environ.get('LIST_COUNT_CACHE_MIN_ROWS', 10000))
+LIST_COUNT_CACHE_TIMEOUT = int(os.environ.get('LIST_COUNT_CACHE_TIMEOUT', 30))
+
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -0,0 +1,149 @@
+'''
+Keeps the order aggregates stored on customers in step with their orders.
+
+The order views call these functions in the transaction that writes the
+orders. Each one changes a customer's order_count, total_amount and
+last_order_at with F() expressions in a single UPDATE, so concurrent
+orders of the same customer do not overwrite each other's changes.
+reconcile recomputes the aggregates from the orders, to repair customers
+that drifted, for example when orders were changed outside the API.
+'''
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DateTimeField, F, Max, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+
+from .caching import invalidate_customer
+from .models import Customer, Order
+from .sharding import shard_for
+
+FIELDS = ['order_count', 'total_amount', 'last_order_at']
+AMOUNT = Order._meta.get_field('amount')
+
+
+def orders_added(orders) -> None:
+    """
+    Adds newly created orders to their customers' aggregates.
+    """
+    totals = defaultdict(lambda: [0, Decimal(0), None])
+    for order in orders:
+        total = totals[order.customer_id]
+        total[0] += 1
+        total[1] += AMOUNT.to_python(order.amount)
+        if total[2] is None or order.created_at > total[2]:
+            total[2] = order.created_at
+
+    for customer_id, (count, amount, latest) in totals.items():
+        latest = Value(latest, output_field=DateTimeField())
+        Customer.objects.filter(pk=customer_id).update(
+            order_count=F('order_count') + count,
+            total_amount=F('total_amount') + amount,
+            last_order_at=Greatest(Coalesce('last_order_at', latest), latest))
+
+
+def order_amount_changed(order, previous_amount) -> None:
+    """
+    Moves the customer's total by the change in an order's amount.
+    """
+    change = AMOUNT.to_python(order.amount) - AMOUNT.to_python(previous_amount)
+    if change:
+        Customer.objects.filter(pk=order.customer_id).update(
+            total_amount=F('total_amount') + change)
+
+
+def order_removed(order) -> None:
+    """
+    Takes a deleted order out of its customer's aggregates.
+
+    Called after the delete, in the same transaction, so the customer's
+    latest remaining order is read without it.
+    """
+    latest = Order.objects.using(shard_for(order.customer_id)).filter(
+        customer_id=order.customer_id).aggregate(
+            latest=Max('created_at'))['latest']
+    Customer.objects.filter(pk=order.customer_id).update(
+        order_count=F('order_count') - 1,
+        total_amount=F('total_amount') - AMOUNT.to_python(order.amount),
+        last_order_at=Value(latest, output_field=DateTimeField()))
+
+
+def orders_archived(totals: dict) -> None:
+    """
+    Takes archived orders out of their customers' aggregates.
+
+    Archived orders are the oldest, so last_order_at only changes for
+    customers left without orders.
+
+    Args:
+        totals: (order count, total amount) of the archived orders by
+            customer id.
+    """
+    for customer_id, (count, amount) in totals.items():
+        Customer.objects.filter(pk=customer_id).update(
+            order_count=F('order_count') - count,
+            total_amount=F('total_amount') - amount,
+            last_order_at=Case(
+                When(order_count__lte=count, then=None),
+                default=F('last_order_at')))
+        invalidate_customer(customer_id)
+
+
+def actual_aggregates(customer_ids) -> dict:
+    """
+    Computes the aggregates of customers from their orders on every
+    order shard.
+
+    Returns:
+        A dict of FIELDS values by customer id, for every customer given.
+    """
+    actual = {
+        customer_id: {
+            'order_count': 0, 'total_amount': Decimal(0),
+            'last_order_at': None}
+        for customer_id in customer_ids}
+    for alias in settings.ORDER_SHARDS:
+        rows = Order.objects.using(alias).filter(
+            customer_id__in=customer_ids).order_by().values(
+                'customer_id').annotate(
+                    count=Count('id'), total=Sum('amount'),
+                    latest=Max('created_at'))
+        for row in rows:
+            values = actual[row['customer_id']]
+            values['order_count'] += row['count']
+            values['total_amount'] += row['total']
+            if (values['last_order_at'] is None or
+                    row['latest'] > values['last_order_at']):
+                values['last_order_at'] = row['latest']
+    return actual
+
+
+def reconcile(customer_ids, dry_run: bool = False) -> list:
+    """
+    Repairs the aggregates of customers that do not match their orders.
+
+    The customers are locked while their orders are read, so an order
+    written meanwhile updates them after the repair rather than being
+    lost by it.
+
+    Returns:
+        The ids of the customers whose aggregates were wrong.
+    """
+    drifted = []
+    with transaction.atomic():
+        stored = Customer.objects.select_for_update().filter(
+            pk__in=customer_ids).order_by('pk').values('pk', *FIELDS)
+        stored = {row.pop('pk'): row for row in stored}
+        for customer_id, values in actual_aggregates(list(stored)).items():
+            if values == stored[customer_id]:
+                continue
+            drifted.append(customer_id)
+            if not dry_run:
+                Customer.objects.filter(pk=customer_id).update(**values)
+    if not dry_run:
+        for customer_id in drifted:
+            invalidate_customer(customer_id)
+    return drifted
@@ -0,0 +1,286 @@
+'''
+An asyncio consumer for the SMS queue.
+
+An RQ worker sends one SMS at a time, so a process manages about one
+message per gateway round trip. This consumer pops jobs from the same
+queue and keeps up to --concurrency send_notification jobs in flight per
+process, over a bounded pool of kept-alive httpx connections. The short
+Redis and database steps around each send (dedupe claims, the rate
+limiter, outbox updates) run on a small thread pool; other jobs, such as
+batch flushes, run there whole. Database connections older than
+CONN_MAX_AGE, or broken, are closed before and after each such step, as
+Django does around a request.
+
+Running jobs are kept in the queue's StartedJobRegistry, so RQ's own
+cleanup fails them should the consumer die. On SIGTERM or SIGINT the
+consumer stops taking jobs and waits up to the drain timeout for the
+ones in flight; jobs still running after that are put back on the
+queue, where their dedupe keys stop a second send.
+'''
+import asyncio
+import logging
+import signal
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import django_rq
+from django.db import close_old_connections
+from rq import Queue
+from rq.exceptions import DequeueTimeout
+from rq.job import Job, JobStatus
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from . import delivery, sms_sender
+
+logger = logging.getLogger(__name__)
+
+
+async def post_message_async(client, to: str, message: str):
+    """
+    The async counterpart of sms_sender.post_message: a single request,
+    with only failures to connect retried.
+
+    Args:
+        client: An httpx.AsyncClient.
+        to: The recipient number, or several separated by commas.
+        message: The text of the SMS.
+
+    Returns:
+        An SmsResult describing the last attempt.
+    """
+    data, headers = sms_sender.request_parts(to, message)
+    # requests drops headers set to None where httpx refuses them
+    headers = {
+        name: value for name, value in headers.items() if value is not None}
+    started = time.perf_counter()
+    result = sms_sender.SmsResult(ok=False)
+
+    for attempt in range(1, sms_sender.MAX_RETRIES + 2):
+        result.attempts = attempt
+        try:
+            response = await client.post(
+                sms_sender.GATEWAY_URL, headers=headers, data=data)
+        except (httpx.ConnectError, httpx.ConnectTimeout,
+                httpx.PoolTimeout) as err:
+            # nothing was sent
+            result.status_code, result.error = None, str(err) or repr(err)
+            result.retry = True
+        except httpx.HTTPError as err:
+            result.status_code, result.error = None, str(err) or repr(err)
+            result.retry = False
+        else:
+            result.retry = sms_sender.read_response(result, response)
+            break
+
+        if not result.retry or attempt > sms_sender.MAX_RETRIES:
+            break
+        await asyncio.sleep(sms_sender.backoff(attempt))
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+class AsyncSmsWorker:
+    """
+    Consumes an RQ queue with many concurrent SMS sends per process.
+
+    Args:
+        queue_name: The RQ queue to consume.
+        concurrency: The most jobs in flight at once, which is also the
+        size of the HTTP connection pool.
+        threads: The size of the thread pool for blocking steps.
+        drain_timeout: How long to wait for jobs in flight on shutdown.
+        burst: Exit once the queue is empty instead of waiting for jobs.
+    """
+
+    # how long a blocking dequeue waits, which bounds how quickly a
+    # stop request is noticed
+    DEQUEUE_TIMEOUT = 1
+
+    def __init__(self, queue_name: str = 'default', concurrency: int = 200,
+                 threads: int = 16, drain_timeout: float = 30,
+                 burst: bool = False):
+        if httpx is None:
+            raise RuntimeError('The async SMS worker needs httpx installed')
+        self.queue = django_rq.get_queue(queue_name)
+        self.concurrency = concurrency
+        self.drain_timeout = drain_timeout
+        self.burst = burst
+        self.executor = ThreadPoolExecutor(
+            threads, thread_name_prefix='sms-worker')
+        self.stopping = False
+        self.tasks = set()
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self) -> None:
+        if not self.stopping:
+            logger.info('Draining %d jobs in flight', len(self.tasks))
+        self.stopping = True
+
+    async def blocking(self, func, *args):
+        """
+        Runs a blocking call on the worker's thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def database(self, func, *args):
+        """
+        Runs a blocking call that may use the database on the worker's
+        thread pool, dropping stale connections of the thread it runs on
+        before and after.
+        """
+        def step():
+            close_old_connections()
+            try:
+                return func(*args)
+            finally:
+                close_old_connections()
+        return await self.blocking(step)
+
+    def dequeue(self):
+        """
+        Pops the next job, waiting up to DEQUEUE_TIMEOUT seconds.
+
+        Returns:
+            The job, or None when the queue stayed empty.
+        """
+        timeout = None if self.burst else self.DEQUEUE_TIMEOUT
+        try:
+            popped = Queue.dequeue_any(
+                [self.queue], timeout, connection=self.queue.connection)
+        except DequeueTimeout:
+            return None
+        return popped[0] if popped else None
+
+    def start(self, job) -> None:
+        """
+        Marks a dequeued job as started.
+        """
+        with self.queue.connection.pipeline() as pipe:
+            job.set_status(JobStatus.STARTED, pipeline=pipe)
+            # expires like a job left behind by a dead RQ worker
+            self.queue.started_job_registry.add(
+                job, (job.timeout or Queue.DEFAULT_TIMEOUT) + 60,
+                pipeline=pipe)
+            pipe.execute()
+        # RQ 2 parks dequeued jobs on an intermediate queue and fails
+        # those that linger there
+        intermediate = getattr(self.queue, 'intermediate_queue', None)
+        if intermediate is not None:
+            intermediate.remove(job.id)
+
+    def end(self, job, status: str) -> None:
+        """
+        Marks a job as finished or failed, taking it off the started jobs.
+        """
+        with self.queue.connection.pipeline() as pipe:
+            job.set_status(status, pipeline=pipe)
+            self.queue.started_job_registry.remove(job, pipeline=pipe)
+            pipe.execute()
+
+    def requeue(self, job) -> None:
+        """
+        Puts a job that did not finish back on the queue.
+        """
+        self.queue.started_job_registry.remove(job)
+        self.queue.enqueue_job(Job.fetch(
+            job.id, connection=self.queue.connection,
+            serializer=self.queue.serializer))
+
+    async def perform(self, job) -> None:
+        """
+        Runs a job and records its outcome on the job.
+        """
+        await self.blocking(self.start, job)
+        try:
+            if job.func is delivery.send_notification:
+                result = await self.send(*job.args, **job.kwargs)
+            else:
+                result = await self.database(
+                    lambda: job.func(*job.args, **job.kwargs))
+        except asyncio.CancelledError:
+            await self.blocking(self.requeue, job)
+            raise
+        except Exception:
+            self.failed += 1
+            logger.exception('Job %s failed', job.id)
+            await self.blocking(self.fail, job, traceback.format_exc())
+            return
+        self.processed += 1
+        logger.debug('Job %s finished: %s', job.id, result)
+        await self.blocking(self.end, job, JobStatus.FINISHED)
+
+    def fail(self, job, exc_string: str) -> None:
+        self.end(job, JobStatus.FAILED)
+        self.queue.failed_job_registry.add(job, exc_string=exc_string)
+
+    async def send(self, dedupe_key: str, to: str, message: str,
+                   attempt: int = 1):
+        """
+        send_notification with the gateway request made asynchronously.
+        """
+        if not await self.database(
+                delivery.prepare, dedupe_key, to, message, attempt):
+            return None
+        result = await post_message_async(self.client, to, message)
+        await self.database(
+            delivery.finish, dedupe_key, to, message, result, attempt)
+        return result
+
+    async def run(self) -> None:
+        """
+        Consumes jobs until stopped, or until the queue is empty in burst
+        mode, then drains the jobs in flight.
+        """
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+
+        slots = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency)
+        timeout = httpx.Timeout(
+            sms_sender.READ_TIMEOUT, connect=sms_sender.CONNECT_TIMEOUT,
+            # waiting for a free connection is not the gateway's fault
+            pool=None)
+        async with httpx.AsyncClient(
+                limits=limits, timeout=timeout,
+                headers={'Accept': 'application/json'}) as self.client:
+            while not self.stopping:
+                await slots.acquire()
+                job = await self.blocking(self.dequeue)
+                if job is None:
+                    slots.release()
+                    if self.burst:
+                        break
+                    continue
+                task = asyncio.create_task(self.perform(job))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+                task.add_done_callback(lambda _: slots.release())
+            await self.drain()
+        self.executor.shutdown()
+
+    async def drain(self) -> None:
+        """
+        Waits for the jobs in flight, cancelling (and so requeuing) those
+        still running after drain_timeout.
+        """
+        if not self.tasks:
+            return
+        _, running = await asyncio.wait(
+            set(self.tasks),
+            timeout=None if self.burst else self.drain_timeout)
+        for task in running:
+            task.cancel()
+        if running:
+            logger.warning('Requeued %d unfinished jobs', len(running))
+            await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,76 @@
+'''
+Token authentication that keeps token lookups in the cache.
+
+TokenAuthentication reads the token and its user from the database on
+every request. CachedTokenAuthentication keeps what the token resolves
+to (the user id, the key and whether the user is active) in the cache
+for AUTH_TOKEN_CACHE_TIMEOUT seconds. Repeated requests with the same
+token then skip the token query and only load the user by primary key.
+The entry is dropped when the token is deleted or regenerated and when
+its user changes.
+
+With REDIS_URL set the cache is shared, so revoked tokens and
+deactivated users are refused at once. Without it each process keeps
+its own entries and only the process that made the change drops its
+own. Other processes accept a deleted or regenerated token for up to
+AUTH_TOKEN_CACHE_TIMEOUT seconds after the change. A deactivated user is
+still refused at once, because the user is read on every request.
+'''
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+def _token_key(key: str) -> str:
+    # cache keys carry a digest, never the token itself
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+def forget_token(key: str) -> None:
+    """
+    Drops a token from the cache.
+
+    Args:
+        key: The token key.
+    """
+    cache.delete(_token_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication with the token lookup cached.
+    """
+
+    def authenticate_credentials(self, key):
+        """
+        Returns the user and token of a key, from the cache when it can.
+
+        Unknown keys are not cached, so a token created after a failed
+        attempt works at once.
+        """
+        cache_key = _token_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, {
+                'user_id': user.pk, 'key': token.key,
+                'is_active': user.is_active,
+            }, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            return user, token
+
+        if not cached['is_active']:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        user = get_user_model().objects.filter(
+            pk=cached['user_id'], is_active=True).first()
+        if user is None:
+            forget_token(key)
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, self.get_model()(key=cached['key'], user=user)
@@ -0,0 +1,151 @@
+'''
+Caches the customer detail response under versioned per-customer keys.
+
+Every write that touches a customer or one of its orders moves the
+customer's version forward, so entries cached under older versions are
+never read again and simply expire.
+
+Versions are only kept when CUSTOMER_CACHE_VERSIONS is set, that is when
+the cache is shared by every process; otherwise nothing is cached and
+customer responses carry no validators.
+
+Lookups are counted as hits or misses with one INCR each, straight in
+Redis through the client of redis_client, as the cache has no increment
+that creates a missing counter in the same round trip.
+'''
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+from .redis_client import get_client
+
+# versions outlive the entries they guard; an expired version restarts
+# at the current time, which is always safe
+VERSION_TIMEOUT = 7 * 24 * 3600
+HITS_KEY = 'customer-detail:hits'
+MISSES_KEY = 'customer-detail:misses'
+
+
+def _version_key(customer_id) -> str:
+    return f'customer:{customer_id}:version'
+
+
+def _detail_key(customer_id, version: int, variant: str) -> str:
+    return f'customer:{customer_id}:{variant}:{version}'
+
+
+def _count(key: str) -> None:
+    """
+    Increments a counter in Redis, which creates it when missing.
+
+    A CUSTOMER_DETAIL_CACHE_STATS_RATE below 1 counts only that share of
+    the calls, which keeps the hit ratio; 0 turns counting off.
+    """
+    rate = settings.CUSTOMER_DETAIL_CACHE_STATS_RATE
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return
+    client = get_client()
+    if client is None:
+        return
+    try:
+        client.incr(key)
+    except RedisError:
+        # a lost count is not worth failing the request over
+        pass
+
+
+def customer_version(customer_id) -> int:
+    """
+    Returns the current cache version of a customer.
+
+    Versions are the time of the last change in nanoseconds, so they
+    double as a last modified time. A version lost to eviction restarts
+    at the current time and never matches one handed out before.
+
+    Args:
+        customer_id: The ID of the customer as passed in the request.
+
+    Returns:
+        The version, or None when customer_id is not a valid UUID, the
+        cache is unavailable or versions are turned off.
+    """
+    if not settings.CUSTOMER_CACHE_VERSIONS:
+        return None
+    try:
+        customer_id = uuid.UUID(str(customer_id))
+    except ValueError:
+        return None
+    key = _version_key(customer_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_customer(customer_id) -> None:
+    """
+    Moves the cache version of a customer to the current time so its
+    cached detail response is no longer served.
+
+    Args:
+        customer_id: The ID of the customer whose data changed.
+    """
+    if not settings.CUSTOMER_CACHE_VERSIONS:
+        return
+    key = _version_key(customer_id)
+    version = time.time_ns()
+    previous = cache.get(key)
+    if previous is not None and previous >= version:
+        version = previous + 1
+    cache.set(key, version, VERSION_TIMEOUT)
+
+
+def get_customer_detail(customer_id, version: int,
+                        variant: str = 'detail') -> dict:
+    """
+    Looks up the cached detail response of a customer.
+
+    Args:
+        customer_id: The ID of the customer as passed in the request.
+        version: The customer's version from customer_version.
+        variant: Tells apart responses with different fields.
+
+    Returns:
+        The cached response data, or None on a miss.
+    """
+    if version is None:
+        return None
+    data = cache.get(
+        _detail_key(uuid.UUID(str(customer_id)), version, variant))
+    _count(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def set_customer_detail(customer_id, version: int, data: dict,
+                        variant: str = 'detail') -> None:
+    """
+    Caches the detail response of a customer under the version read
+    before the response was built.
+    """
+    if version is None:
+        return
+    cache.set(
+        _detail_key(customer_id, version, variant), data,
+        settings.CUSTOMER_DETAIL_CACHE_TIMEOUT)
+
+
+def customer_detail_stats() -> dict:
+    """
+    Returns the hit and miss counters of the customer detail cache,
+    counting only the sampled lookups.
+    """
+    client = get_client()
+    if client is None:
+        return {'hits': 0, 'misses': 0}
+    hits, misses = client.mget(HITS_KEY, MISSES_KEY)
+    return {'hits': int(hits or 0), 'misses': int(misses or 0)}
@@ -0,0 +1,118 @@
+'''
+Helpers for conditional GET requests (ETag / Last-Modified), letting read
+endpoints answer 304 Not Modified before serialising anything
+'''
+import hashlib
+from datetime import datetime, timezone
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a strong ETag from the values that identify a response.
+
+    Args:
+        parts: Values that change whenever the response body changes.
+
+    Returns:
+        A quoted ETag string.
+    """
+    raw = '|'.join(str(part) for part in parts)
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def version_time(version: int) -> datetime:
+    """
+    Converts a customer cache version into the time of the change.
+    """
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc)
+
+
+def customer_validators(customer_id, version: int, scope: str) -> tuple:
+    """
+    Returns the ETag and last modified time of a customer scoped
+    response from the customer's cache version, without a database
+    query.
+
+    Args:
+        customer_id: The ID of the customer as passed in the request.
+        version: The customer's version from customer_version.
+        scope: Tells apart responses built from the same customer.
+
+    Returns:
+        A tuple of (etag, last_modified), both None when no version is
+        available.
+    """
+    if version is None:
+        return None, None
+    return make_etag(scope, customer_id, version), version_time(version)
+
+
+def not_modified(request, etag: str, last_modified: datetime = None):
+    """
+    Checks the request's If-None-Match / If-Modified-Since headers.
+
+    Args:
+        request: The HTTP request object.
+        etag: The current ETag of the resource.
+        last_modified: The current last modified time of the resource.
+
+    Returns:
+        A 304 response carrying the validators when the client's copy is
+        current, otherwise None.
+    """
+    if etag is None:
+        return None
+    # HTTP dates have a resolution of one second
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag: str, last_modified: datetime = None):
+    """
+    Adds the ETag and Last-Modified headers to a response.
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalListMixin:
+    """
+    List view mixin that answers If-None-Match with 304 once the page
+    has been fetched but before it is serialised.
+
+    The ETag covers the pagination envelope and each row's id and
+    updated_at. No Last-Modified is sent because deleting a row can move
+    a page's newest updated_at backwards.
+    """
+
+    def get_etag_parts(self, instance) -> tuple:
+        """
+        Returns the values of a row that go into the page ETag.
+        """
+        return (instance.pk, instance.updated_at)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        envelope = self.get_paginated_response([]).data
+        etag = make_etag(
+            sorted(envelope.items()),
+            *(self.get_etag_parts(instance) for instance in page))
+
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(page, many=True)
+        return set_validators(
+            self.get_paginated_response(serializer.data), etag)
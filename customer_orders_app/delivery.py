@@ -0,0 +1,201 @@
+'''
+Delivers outbox notifications at most once per dedupe key.
+
+The relay hands notifications to RQ at least once, so the same
+notification can reach a worker twice. Before sending, a worker claims
+the notification's dedupe key in Redis with SET NX; the claim is kept
+for a week once the SMS is sent and released when sending fails, so a
+later relay can try again. Outcomes are written back to the outbox.
+'''
+from datetime import timedelta
+
+import django_rq
+from django.conf import settings
+from django.utils import timezone
+
+from . import sms_guard
+from .models import OrderNotification
+from .sms_sender import MAX_RETRIES, backoff, post_message
+
+# long enough for a send with its connection retries; a worker that
+# dies while sending frees the notification for redelivery after this
+CLAIM_TTL = 600
+SENT_TTL = 7 * 24 * 3600
+SENDING = b'sending'
+SENT = b'sent'
+
+
+def _key(dedupe_key: str) -> str:
+    return f'sms:dedupe:{dedupe_key}'
+
+
+def claim(dedupe_keys: list) -> tuple:
+    """
+    Claims notifications for sending.
+
+    Args:
+        dedupe_keys: The dedupe keys of the notifications.
+
+    Returns:
+        A tuple of the set of keys claimed by this call and the set of
+        keys already sent.
+    """
+    connection = django_rq.get_connection('default')
+    with connection.pipeline() as pipe:
+        for dedupe_key in dedupe_keys:
+            pipe.set(_key(dedupe_key), SENDING, nx=True, ex=CLAIM_TTL)
+        won = pipe.execute()
+    claimed = {key for key, ok in zip(dedupe_keys, won) if ok}
+
+    taken = [key for key in dedupe_keys if key not in claimed]
+    sent = set()
+    if taken:
+        values = connection.mget([_key(key) for key in taken])
+        sent = {key for key, value in zip(taken, values) if value == SENT}
+    return claimed, sent
+
+
+def settle(outcomes: dict) -> None:
+    """
+    Records the outcome of sending claimed notifications, in Redis and
+    in the outbox.
+
+    Args:
+        outcomes: Maps dedupe keys to an error message, or None for the
+        notifications that were sent.
+    """
+    if not outcomes:
+        return
+    connection = django_rq.get_connection('default')
+    with connection.pipeline() as pipe:
+        for dedupe_key, error in outcomes.items():
+            if error is None:
+                pipe.set(_key(dedupe_key), SENT, ex=SENT_TTL)
+            else:
+                pipe.delete(_key(dedupe_key))
+        pipe.execute()
+    record(outcomes)
+
+
+def record(outcomes: dict) -> None:
+    """
+    Writes delivery outcomes to the outbox.
+
+    Sent notifications are marked sent. Failed ones go back to pending
+    after OUTBOX_RETRY_DELAY seconds until they have been relayed
+    OUTBOX_MAX_ATTEMPTS times, and are then marked failed.
+    """
+    now = timezone.now()
+    notifications = OrderNotification.objects.exclude(
+        status=OrderNotification.SENT)
+
+    sent = [key for key, error in outcomes.items() if error is None]
+    if sent:
+        notifications.filter(dedupe_key__in=sent).update(
+            status=OrderNotification.SENT, last_error='', updated_at=now)
+
+    failed = {}
+    for dedupe_key, error in outcomes.items():
+        if error is not None:
+            failed.setdefault(str(error)[:200], []).append(dedupe_key)
+    for error, keys in failed.items():
+        notifications.filter(
+            dedupe_key__in=keys,
+            attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+        ).update(
+            status=OrderNotification.PENDING, last_error=error,
+            available_at=now + timedelta(
+                seconds=settings.OUTBOX_RETRY_DELAY),
+            updated_at=now)
+        notifications.filter(
+            dedupe_key__in=keys,
+            attempts__gte=settings.OUTBOX_MAX_ATTEMPTS,
+        ).update(
+            status=OrderNotification.FAILED, last_error=error,
+            updated_at=now)
+
+
+def release(dedupe_keys: list) -> None:
+    """
+    Gives up claims without recording an outcome, for notifications
+    that were put off rather than sent.
+    """
+    if dedupe_keys:
+        django_rq.get_connection('default').delete(
+            *[_key(dedupe_key) for dedupe_key in dedupe_keys])
+
+
+def prepare(dedupe_key: str, to: str, message: str,
+            attempt: int = 1) -> bool:
+    """
+    Readies a notification for sending: claims it, then waits for the
+    rate limiter and circuit breaker. A notification they hold back is
+    released and its send_notification job rescheduled.
+
+    Args:
+        dedupe_key: The dedupe key of the notification.
+        to: The recipient phone number.
+        message: The text of the SMS.
+        attempt: Which attempt at sending the notification this is.
+
+    Returns:
+        Whether the caller should send the notification now.
+    """
+    claimed, sent = claim([dedupe_key])
+    if dedupe_key in sent:
+        record({dedupe_key: None})
+    if dedupe_key not in claimed:
+        return False
+
+    delay = sms_guard.wait_to_send()
+    if delay is not None:
+        release([dedupe_key])
+        sms_guard.reschedule(
+            send_notification, delay, dedupe_key, to, message, attempt)
+        return False
+    return True
+
+
+def finish(dedupe_key: str, to: str, message: str, result,
+           attempt: int = 1) -> None:
+    """
+    Records the SmsResult of a notification prepare let through.
+
+    A request the gateway asked to retry is released and its
+    send_notification job rescheduled after a backoff, up to
+    SMS_MAX_RETRIES times, so the retry waits for a token again;
+    after that it is recorded as failed.
+    """
+    sms_guard.record(result)
+    if result.retry and attempt <= MAX_RETRIES:
+        release([dedupe_key])
+        sms_guard.reschedule(
+            send_notification, backoff(attempt), dedupe_key, to, message,
+            attempt + 1)
+        return
+    settle({dedupe_key: None if result.ok else result.error})
+
+
+def send_notification(dedupe_key: str, to: str, message: str,
+                      attempt: int = 1):
+    """
+    Sends one outbox notification unless it was sent already. Runs as
+    an RQ job; while the gateway is rate limited or its circuit breaker
+    is open, or when it asks for a retry, the job reschedules itself
+    instead.
+
+    Args:
+        dedupe_key: The dedupe key of the notification.
+        to: The recipient phone number.
+        message: The text of the SMS.
+        attempt: Which attempt at sending the notification this is.
+
+    Returns:
+        The SmsResult, or None when the notification was skipped or
+        rescheduled.
+    """
+    if not prepare(dedupe_key, to, message, attempt):
+        return None
+    result = post_message(to, message)
+    finish(dedupe_key, to, message, result, attempt)
+    return result
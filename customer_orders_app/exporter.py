@@ -0,0 +1,132 @@
+'''
+Streams orders out of the database as NDJSON or CSV.
+
+Rows are read with a server-side cursor (QuerySet.iterator) and written
+one at a time, so an export uses the same memory however many orders it
+covers.
+'''
+import csv
+import heapq
+import json
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from uuid import UUID
+
+from django.conf import settings
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from . import sharding
+from .models import Customer, Order
+
+FIELDS = ['id', 'item', 'amount', 'created_at', 'customer_id',
+          'customer_name', 'customer_phone_number']
+CREATED_AT = FIELDS.index('created_at')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(customer_id=None, created_after=None, created_before=None):
+    """
+    Yields the orders to export as tuples in FIELDS order, oldest first.
+
+    Args:
+        customer_id: Only export orders of this customer.
+        created_after: Only export orders created at or after this time.
+        created_before: Only export orders created before this time.
+    """
+    orders = Order.objects.order_by('created_at', 'id')
+    if customer_id is not None:
+        orders = orders.filter(customer_id=customer_id)
+    if created_after is not None:
+        orders = orders.filter(created_at__gte=created_after)
+    if created_before is not None:
+        orders = orders.filter(created_at__lt=created_before)
+    if sharding.sharded():
+        aliases = (
+            [sharding.shard_for(customer_id)] if customer_id is not None
+            else settings.ORDER_SHARDS)
+        return sharded_rows([orders.using(alias) for alias in aliases])
+    # phone numbers are stored in E.164 already; reading the column as
+    # text skips parsing each one into a PhoneNumber
+    orders = orders.annotate(customer_phone_number=Cast(
+        'customer__phone_number', CharField()))
+    return orders.values_list(
+        'id', 'item', 'amount', 'created_at', 'customer_id',
+        'customer__name', 'customer_phone_number',
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def sharded_rows(querysets):
+    """
+    Yields the rows of order querysets on several shards, merged oldest
+    first, with the customers' names and phone numbers read from default
+    one chunk of orders at a time.
+    """
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    merged = heapq.merge(*(
+        queryset.values_list(
+            'id', 'item', 'amount', 'created_at', 'customer_id',
+        ).iterator(chunk_size=chunk_size)
+        for queryset in querysets), key=lambda row: (row[CREATED_AT], row[0]))
+    while chunk := list(islice(merged, chunk_size)):
+        customers = {
+            pk: (name, phone_number)
+            for pk, name, phone_number in Customer.objects.filter(
+                pk__in={row[-1] for row in chunk},
+            ).values_list(
+                'pk', 'name', Cast('phone_number', CharField()))}
+        for row in chunk:
+            yield row + customers.get(row[-1], (None, None))
+
+
+def _value(value):
+    """
+    Converts the values JSON has no type for to text, leaving strings,
+    numbers and None as they are.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def ndjson_lines(rows):
+    """
+    Renders rows as newline delimited JSON objects.
+    """
+    for row in rows:
+        yield json.dumps(
+            dict(zip(FIELDS, map(_value, row))),
+            separators=(',', ':')) + '\n'
+
+
+class _Echo:
+    """
+    A file-like object whose write returns what it was given, so
+    csv.writer can render one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    Renders rows as CSV lines, starting with a header line.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            '' if value is None else _value(value) for value in row])
+
+
+RENDERERS = {
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+}
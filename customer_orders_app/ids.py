@@ -0,0 +1,41 @@
+'''
+Generates the UUID primary keys used by the models
+'''
+import os
+import time
+import uuid
+
+from django.conf import settings
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generates a time ordered UUID in the version 7 layout: a 48 bit
+    millisecond unix timestamp followed by random bits.
+
+    Ids generated later sort after earlier ones, so new rows land at the
+    right edge of the primary key and foreign key B-trees instead of on
+    random pages.
+
+    Returns:
+        A version 7 UUID.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), 'big')
+
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76                           # version
+    value |= ((rand >> 62) & 0xFFF) << 64        # rand_a, 12 bits
+    value |= 0b10 << 62                          # variant
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF        # rand_b, 62 bits
+    return uuid.UUID(int=value)
+
+
+def new_id() -> uuid.UUID:
+    """
+    Returns a new primary key, time ordered when UUID_VERSION is 7 and
+    random (version 4) otherwise.
+    """
+    if settings.UUID_VERSION == 7:
+        return uuid7()
+    return uuid.uuid4()
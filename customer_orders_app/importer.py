@@ -0,0 +1,247 @@
+'''
+Imports customers in bulk from CSV or NDJSON streams.
+
+Rows are read and validated in batches. On PostgreSQL each batch is
+loaded with COPY into a temporary staging table and merged into the
+customer table on its unique phone_number; other databases fall back to
+chunked bulk_create.
+'''
+import csv
+import io
+import json
+import time
+
+import phonenumbers
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import invalidate_customer
+from .ids import new_id
+from .models import Customer
+
+FORMATS = ('csv', 'ndjson')
+# how many rejected rows are reported back in detail
+MAX_REPORTED_REJECTS = 100
+
+
+class ImportReport:
+    """
+    Counts what happened to the rows of an import.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.rejects = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, line: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({'line': line, 'error': error})
+
+    def finish(self) -> 'ImportReport':
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'rejects': self.rejects,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def read_rows(stream, fmt: str):
+    """
+    Yields (line number, row) pairs from a text stream.
+
+    Args:
+        stream: A text file-like object.
+        fmt: Either 'csv', with a header row, or 'ndjson'.
+
+    Yields:
+        Tuples of the line number and a dict for the row, or a string
+        describing why the line could not be parsed.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_num, 'Invalid JSON'
+                continue
+            yield line_num, row if isinstance(row, dict) else 'Not an object'
+    else:
+        raise ValueError(f'Format must be one of {", ".join(FORMATS)}')
+
+
+def normalize(row) -> tuple:
+    """
+    Validates a row and normalizes its phone number to E.164.
+
+    Returns:
+        A tuple of (name, phone_number).
+
+    Raises:
+        ValueError: If the row is not a valid customer.
+    """
+    if not isinstance(row, dict):
+        raise ValueError(row)
+    name = row.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError('Name must be a string')
+    name = name.strip()
+    if len(name) > Customer._meta.get_field('name').max_length:
+        raise ValueError('Name is too long')
+    try:
+        number = phonenumbers.parse(str(row.get('phone_number') or ''))
+    except phonenumbers.NumberParseException:
+        number = None
+    if number is None or not phonenumbers.is_valid_number(number):
+        raise ValueError('Valid phone should be +254703045843')
+    return name, phonenumbers.format_number(
+        number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def import_customers(stream, fmt: str, batch_size: int = 5000,
+                     update_existing: bool = False) -> ImportReport:
+    """
+    Imports the customers in a CSV or NDJSON stream.
+
+    Rows whose phone number appears earlier in the stream or already
+    belongs to a customer count as duplicates. Existing customers keep
+    their name unless update_existing is set.
+
+    Args:
+        stream: A text file-like object.
+        fmt: Either 'csv' or 'ndjson'.
+        batch_size: How many rows are validated and written at a time.
+        update_existing: Whether to update the name of customers whose
+        phone number is already in the database.
+
+    Returns:
+        The ImportReport of the run.
+    """
+    report = ImportReport()
+    load = _copy_batch if connection.vendor == 'postgresql' else _bulk_batch
+    seen = set()
+    batch = []
+
+    for line_num, row in read_rows(stream, fmt):
+        report.rows += 1
+        try:
+            name, phone_number = normalize(row)
+        except ValueError as error:
+            report.reject(line_num, str(error))
+            continue
+        if phone_number in seen:
+            report.duplicates += 1
+            continue
+        seen.add(phone_number)
+        batch.append((name, phone_number))
+        if len(batch) >= batch_size:
+            load(batch, report, update_existing)
+            batch = []
+    if batch:
+        load(batch, report, update_existing)
+    return report.finish()
+
+
+def _copy_batch(batch: list, report: ImportReport,
+                update_existing: bool) -> None:
+    """
+    Loads a batch with COPY into a staging table and merges it into
+    the customer table on phone_number.
+    """
+    table = Customer._meta.db_table
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for name, phone_number in batch:
+        writer.writerow([new_id(), name, phone_number])
+    buffer.seek(0)
+
+    if update_existing:
+        conflict = (
+            'DO UPDATE SET name = EXCLUDED.name, '
+            'updated_at = EXCLUDED.updated_at')
+    else:
+        conflict = 'DO NOTHING'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS customer_import '
+            '(id uuid, name varchar(50), phone_number varchar(128)) '
+            'ON COMMIT DELETE ROWS')
+        cursor.copy_expert(
+            'COPY customer_import (id, name, phone_number) '
+            'FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(f'''
+            INSERT INTO {table} (id, created_at, updated_at, name,
+                phone_number, order_count, total_amount)
+            SELECT id, %s, %s, name, phone_number, 0, 0 FROM customer_import
+            ON CONFLICT (phone_number) {conflict}
+            RETURNING id, xmax = 0''', [timezone.now()] * 2)
+        written = cursor.fetchall()
+
+    created = sum(1 for _, inserted in written if inserted)
+    report.created += created
+    if update_existing:
+        report.updated += len(written) - created
+        for customer_id, inserted in written:
+            if not inserted:
+                invalidate_customer(customer_id)
+    else:
+        report.duplicates += len(batch) - len(written)
+
+
+def _bulk_batch(batch: list, report: ImportReport,
+                update_existing: bool) -> None:
+    """
+    Loads a batch with bulk_create, for databases without COPY.
+    """
+    names = {phone_number: name for name, phone_number in batch}
+    existing = {
+        str(customer.phone_number): customer
+        for customer in Customer.objects.filter(phone_number__in=names)}
+
+    new = [
+        Customer(name=name, phone_number=phone_number)
+        for phone_number, name in names.items()
+        if phone_number not in existing]
+    with transaction.atomic():
+        Customer.objects.bulk_create(new)
+        if update_existing and existing:
+            now = timezone.now()
+            for phone_number, customer in existing.items():
+                customer.name = names[phone_number]
+                customer.updated_at = now
+            Customer.objects.bulk_update(
+                existing.values(), ['name', 'updated_at'])
+
+    report.created += len(new)
+    if update_existing:
+        report.updated += len(existing)
+        for customer in existing.values():
+            invalidate_customer(customer.id)
+    else:
+        report.duplicates += len(existing)
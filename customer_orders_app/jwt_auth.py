@@ -0,0 +1,174 @@
+'''
+Stateless JWT authentication for API clients.
+
+Clients trade a username and password for an access and refresh token
+pair at token/jwt/ and send the access token as "Authorization: Bearer
+<token>". Requests are then authenticated from the token's signature and
+claims alone (JWTStatelessUserAuthentication), with no database or Redis
+round trip.
+
+Tokens carry the id of the key that signed them in their kid header.
+JWT_SIGNING_KEYS holds every key still accepted; the first signs new
+tokens, so keys can be rotated without logging clients out.
+
+Revoked tokens are listed by jti in a Redis sorted set, scored by their
+expiry and pruned as they expire. Each process keeps a copy, reread at
+most every JWT_REVOCATION_REFRESH seconds, that access tokens are
+checked against; refresh tokens are checked against Redis itself. Redis
+is called through the client of redis_client, which gives up after
+REDIS_REQUEST_TIMEOUT seconds; while it cannot be reached, the copy last
+read is used. Without REDIS_URL a revocation only reaches the process
+that made it.
+'''
+import logging
+import time
+
+import jwt
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = 'jwt:revoked'
+
+
+class RotatingTokenBackend(TokenBackend):
+    """
+    Signs tokens with the first of several HMAC keys and verifies them
+    with the key named by their kid header.
+
+    Args:
+        keys: Secrets by key id, the signing key first.
+    """
+
+    def __init__(self, keys: dict, **kwargs):
+        self.keys = keys
+        self.kid = next(iter(keys))
+        super().__init__(signing_key=keys[self.kid], **kwargs)
+
+    def get_verifying_key(self, token) -> str:
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError('Token is invalid or expired') from ex
+        if kid not in self.keys:
+            raise TokenBackendError('Token was signed with an unknown key')
+        return self.keys[kid]
+
+    def encode(self, payload: dict) -> str:
+        return jwt.encode(
+            payload, self.signing_key, algorithm=self.algorithm,
+            headers={'kid': self.kid}, json_encoder=self.json_encoder)
+
+
+token_backend = RotatingTokenBackend(
+    settings.JWT_SIGNING_KEYS,
+    algorithm=api_settings.ALGORITHM,
+    leeway=api_settings.LEEWAY,
+    json_encoder=api_settings.JSON_ENCODER)
+
+
+class RevocationList:
+    """
+    The jtis of revoked tokens that have not expired yet.
+    """
+
+    def __init__(self):
+        self.revoked = set()
+        self.loaded_at = None
+
+    def revoke(self, jti: str, exp: int) -> None:
+        """
+        Lists a token as revoked until it expires.
+
+        Args:
+            jti: The token's id.
+            exp: The token's expiry, as a Unix timestamp.
+        """
+        client = get_client()
+        if client is not None:
+            with client.pipeline() as pipe:
+                pipe.zadd(REVOKED_KEY, {jti: exp})
+                pipe.zremrangebyscore(REVOKED_KEY, '-inf', time.time())
+                pipe.execute()
+        self.revoked.add(jti)
+
+    def load(self) -> None:
+        """
+        Rereads the list from Redis. Without REDIS_URL, or if Redis
+        cannot be reached, the copy held is kept until the next refresh.
+        """
+        self.loaded_at = time.monotonic()
+        client = get_client()
+        if client is None:
+            return
+        try:
+            jtis = client.zrangebyscore(REVOKED_KEY, time.time(), '+inf')
+        except RedisError:
+            logger.warning('Could not read the JWT revocation list')
+            return
+        self.revoked = {jti.decode() for jti in jtis}
+
+    def is_revoked(self, jti: str, fresh: bool = False) -> bool:
+        """
+        Tells whether a token was revoked.
+
+        Args:
+            jti: The token's id.
+            fresh: Read the list from Redis rather than trust a copy up
+            to JWT_REVOCATION_REFRESH seconds old.
+        """
+        if (fresh or self.loaded_at is None
+                or time.monotonic() - self.loaded_at
+                >= settings.JWT_REVOCATION_REFRESH):
+            self.load()
+        return jti in self.revoked
+
+
+revocations = RevocationList()
+
+
+class AccessToken(tokens.AccessToken):
+    _token_backend = token_backend
+
+    def verify(self) -> None:
+        super().verify()
+        if revocations.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError('Token has been revoked')
+
+    def revoke(self) -> None:
+        revocations.revoke(self[api_settings.JTI_CLAIM], self['exp'])
+
+
+class RefreshToken(tokens.RefreshToken):
+    _token_backend = token_backend
+    access_token_class = AccessToken
+
+    def verify(self) -> None:
+        super().verify()
+        if revocations.is_revoked(self[api_settings.JTI_CLAIM], fresh=True):
+            raise TokenError('Token has been revoked')
+
+    def revoke(self) -> None:
+        revocations.revoke(self[api_settings.JTI_CLAIM], self['exp'])
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # lets the stateless user report its username
+        token['username'] = user.get_username()
+        return token
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
@@ -0,0 +1,68 @@
+'''
+Management command that moves old monthly partitions of the orders
+table to compressed files
+'''
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from customer_orders_app.aggregates import orders_archived
+from customer_orders_app.partitioning import (
+    add_months, archive_partition, is_partitioned, month_start, partitions)
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes each monthly partition of the orders table older than '
+        'ORDER_ARCHIVE_AFTER_MONTHS months to a gzipped CSV file in '
+        'ORDER_ARCHIVE_DIR, then drops it and takes its orders out of '
+        'the customer aggregates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            default=settings.ORDER_ARCHIVE_AFTER_MONTHS,
+            help='Archive the months ending more than this many months ago')
+        parser.add_argument(
+            '--dir', default=settings.ORDER_ARCHIVE_DIR,
+            help='Directory the files are written to')
+        parser.add_argument(
+            '--database', action='append',
+            help='Database to archive from, by default every order shard')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the partitions to archive')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be at least 1 month')
+        cutoff = add_months(
+            month_start(timezone.now()), -options['older_than'])
+        total = 0
+        for alias in options['database'] or settings.ORDER_SHARDS:
+            connection = connections[alias]
+            if (connection.vendor != 'postgresql' or
+                    not is_partitioned(connection)):
+                raise CommandError(
+                    f'The orders table on {alias} is not partitioned, '
+                    'run partition_orders --convert first')
+            for month, name in partitions(connection).items():
+                if month >= cutoff:
+                    break
+                if options['dry_run']:
+                    self.stdout.write(f'{alias}: would archive {name}')
+                    continue
+                path, totals = archive_partition(
+                    connection, month, options['dir'])
+                orders_archived(totals)
+                rows = sum(count for count, _ in totals.values())
+                total += rows
+                self.stdout.write(
+                    f'{alias}: archived {rows} orders of {month:%Y-%m} '
+                    f'to {path}')
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(
+            f'{verb} the orders created before {cutoff:%Y-%m}'
+            + ('' if options['dry_run'] else f', {total} orders'))
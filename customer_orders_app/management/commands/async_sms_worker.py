@@ -0,0 +1,41 @@
+'''
+Management command that runs the asyncio SMS worker
+'''
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from customer_orders_app.async_worker import AsyncSmsWorker
+
+
+class Command(BaseCommand):
+    help = (
+        'Consumes the SMS queue with many gateway requests in flight per '
+        'process. Stop it with SIGTERM to drain the jobs in flight.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default=settings.SMS_QUEUE)
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='The most jobs in flight, and HTTP connections, at once')
+        parser.add_argument(
+            '--threads', type=int, default=16,
+            help='Threads for the Redis and database steps around a send')
+        parser.add_argument(
+            '--drain-timeout', type=float, default=30,
+            help='Seconds to wait for jobs in flight when stopping')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        worker = AsyncSmsWorker(
+            options['queue'],
+            concurrency=options['concurrency'],
+            threads=options['threads'],
+            drain_timeout=options['drain_timeout'],
+            burst=options['burst'])
+        asyncio.run(worker.run())
+        self.stdout.write(
+            f'Processed {worker.processed} jobs, {worker.failed} failed')
@@ -0,0 +1,51 @@
+'''
+Management command that imports customers from a CSV or NDJSON file
+'''
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from customer_orders_app.importer import FORMATS, import_customers
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports customers from a CSV file with name and phone_number '
+        'columns, or from NDJSON objects with the same keys.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to import, or - to read standard input')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Input format, guessed from the file extension if omitted')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--update-existing', action='store_true',
+            help='Update the name of customers that already exist')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            suffix = Path(path).suffix.lstrip('.').lower()
+            fmt = 'ndjson' if suffix in ('ndjson', 'jsonl') else 'csv'
+
+        if path == '-':
+            report = self._import(sys.stdin, fmt, options)
+        else:
+            try:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    report = self._import(stream, fmt, options)
+            except OSError as error:
+                raise CommandError(error)
+
+        self.stdout.write(json.dumps(report.as_dict(), indent=2))
+
+    def _import(self, stream, fmt, options):
+        return import_customers(
+            stream, fmt,
+            batch_size=options['batch_size'],
+            update_existing=options['update_existing'])
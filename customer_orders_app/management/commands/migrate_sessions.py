@@ -0,0 +1,74 @@
+'''
+Management command that copies live sessions from the database to the
+cache of the configured session engine
+'''
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies unexpired sessions from the django_session table into the '
+        'cache used by the cache or cached_db session engine, so users '
+        'stay logged in when SESSION_BACKEND changes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Delete the copied rows; only for the cache engine')
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        if not hasattr(engine.SessionStore, 'cache_key_prefix'):
+            raise CommandError(
+                f'{settings.SESSION_ENGINE} does not keep sessions in a cache')
+        if options['delete'] and hasattr(engine.SessionStore, 'get_model_class'):
+            raise CommandError(
+                f'{settings.SESSION_ENGINE} reads sessions from the database, '
+                'they cannot be deleted')
+
+        cache = caches[settings.SESSION_CACHE_ALIAS]
+        batch_size = options['batch_size']
+        now = timezone.now()
+        live = Session.objects.filter(expire_date__gt=now)
+        copied = []
+        # set_many takes one timeout, so sessions are grouped by the minute
+        # they expire in and expire from the cache up to a minute early
+        batch = {}
+
+        def flush():
+            for timeout, values in batch.items():
+                cache.set_many(values, timeout)
+            batch.clear()
+
+        for session in live.iterator(chunk_size=batch_size):
+            seconds = (session.expire_date - now).total_seconds()
+            timeout = int(seconds) // 60 * 60
+            if timeout < 60:
+                continue
+            store = engine.SessionStore(session.session_key)
+            batch.setdefault(timeout, {})[store.cache_key] = (
+                session.get_decoded())
+            copied.append((session.session_key, store.cache_key))
+            if len(copied) % batch_size == 0:
+                flush()
+        flush()
+
+        deleted = 0
+        if options['delete']:
+            # cache errors are ignored, so only rows the cache now holds go
+            for start in range(0, len(copied), batch_size):
+                chunk = dict(copied[start:start + batch_size])
+                cached = cache.get_many(chunk.values())
+                deleted += Session.objects.filter(session_key__in=[
+                    session_key for session_key, cache_key in chunk.items()
+                    if cache_key in cached]).delete()[0]
+
+        self.stdout.write(
+            f'Copied {len(copied)} sessions, deleted {deleted} rows')
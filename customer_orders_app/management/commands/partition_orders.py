@@ -0,0 +1,52 @@
+'''
+Management command that keeps monthly partitions of the orders table
+ready ahead of time on PostgreSQL
+'''
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from customer_orders_app.partitioning import (
+    add_months, convert, create_partitions, is_partitioned, month_start)
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates the monthly partitions of the orders table for the next '
+        'ORDER_PARTITION_MONTHS_AHEAD months. With --convert, first turns '
+        'an unpartitioned orders table into a partitioned one. Run it daily.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Partition the existing orders table; it is locked while '
+                 'the orders are copied')
+        parser.add_argument(
+            '--months-ahead', type=int,
+            default=settings.ORDER_PARTITION_MONTHS_AHEAD)
+        parser.add_argument(
+            '--database', action='append',
+            help='Database to partition, by default every order shard')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        through = add_months(month_start(now), options['months_ahead'])
+        for alias in options['database'] or settings.ORDER_SHARDS:
+            connection = connections[alias]
+            if connection.vendor != 'postgresql':
+                raise CommandError(
+                    f'{alias} is not PostgreSQL, orders are only '
+                    'partitioned on PostgreSQL')
+            if not is_partitioned(connection):
+                if not options['convert']:
+                    raise CommandError(
+                        f'The orders table on {alias} is not partitioned, '
+                        'run with --convert to partition it')
+                copied = convert(connection, through)
+                self.stdout.write(
+                    f'{alias}: partitioned the orders table, {copied} orders')
+            created = create_partitions(connection, now, through)
+            self.stdout.write(
+                f'{alias}: created {len(created)} partitions through '
+                f'{through:%Y-%m}')
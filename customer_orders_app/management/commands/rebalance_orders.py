@@ -0,0 +1,82 @@
+'''
+Management command that moves orders to the shard their customer hashes
+to, after ORDER_SHARD_URLS changed
+'''
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from customer_orders_app.models import Order
+from customer_orders_app.sharding import shard_for
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the orders of each customer to the shard the current '
+        'ORDER_SHARDS hash it to. Rows are copied before they are '
+        'deleted, so the command can be stopped and run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Customers whose orders are moved per transaction')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count the orders to move')
+
+    def handle(self, *args, **options):
+        total = 0
+        for source in settings.ORDER_SHARDS:
+            # read in full first, as rows are deleted from source below
+            misplaced = iter([
+                customer_id for customer_id in Order.objects.using(source)
+                .values_list('customer_id', flat=True)
+                .order_by('customer_id').distinct()
+                if shard_for(customer_id) != source])
+            while batch := list(islice(misplaced, options['batch_size'])):
+                by_target = {}
+                for customer_id in batch:
+                    by_target.setdefault(
+                        shard_for(customer_id), []).append(customer_id)
+                for target, customer_ids in by_target.items():
+                    moved = self.move(
+                        source, target, customer_ids, options['dry_run'])
+                    total += moved
+                    self.stdout.write(
+                        f'{source} -> {target}: {moved} orders of '
+                        f'{len(customer_ids)} customers')
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(f'{verb} {total} orders')
+
+    def move(self, source: str, target: str, customer_ids: list,
+             dry_run: bool) -> int:
+        """
+        Copies the orders of some customers from one shard to another,
+        then deletes them from the first.
+
+        Returns:
+            How many orders were moved.
+        """
+        orders = list(Order.objects.using(source).filter(
+            customer_id__in=customer_ids))
+        if dry_run:
+            return len(orders)
+
+        with transaction.atomic(using=target):
+            # left there by an earlier run stopped before deleting
+            existing = set(Order.objects.using(target).filter(
+                pk__in=[order.pk for order in orders],
+            ).values_list('pk', flat=True))
+            for order in orders:
+                if order.pk not in existing:
+                    # a raw save keeps created_at and updated_at as they are
+                    order.save_base(raw=True, force_insert=True, using=target)
+        # the copies are committed before the originals go, so the orders
+        # are never missing from both shards
+        with transaction.atomic(using=source):
+            Order.objects.using(source).filter(
+                pk__in=[order.pk for order in orders]).delete()
+        return len(orders)
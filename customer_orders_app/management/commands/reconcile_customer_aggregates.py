@@ -0,0 +1,39 @@
+'''
+Management command that repairs the order aggregates stored on customers
+'''
+from django.core.management.base import BaseCommand
+
+from customer_orders_app.aggregates import reconcile
+from customer_orders_app.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the order count, total amount and last order time of '
+        'every customer from their orders, and fixes the ones that drifted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Customers checked per transaction')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count the customers that drifted')
+
+    def handle(self, *args, **options):
+        checked, drifted = 0, 0
+        last_id = None
+        while True:
+            customers = Customer.objects.order_by('pk')
+            if last_id is not None:
+                customers = customers.filter(pk__gt=last_id)
+            batch = list(customers.values_list(
+                'pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            checked += len(batch)
+            drifted += len(reconcile(batch, options['dry_run']))
+            last_id = batch[-1]
+
+        verb = 'Would repair' if options['dry_run'] else 'Repaired'
+        self.stdout.write(f'{verb} {drifted} of {checked} customers')
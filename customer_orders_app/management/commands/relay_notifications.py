@@ -0,0 +1,56 @@
+'''
+Management command that relays outbox notifications to RQ
+'''
+import logging
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from customer_orders_app.notifications import relay
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves due order notifications from the outbox to the SMS queue, '
+        'polling until stopped. Several relays can run at once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait when nothing is due')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Relay everything due now, then exit')
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        batch_size = options['batch_size']
+        total = 0
+
+        while self.running:
+            try:
+                relayed = relay(batch_size)
+            except Exception:
+                # the batch was rolled back and is relayed on a later pass
+                logger.exception('Could not relay notifications')
+                if options['once']:
+                    raise
+                relayed = 0
+            total += relayed
+            if relayed < batch_size:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(f'Relayed {total} notifications')
+
+    def stop(self, signum, frame):
+        self.running = False
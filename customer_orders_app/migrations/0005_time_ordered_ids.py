@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:40
+#
+# Only the Python side default changes, so existing version 4 ids are kept
+# as they are and the column type stays uuid. Rows created after
+# UUID_VERSION is set to 7 get time ordered ids; the two kinds mix freely.
+
+import customer_orders_app.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_orders_app', '0004_order_access_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='id',
+            field=models.UUIDField(default=customer_orders_app.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='id',
+            field=models.UUIDField(default=customer_orders_app.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
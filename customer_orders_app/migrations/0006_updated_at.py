@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_created_at(apps, schema_editor):
+    """
+    Starts existing rows off as last modified when they were created.
+    """
+    for name in ('Customer', 'Order'):
+        model = apps.get_model('customer_orders_app', name)
+        model.objects.using(schema_editor.connection.alias).update(
+            updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_orders_app', '0005_time_ordered_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:07
+
+import customer_orders_app.ids
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_orders_app', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNotification',
+            fields=[
+                ('id', models.UUIDField(default=customer_orders_app.ids.new_id, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order_id', models.UUIDField()),
+                ('dedupe_key', models.CharField(max_length=100, unique=True)),
+                ('to', models.CharField(max_length=128)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.CharField(blank=True, default='', max_length=200)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'abstract': False,
+                'indexes': [models.Index(condition=models.Q(('status__in', ['pending', 'queued'])), fields=['available_at'], name='notification_due_idx')],
+            },
+        ),
+    ]
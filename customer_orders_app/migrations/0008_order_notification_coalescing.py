@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_orders_app', '0007_order_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordernotification',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name='ordernotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed'), ('merged', 'Merged')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations
+
+
+def drop_customer_constraint(apps, schema_editor):
+    """
+    Drops the foreign key from orders to customers on order shards other
+    than default, whose customer tables stay empty.
+    """
+    alias = schema_editor.connection.alias
+    if alias == DEFAULT_DB_ALIAS or alias not in settings.ORDER_SHARDS:
+        return
+    Order = apps.get_model('customer_orders_app', 'Order')
+    old_field = Order._meta.get_field('customer')
+    new_field = old_field.clone()
+    new_field.db_constraint = False
+    new_field.set_attributes_from_name(old_field.name)
+    new_field.model = Order
+    new_field.remote_field.model = old_field.remote_field.model
+    schema_editor.alter_field(Order, old_field, new_field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_orders_app', '0008_order_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_customer_constraint, migrations.RunPython.noop,
+            hints={'model_name': 'order'}),
+    ]
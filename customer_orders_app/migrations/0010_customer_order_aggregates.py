@@ -0,0 +1,53 @@
+# Generated by Django 4.2.10 on 2026-10-17 04:01
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_aggregates(apps, schema_editor):
+    """
+    Computes the aggregates of existing customers from their orders in
+    the same database; with order shards, run reconcile_customer_aggregates
+    afterwards.
+    """
+    alias = schema_editor.connection.alias
+    Customer = apps.get_model('customer_orders_app', 'Customer')
+    Order = apps.get_model('customer_orders_app', 'Order')
+    orders = Order.objects.using(alias).filter(
+        customer=models.OuterRef('pk')).order_by().values('customer')
+    Customer.objects.using(alias).update(
+        order_count=Coalesce(models.Subquery(
+            orders.annotate(count=models.Count('id')).values('count')), 0),
+        total_amount=Coalesce(
+            models.Subquery(
+                orders.annotate(total=models.Sum('amount')).values('total')),
+            0, output_field=models.DecimalField()),
+        last_order_at=models.Subquery(
+            orders.annotate(
+                latest=models.Max('created_at')).values('latest')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_orders_app', '0009_order_shard_customer_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
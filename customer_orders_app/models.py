@@ -4,21 +4,27 @@ This module defines classes that will be mapped into
 database tables
 '''
 from django.db import models
-import uuid
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
+from .ids import new_id
+from . import sharding
 
 
 class BaseModel(models.Model):
     """
     Base model class for other models to inherit common fields.
+
+    Ids are random UUIDs by default; set UUID_VERSION to 7 for time
+    ordered ids that keep inserts on the right edge of the indexes.
     """
 
     id = models.UUIDField(
-        default=uuid.uuid4,
+        default=new_id,
         editable=False,
         primary_key=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['created_at']
@@ -28,9 +34,22 @@ class BaseModel(models.Model):
 class Customer(BaseModel):
     """
     Represents a customer in the system.
+
+    order_count, total_amount and last_order_at summarise the customer's
+    orders. The order views keep them up to date, and the
+    reconcile_customer_aggregates command repairs them.
     """
     name = models.CharField(max_length=50)
     phone_number = PhoneNumberField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=['created_at'], name='customer_created_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not isinstance(self.name, str):
@@ -43,6 +62,31 @@ class Customer(BaseModel):
         return self.name
 
 
+class OrderQuerySet(models.QuerySet):
+    """
+    Writes new orders to their customer's shard unless a database is
+    chosen with using().
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None or not sharding.sharded():
+            return super().create(**kwargs)
+        customer_id = kwargs.get('customer_id') or kwargs['customer'].pk
+        return self.using(sharding.shard_for(customer_id)).create(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not sharding.sharded():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        by_shard = {}
+        for obj in objs:
+            by_shard.setdefault(
+                sharding.shard_for(obj.customer_id), []).append(obj)
+        for alias, shard_objs in by_shard.items():
+            self.using(alias).bulk_create(shard_objs, *args, **kwargs)
+        return objs
+
+
 class Order(BaseModel):
     """
     Represents an order made by a customer.
@@ -57,5 +101,76 @@ class Order(BaseModel):
     item = models.CharField(max_length=50, blank=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2, blank=False)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # per customer listings ordered by creation time
+            models.Index(
+                fields=['customer', 'created_at'],
+                name='order_customer_created_idx'),
+            # the list views and keyset pagination order on (created_at, id)
+            models.Index(
+                fields=['created_at', 'id'], name='order_created_id_idx'),
+        ]
+
     def __str__(self) -> str:
         return f'{self.item} - {self.amount}'
+
+
+class OrderNotification(BaseModel):
+    """
+    An SMS notification waiting to be relayed to the queue (the outbox).
+
+    Rows are written in the same transaction as their order, so an order
+    that is rolled back never notifies, and relayed to RQ by the
+    relay_notifications command. order_id is a plain column rather than
+    a foreign key so the outbox does not tie the orders table down.
+
+    Args:
+        order_id: The order the notification is about.
+        dedupe_key: Identifies the notification across redeliveries.
+        to: The recipient phone number.
+        message: The text of the SMS.
+        amount: The order amount, summed when notifications are merged.
+        status: Where the notification is in its delivery.
+        attempts: How many times it has been relayed.
+        available_at: When the relay should next pick it up.
+        last_error: Why the last delivery failed.
+    """
+    PENDING = 'pending'
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+    # folded into another notification to the same number, never sent
+    MERGED = 'merged'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (QUEUED, 'Queued'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+        (MERGED, 'Merged'),
+    ]
+
+    order_id = models.UUIDField()
+    dedupe_key = models.CharField(max_length=100, unique=True)
+    to = models.CharField(max_length=128)
+    message = models.TextField()
+    amount = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=200, blank=True, default='')
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # the relay only scans notifications still to be delivered
+            models.Index(
+                fields=['available_at'], name='notification_due_idx',
+                condition=models.Q(status__in=['pending', 'queued'])),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.dedupe_key} ({self.status})'
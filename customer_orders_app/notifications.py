@@ -0,0 +1,223 @@
+'''
+Queues the SMS notifications sent to customers when orders are created.
+
+Notifications go through an outbox: the request that creates an order
+writes an OrderNotification row in the same transaction, and the relay
+(the relay_notifications command) moves due rows to RQ in batches. The
+request path never talks to Redis, and a notification is only ever sent
+for an order that was committed.
+
+With SMS_COALESCE_WINDOW set, a new notification only becomes due after
+the window, and the relay merges it with the notifications created for
+the same number in the meantime: identical messages are sent once, and
+different ones are replaced by one summary of the orders.
+'''
+from collections import defaultdict
+from datetime import timedelta
+
+import django_rq
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rq import Queue
+
+from . import sms_batcher
+from .delivery import send_notification
+from .models import OrderNotification
+from .sms_sender import order_message, summary_message
+
+SENDS_SAVED_KEY = 'sms:sends-saved'
+
+
+def order_sms_data(order) -> dict:
+    """
+    Returns the order information included in the SMS.
+    """
+    return {'item': order.item, 'amount': order.amount}
+
+
+def add_order_notifications(orders: list) -> list:
+    """
+    Writes the SMS notifications of new orders to the outbox.
+
+    Call it inside the transaction that creates the orders.
+
+    Args:
+        orders: Orders with their customer loaded.
+
+    Returns:
+        The created OrderNotification rows.
+    """
+    available_at = timezone.now() + timedelta(
+        seconds=settings.SMS_COALESCE_WINDOW)
+    return OrderNotification.objects.bulk_create([
+        OrderNotification(
+            order_id=order.id,
+            dedupe_key=f'order-created:{order.id}',
+            to=str(order.customer.phone_number),
+            message=order_message(order_sms_data(order)),
+            amount=order.amount,
+            available_at=available_at)
+        for order in orders
+    ])
+
+
+def coalesce(due: list, now) -> list:
+    """
+    Merges the notifications to each number that were never relayed.
+
+    Besides the due notifications, this takes the ones to the same
+    numbers still waiting out their window. Of each number's
+    notifications, identical messages are kept once; if different
+    messages remain and every amount is known, a summary notification
+    replaces them all. Notifications left out are marked merged. Call it
+    inside the relay's transaction.
+
+    Args:
+        due: The locked, due notifications.
+        now: The time of the relay.
+
+    Returns:
+        The notifications to dispatch.
+    """
+    fresh = [
+        notification for notification in due
+        if notification.status == OrderNotification.PENDING
+        and notification.attempts == 0]
+    if not fresh:
+        return due
+    waiting = OrderNotification.objects.select_for_update(
+        skip_locked=True).filter(
+            to__in={notification.to for notification in fresh},
+            status=OrderNotification.PENDING,
+            attempts=0,
+            available_at__lte=now + timedelta(
+                seconds=settings.SMS_COALESCE_WINDOW),
+        ).exclude(pk__in=[notification.pk for notification in due])
+
+    by_number = defaultdict(list)
+    for notification in sorted(
+            fresh + list(waiting), key=lambda row: row.available_at):
+        by_number[notification.to].append(notification)
+
+    sends, summaries, merged = [], [], []
+    for to, notifications in by_number.items():
+        distinct = {}
+        for notification in notifications:
+            distinct.setdefault(notification.message, notification)
+        amounts = [notification.amount for notification in notifications]
+        if len(distinct) > 1 and None not in amounts:
+            first = notifications[0]
+            summary = OrderNotification(
+                order_id=first.order_id,
+                dedupe_key=f'coalesced:{first.dedupe_key}',
+                to=to,
+                message=summary_message(len(notifications), sum(amounts)),
+                amount=sum(amounts),
+                available_at=now)
+            summaries.append(summary)
+            kept = [summary]
+        else:
+            kept = list(distinct.values())
+        sends.extend(kept)
+        merged.extend(
+            notification for notification in notifications
+            if notification not in kept)
+
+    if summaries:
+        OrderNotification.objects.bulk_create(summaries)
+    if merged:
+        OrderNotification.objects.filter(
+            pk__in=[notification.pk for notification in merged]).update(
+                status=OrderNotification.MERGED, updated_at=now)
+        transaction.on_commit(lambda: django_rq.get_connection(
+            'default').incrby(SENDS_SAVED_KEY, len(merged)))
+
+    fresh_pks = {notification.pk for notification in fresh}
+    return [
+        notification for notification in due
+        if notification.pk not in fresh_pks] + sends
+
+
+def coalescing_stats() -> dict:
+    """
+    Returns how many SMS coalescing has saved, for monitoring.
+    """
+    saved = django_rq.get_connection('default').get(SENDS_SAVED_KEY)
+    return {
+        'window': settings.SMS_COALESCE_WINDOW,
+        'sends_saved': int(saved or 0),
+    }
+
+
+def dispatch(notifications: list) -> None:
+    """
+    Hands outbox notifications to RQ.
+
+    With SMS_BATCH_WINDOW set, the notifications go to the batcher and
+    are sent with the others of the same window. Otherwise one
+    send_notification job per notification is enqueued in a single
+    Redis round trip.
+    """
+    if settings.SMS_BATCH_WINDOW > 0:
+        sms_batcher.add([
+            {'order_id': str(notification.order_id),
+             'dedupe_key': notification.dedupe_key,
+             'to': notification.to,
+             'message': notification.message}
+            for notification in notifications])
+        return
+
+    queue = django_rq.get_queue(settings.SMS_QUEUE)
+    queue.enqueue_many([
+        Queue.prepare_data(
+            send_notification,
+            args=(notification.dedupe_key, notification.to,
+                  notification.message))
+        for notification in notifications
+    ])
+
+
+def relay(batch_size: int = None) -> int:
+    """
+    Moves one batch of due outbox notifications to RQ.
+
+    The batch is locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    several relays can run side by side without picking the same rows.
+    Relayed rows are marked queued and become due again after
+    OUTBOX_REQUEUE_AFTER seconds unless a worker reports them sent or
+    failed first, so a job lost in Redis is relayed again. When
+    dispatching fails the transaction rolls back and the rows stay due.
+
+    Args:
+        batch_size: The most notifications to relay, OUTBOX_BATCH_SIZE
+        by default.
+
+    Returns:
+        How many notifications were relayed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            OrderNotification.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=[
+                    OrderNotification.PENDING, OrderNotification.QUEUED],
+                available_at__lte=now)
+            .order_by('available_at')
+            [:batch_size or settings.OUTBOX_BATCH_SIZE])
+        if not due:
+            return 0
+
+        if settings.SMS_COALESCE_WINDOW > 0:
+            due = coalesce(due, now)
+        dispatch(due)
+        OrderNotification.objects.filter(
+            pk__in=[notification.pk for notification in due]).update(
+                status=OrderNotification.QUEUED,
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(
+                    seconds=settings.OUTBOX_REQUEUE_AFTER),
+                updated_at=now)
+    return len(due)
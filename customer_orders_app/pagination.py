@@ -0,0 +1,348 @@
+'''
+Defines pagination classes used by the customer and order list views
+'''
+import hashlib
+import json
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
+
+def estimate_count(queryset) -> int:
+    """
+    Returns the planner's row estimate for the queryset on PostgreSQL.
+
+    Args:
+        queryset: The queryset to estimate.
+
+    Returns:
+        The estimated number of rows, or None when the database does
+        not provide an estimate.
+    """
+    if querysets := getattr(queryset, 'querysets', None):
+        # the same query on several order shards
+        estimates = [estimate_count(shard) for shard in querysets]
+        return None if None in estimates else sum(estimates)
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset, mode: str, counter: callable) -> int:
+    """
+    Returns the count for the queryset from the cache, calling counter
+    and caching its result on a miss.
+
+    Counts below LIST_COUNT_CACHE_MIN_ROWS are cheap to compute and are
+    never cached, so small tables always report an exact count.
+    """
+    query = str(queryset.order_by().query)
+    digest = hashlib.sha1(f'{queryset.db}:{mode}:{query}'.encode())
+    key = f'list-count:{digest.hexdigest()}'
+
+    count = cache.get(key)
+    if count is None:
+        count = counter()
+        if count is not None and count >= settings.LIST_COUNT_CACHE_MIN_ROWS:
+            cache.set(key, count, settings.LIST_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class LookaheadPage(Page):
+    """
+    A page that knows whether a next page exists without a total count.
+    """
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CountModePaginator(Paginator):
+    """
+    Paginator whose count is exact, a planner estimate or skipped.
+
+    Outside exact mode the page is fetched with one extra row to tell if
+    a next page exists, so an estimated or missing count never decides
+    which pages are valid.
+    """
+
+    def __init__(self, object_list, per_page, count_mode=COUNT_EXACT,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_mode = count_mode
+        self.last_page_seen = None
+
+    @cached_property
+    def count(self):
+        if self.count_mode == COUNT_NONE:
+            return None
+        if self.count_mode == COUNT_ESTIMATE:
+            estimate = cached_count(
+                self.object_list, COUNT_ESTIMATE,
+                lambda: estimate_count(self.object_list))
+            if estimate is not None:
+                return estimate
+        return cached_count(
+            self.object_list, COUNT_EXACT,
+            lambda: Paginator.count.func(self))
+
+    @cached_property
+    def num_pages(self):
+        if self.count_mode == COUNT_EXACT:
+            return super().num_pages
+        # only the pages known to exist so far
+        return self.last_page_seen or 1
+
+    def validate_number(self, number):
+        if self.count_mode == COUNT_EXACT:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if self.count_mode == COUNT_EXACT:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        has_more = len(rows) > self.per_page
+        self.last_page_seen = number + 1 if has_more else number
+        return LookaheadPage(rows[:self.per_page], number, self, has_more)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id), the same ordering as
+    BaseModel.Meta.ordering with the primary key as a tie breaker.
+
+    Each page is fetched with a range condition on the last row seen
+    instead of an OFFSET, and no COUNT(*) is issued, so every page costs
+    the same no matter how deep the client has paged.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+    display_page_controls = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Returns the rows of the page addressed by the cursor in the
+        request, or the first page when no cursor is given.
+
+        Args:
+            queryset: The queryset to paginate.
+            request: The HTTP request object.
+            view: The view calling the paginator.
+
+        Returns:
+            A list with at most page_size objects.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request)
+        self.has_cursor = position is not None
+
+        if self.reverse:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            queryset = queryset.order_by('created_at', 'id')
+        if position is not None:
+            queryset = queryset.filter(self.after(*position))
+
+        # one extra row tells us whether there is anything past this page
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = self.has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+
+        self.page = rows
+        return rows
+
+    def after(self, created_at: datetime, pk: uuid.UUID) -> Q:
+        """
+        Builds the keyset condition selecting rows strictly after the
+        given position in the direction of traversal.
+        """
+        lookup = 'lt' if self.reverse else 'gt'
+        return (
+            Q(**{f'created_at__{lookup}': created_at}) |
+            Q(created_at=created_at, **{f'id__{lookup}': pk}))
+
+    def get_page_size(self, request) -> int:
+        """
+        Returns the page size requested by the client, capped at
+        max_page_size, falling back to the default page size.
+        """
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.link_for(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.link_for(self.page[0], reverse=True)
+
+    def link_for(self, instance, reverse: bool) -> str:
+        token = self.encode_cursor(instance.created_at, instance.pk, reverse)
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, token)
+
+    def encode_cursor(
+            self, created_at: datetime, pk: uuid.UUID, reverse: bool) -> str:
+        """
+        Encodes a position into an opaque, url safe cursor token.
+        """
+        payload = {'c': created_at.isoformat(), 'i': str(pk), 'r': reverse}
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request) -> tuple:
+        """
+        Decodes the cursor token in the request.
+
+        Returns:
+            A tuple of ((created_at, id) or None, reverse).
+
+        Raises:
+            NotFound: If the cursor token is malformed.
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            raw = urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw)
+            position = (
+                datetime.fromisoformat(payload['c']),
+                uuid.UUID(payload['i']))
+            return position, bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class ListPagination(PageNumberPagination):
+    """
+    Page number pagination for the list views that switches to keyset
+    pagination when the client passes ?pagination=cursor or a cursor
+    token from a previous keyset page.
+
+    In page number mode ?count=exact|estimate|none picks how the total
+    count is worked out; counts of large tables are cached briefly.
+    """
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.wants_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.count_mode = self.get_count_mode(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_page_number(self, request, paginator):
+        requested = request.query_params.get(self.page_query_param)
+        if (requested in self.last_page_strings and
+                self.count_mode != COUNT_EXACT):
+            # without an exact count the last page is not known
+            raise NotFound(
+                f'{self.page_query_param}={requested} needs '
+                f'{self.count_query_param}={COUNT_EXACT}, the last page '
+                'is unknown without a count')
+        return super().get_page_number(request, paginator)
+
+    def django_paginator_class(self, queryset, page_size):
+        return CountModePaginator(
+            queryset, page_size, count_mode=self.count_mode)
+
+    def get_count_mode(self, request) -> str:
+        """
+        Returns the count mode asked for by the client, defaulting to
+        an exact count.
+        """
+        mode = request.query_params.get(self.count_query_param)
+        return mode if mode in COUNT_MODES else COUNT_EXACT
+
+    def wants_keyset(self, request) -> bool:
+        """
+        Checks whether the request asks for keyset pagination.
+        """
+        params = request.query_params
+        return (
+            params.get(self.mode_query_param) == 'cursor' or
+            self.keyset_class.cursor_query_param in params)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,227 @@
+'''
+Monthly range partitions of the orders table on PostgreSQL.
+
+convert turns the orders table into one partitioned on created_at, with
+a partition per month and a default partition for rows outside them.
+The primary key becomes (id, created_at), as a partitioned table's keys
+must include the partition column; ids are still unique in practice,
+being UUIDs. Queries filtering or ordering on created_at only touch the
+partitions they need, and each partition's indexes stay small.
+
+create_partitions adds the partitions of coming months ahead of time,
+and archive_partition copies an old month to a gzipped CSV file before
+dropping it. Orders in a dropped partition are no longer served by the
+API; a file can be loaded back with COPY ... FROM.
+'''
+import gzip
+import os
+import re
+from datetime import datetime, timezone
+
+from django.db import transaction
+
+from .models import Order
+
+TABLE = Order._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_(\d{{4}})_(\d{{2}})$')
+
+
+def month_start(moment: datetime) -> datetime:
+    """
+    Returns the start of the month (UTC) a moment falls in.
+    """
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """
+    Returns the start of the month count months after the given one.
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{TABLE}_{month:%Y_%m}'
+
+
+def _bounds(month: datetime) -> str:
+    return (f"FROM ('{month.isoformat()}') "
+            f"TO ('{add_months(month, 1).isoformat()}')")
+
+
+def is_partitioned(connection) -> bool:
+    """
+    Checks whether the orders table on a connection is partitioned.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+            [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions(connection) -> dict:
+    """
+    Returns the monthly partitions of the orders table.
+
+    Returns:
+        The partition names by the start of their month, oldest first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)', [TABLE])
+        names = [name for name, in cursor.fetchall()]
+    months = {}
+    for name in names:
+        if match := PARTITION_NAME.match(name):
+            year, month = map(int, match.groups())
+            months[datetime(year, month, 1, tzinfo=timezone.utc)] = name
+    return dict(sorted(months.items()))
+
+
+def convert(connection, through: datetime) -> int:
+    """
+    Rebuilds the orders table as a partitioned table, with partitions
+    from the month of the oldest order to the month through.
+
+    The table is locked while the orders are copied, so run this when
+    orders are not being placed.
+
+    Returns:
+        How many orders were copied.
+    """
+    quote = connection.ops.quote_name
+    staging = f'{TABLE}_partitioned'
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        # tables with deferred foreign key checks pending cannot be dropped
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        # recreated on the new table once the old one is dropped
+        cursor.execute(
+            'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+            'WHERE indrelid = to_regclass(%s) AND NOT indisprimary', [TABLE])
+        indexes = [definition for definition, in cursor.fetchall()]
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'", [TABLE])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT min(created_at) FROM {quote(TABLE)}')
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(
+            f'CREATE TABLE {quote(staging)} (LIKE {quote(TABLE)} '
+            'INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (created_at)')
+        cursor.execute(
+            f'CREATE TABLE {quote(DEFAULT_PARTITION)} '
+            f'PARTITION OF {quote(staging)} DEFAULT')
+        month = month_start(oldest) if oldest else month_start(through)
+        while month <= through:
+            cursor.execute(
+                f'CREATE TABLE {quote(partition_name(month))} '
+                f'PARTITION OF {quote(staging)} FOR VALUES {_bounds(month)}')
+            month = add_months(month, 1)
+        cursor.execute(
+            f'INSERT INTO {quote(staging)} SELECT * FROM {quote(TABLE)}')
+        copied = cursor.rowcount
+
+        cursor.execute(f'DROP TABLE {quote(TABLE)}')
+        cursor.execute(
+            f'ALTER TABLE {quote(staging)} RENAME TO {quote(TABLE)}')
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT '
+            f'{quote(TABLE + "_pkey")} PRIMARY KEY (id, created_at)')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE {quote(TABLE)} '
+                f'ADD CONSTRAINT {quote(name)} {definition}')
+    return copied
+
+
+def create_partitions(connection, start: datetime, through: datetime) -> list:
+    """
+    Adds the missing monthly partitions from start to through.
+
+    Orders already in the default partition for one of those months are
+    moved into its new partition.
+
+    Returns:
+        The names of the partitions created.
+    """
+    quote = connection.ops.quote_name
+    existing = partitions(connection)
+    created = []
+    month = month_start(start)
+    while month <= through:
+        if month not in existing:
+            name = partition_name(month)
+            with transaction.atomic(using=connection.alias), \
+                    connection.cursor() as cursor:
+                # attaching checks the default partition holds no rows
+                # for the month, so they are moved over first
+                cursor.execute(
+                    f'CREATE TABLE {quote(name)} (LIKE {quote(TABLE)} '
+                    'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+                    'WHERE created_at >= %s AND created_at < %s '
+                    f'RETURNING *) INSERT INTO {quote(name)} '
+                    'SELECT * FROM moved', [month, add_months(month, 1)])
+                cursor.execute(
+                    f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION '
+                    f'{quote(name)} FOR VALUES {_bounds(month)}')
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def archive_partition(connection, month: datetime, directory) -> tuple:
+    """
+    Writes a month's orders to a gzipped CSV file in directory, then
+    drops its partition.
+
+    The partition is locked against writes while it is copied, and
+    dropped only once the file is on disk. Detaching it briefly locks
+    the orders table.
+
+    Returns:
+        The path of the file, and the number and total amount of the
+        archived orders by customer id.
+    """
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    path = os.path.join(
+        directory, f'orders-{connection.alias}-{month:%Y-%m}.csv.gz')
+    partial = f'{path}.partial'
+    os.makedirs(directory, exist_ok=True)
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(name)} IN SHARE MODE')
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        with open(partial, 'wb') as file:
+            with gzip.GzipFile(fileobj=file, mode='wb') as archive:
+                cursor.copy_expert(
+                    f'COPY {quote(name)} TO STDOUT WITH (FORMAT csv, HEADER)',
+                    archive)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(partial, path)
+        cursor.execute(
+            f'SELECT customer_id, count(*), sum(amount) FROM {quote(name)} '
+            'GROUP BY customer_id')
+        totals = {
+            customer_id: (count, amount)
+            for customer_id, count, amount in cursor.fetchall()}
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+        cursor.execute(f'DROP TABLE {quote(name)}')
+    return path, totals
@@ -0,0 +1,32 @@
+'''
+The Redis client used while serving requests.
+
+django_rq's connection has no socket timeouts, so a Redis host that
+stops answering holds a request until the operating system gives up on
+the connection. Code that calls Redis in the middle of a request uses
+this client instead. It connects to REDIS_URL, and gives Redis
+REDIS_REQUEST_TIMEOUT seconds to connect and to answer each command
+before raising a RedisError, which callers treat as Redis being
+unavailable.
+'''
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """
+    Returns the client of the process, created on first use, so every
+    caller shares one connection pool.
+
+    Returns:
+        A redis.Redis client, or None when REDIS_URL is not set.
+    """
+    if not settings.REDIS_URL:
+        return None
+    return redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.REDIS_REQUEST_TIMEOUT,
+        socket_timeout=settings.REDIS_REQUEST_TIMEOUT)
@@ -0,0 +1,201 @@
+'''
+Routes reads of safe requests to read replicas.
+
+A view opts in with replica_reads = True. ReplicaRoutingMiddleware marks
+its GET and HEAD requests, and while one is handled ReplicaRouter sends
+reads of this app's models to a replica. Any other read, and every
+write, goes to the primary. A replica is only used while its lag is
+under REPLICA_MAX_LAG, so a lagging or unreachable one is skipped. After
+a request that writes, the user's reads stay on the primary for
+REPLICA_PIN_SECONDS, so they see their own writes.
+'''
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# seconds the replica is behind, 0 while it has replayed everything it
+# received; NULL on a server that is not a replica
+POSTGRES_LAG = '''
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+'''
+
+# alias -> (checked at, lag in seconds or None when unreachable)
+_lags = {}
+
+
+class RequestState:
+    """
+    What the router knows about the request being handled.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.replica_reads = False
+        self.primary = False
+        self.wrote = False
+        self._pinned = None
+
+    @property
+    def pinned(self) -> bool:
+        # looked up on the first routed read, after authentication
+        if self._pinned is None:
+            key = pin_key(self.request)
+            self._pinned = key is not None and bool(cache.get(key))
+        return self._pinned
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+def pin_key(request):
+    """
+    Returns the cache key pinning a user to the primary, or None for
+    anonymous requests.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return f'replica-pin:{user.pk}'
+
+
+def replica_lag(alias: str):
+    """
+    Returns how many seconds a replica is behind the primary, measured
+    at most every REPLICA_LAG_CHECK seconds.
+
+    Args:
+        alias: The replica's database alias.
+
+    Returns:
+        The lag in seconds, or None when the replica cannot be reached.
+    """
+    now = time.monotonic()
+    checked_at, lag = _lags.get(alias, (None, None))
+    if (checked_at is not None and
+            now - checked_at < settings.REPLICA_LAG_CHECK):
+        return lag
+
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG)
+                lag = float(cursor.fetchone()[0] or 0)
+        else:
+            # other backends are only replicas in local testing
+            connection.ensure_connection()
+            lag = 0.0
+    except DatabaseError as error:
+        logger.warning('Replica %s is unavailable: %s', alias, error)
+        lag = None
+    _lags[alias] = (now, lag)
+    return lag
+
+
+@contextmanager
+def primary_if_recent(changed_at):
+    """
+    Reads from the primary inside the block when changed_at is recent
+    enough that a replica may not have the change yet.
+
+    Responses cached or validated with a version newer than the data
+    they were built from would stay stale, so views read such data from
+    the primary.
+
+    Args:
+        changed_at: When the data was last changed, or None when
+            nothing is cached or validated with it.
+    """
+    state = _state.get()
+    if state is None or state.primary:
+        yield
+        return
+    state.primary = changed_at is not None and (
+        changed_at > timezone.now() - timedelta(
+            seconds=settings.REPLICA_MAX_LAG))
+    try:
+        yield
+    finally:
+        state.primary = False
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Tracks the request for ReplicaRouter and pins users who write to
+    the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and (key := pin_key(request)) is not None:
+            cache.set(key, 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if (request.method in SAFE_METHODS and
+                getattr(view_class, 'replica_reads', False) and
+                settings.DATABASE_REPLICAS):
+            _state.get().replica_reads = True
+
+
+class ReplicaRouter:
+    """
+    Sends reads of this app's models during replica_reads requests to a
+    replica that is not lagging, and everything else to the primary.
+    """
+    app_label = 'customer_orders_app'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        state = _state.get()
+        if (state is None or not state.replica_reads or state.primary or
+                state.wrote or state.pinned):
+            return DEFAULT_DB_ALIAS
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if (lag := replica_lag(alias)) is not None and
+            lag < settings.REPLICA_MAX_LAG]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        # never the replica an instance was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
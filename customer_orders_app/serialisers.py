@@ -5,6 +5,16 @@ and vis vasa
 from .models import Customer, Order
 from rest_framework import serializers
 
+AGGREGATE_FIELDS = ['order_count', 'total_amount', 'last_order_at']
+
+
+def include_aggregates(request) -> bool:
+    """
+    Checks whether a request asks for customer order aggregates with
+    ?include=aggregates.
+    """
+    return 'aggregates' in request.query_params.get('include', '').split(',')
+
 
 class BaseSerialiser(serializers.ModelSerializer):
     def create(self, validated_data):
@@ -33,10 +43,12 @@ class BaseSerialiser(serializers.ModelSerializer):
         Returns:
             The updated object instance.
         """
+        update_fields = ['updated_at']
         for key, value in validated_data.items():
             if hasattr(instance, key):
                 setattr(instance, key, value)
-        instance.save()
+                update_fields.append(key)
+        instance.save(update_fields=update_fields)
         return instance
 
 
@@ -45,13 +57,25 @@ class CustomerSerialiser(BaseSerialiser):
     Serializes Customer objects to represent their ID and name fields.
 
     This serializer is read-only for id and includes the ID and name
-    fields of a Customer.
+    fields of a Customer. The read-only order aggregates are only
+    included when aggregates=True is passed, or the request in the
+    context has ?include=aggregates.
     """
     id = serializers.UUIDField(read_only=True)
 
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'phone_number']
+        fields = ['id', 'name', 'phone_number', *AGGREGATE_FIELDS]
+        read_only_fields = AGGREGATE_FIELDS
+
+    def __init__(self, *args, aggregates=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if aggregates is None:
+            request = self.context.get('request')
+            aggregates = request is not None and include_aggregates(request)
+        if not aggregates:
+            for field in AGGREGATE_FIELDS:
+                self.fields.pop(field)
 
 
 class OrderSerialiser(BaseSerialiser):
@@ -71,3 +95,15 @@ class OrderSerialiser(BaseSerialiser):
         model = Order
         fields = ['id', 'item', 'amount', 'created_at', 'customer']
         ordering = ['-created_at']
+
+
+class BulkOrderItemSerialiser(serializers.Serializer):
+    """
+    Validates one order of a bulk order request.
+
+    The customer is only checked to be a UUID here; the view resolves
+    all customers of the request in one query.
+    """
+    customer_id = serializers.UUIDField()
+    item = serializers.CharField(max_length=50)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -0,0 +1,272 @@
+'''
+Spreads orders over several databases by customer.
+
+With ORDER_SHARD_URLS set, ORDER_SHARDS lists default and the shard
+aliases. Each customer's orders are kept on one of them, picked by a
+consistent hash of the customer id, so adding a shard only moves the
+orders of about one customer in N (rebalance_orders moves them).
+Customers, the notification outbox and every other table stay on
+default.
+
+- ShardRouter routes the order queries Django gives an instance hint
+  for: customer.orders, and saving or deleting an order.
+- Order.objects.create and bulk_create route each order by customer.
+- get_order_or_404 looks an order up by id on every shard.
+- ScatterQuerySet runs a query on every shard and merges the results in
+  (created_at, id) order, for the order list.
+
+Shards do not enforce the order's foreign key to the customer, whose
+row is on default; deleting a customer deletes its orders on its shard.
+'''
+import bisect
+import hashlib
+import heapq
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import prefetch_related_objects
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+ORDER_MODEL = 'customer_orders_app.order'
+CUSTOMER_MODEL = 'customer_orders_app.customer'
+# points per shard on the ring; more spread customers more evenly
+RING_POINTS = 128
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    A consistent hash ring: each node owns the keys hashing between its
+    points and the previous ones, so adding or removing a node only
+    moves the keys of its own points.
+    """
+
+    def __init__(self, nodes, points: int = RING_POINTS):
+        ring = sorted(
+            (_hash(f'{node}:{point}'), node)
+            for node in nodes for point in range(points))
+        self.hashes = [position for position, _ in ring]
+        self.nodes = [node for _, node in ring]
+
+    def node_for(self, key: str) -> str:
+        """
+        Returns the node owning a key.
+        """
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+@lru_cache(maxsize=None)
+def _ring(shards: tuple) -> HashRing:
+    return HashRing(shards)
+
+
+def sharded() -> bool:
+    """
+    Checks whether orders are spread over more than one database.
+    """
+    return len(settings.ORDER_SHARDS) > 1
+
+
+def shard_for(customer_id) -> str:
+    """
+    Returns the database alias holding a customer's orders.
+    """
+    if not sharded():
+        return DEFAULT_DB_ALIAS
+    return _ring(tuple(settings.ORDER_SHARDS)).node_for(str(customer_id))
+
+
+@contextmanager
+def atomic(*customer_ids):
+    """
+    A transaction on default and on the shards of the given customers'
+    orders.
+
+    The shard transactions commit first, so if committing default fails
+    the orders are kept without their outbox notifications; an SMS is
+    never sent for an order that was rolled back.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(transaction.atomic())
+        for alias in sorted(
+                {shard_for(customer_id) for customer_id in customer_ids}
+                - {DEFAULT_DB_ALIAS}):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def get_order_or_404(order_id):
+    """
+    Returns an order with its customer, from whichever shard holds it.
+
+    Raises:
+        Http404: If no shard has the order.
+    """
+    from .models import Order
+
+    if not sharded():
+        return get_object_or_404(
+            Order.objects.select_related('customer'), id=order_id)
+    for alias in settings.ORDER_SHARDS:
+        # the customer is on default, so it is not joined in
+        order = Order.objects.using(alias).filter(id=order_id).first()
+        if order is not None:
+            return order
+    raise Http404('No Order matches the given query.')
+
+
+def delete_customer_orders(customer_id) -> None:
+    """
+    Deletes the orders of a deleted customer from its shard, which the
+    cascade on default does not reach.
+    """
+    from .models import Order
+
+    alias = shard_for(customer_id)
+    if alias != DEFAULT_DB_ALIAS:
+        Order.objects.using(alias).filter(customer_id=customer_id).delete()
+
+
+def scatter(queryset):
+    """
+    Returns the queryset run on every shard, or the queryset itself
+    when orders are not sharded.
+    """
+    if not sharded():
+        return queryset
+    return ScatterQuerySet(
+        [queryset.using(alias) for alias in settings.ORDER_SHARDS])
+
+
+class ScatterQuerySet:
+    """
+    The same query on several databases, read as one queryset in the
+    order of its order_by fields.
+
+    It supports what the list view and its paginators use: filter,
+    exclude, order_by, prefetch_related, count, slicing and iteration.
+    A slice [start:stop] reads the first stop rows of every shard, so
+    keyset pages cost the same at any depth but deep offsets do not.
+    Prefetches run once over the merged rows.
+    """
+    ordered = True
+
+    def __init__(self, querysets, ordering=('created_at', 'id'),
+                 prefetch=()):
+        self.querysets = [
+            queryset.order_by(*ordering) for queryset in querysets]
+        self.ordering = tuple(ordering)
+        self.prefetch = tuple(prefetch)
+
+    def _each(self, method: str, *args, **kwargs):
+        return ScatterQuerySet(
+            [getattr(queryset, method)(*args, **kwargs)
+             for queryset in self.querysets],
+            self.ordering, self.prefetch)
+
+    def filter(self, *args, **kwargs):
+        return self._each('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._each('exclude', *args, **kwargs)
+
+    def all(self):
+        return self._each('all')
+
+    def order_by(self, *fields):
+        return ScatterQuerySet(self.querysets, fields, self.prefetch)
+
+    def prefetch_related(self, *lookups):
+        return ScatterQuerySet(
+            self.querysets, self.ordering, self.prefetch + lookups)
+
+    @property
+    def db(self) -> str:
+        return ','.join(queryset.db for queryset in self.querysets)
+
+    @property
+    def query(self):
+        # the same query runs on every shard
+        return self.querysets[0].query
+
+    def count(self) -> int:
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def _merge(self, iterables):
+        if not self.ordering:
+            return chain.from_iterable(iterables)
+        descending = {field.startswith('-') for field in self.ordering}
+        if len(descending) > 1:
+            raise ValueError('Mixed sort directions cannot be merged')
+        fields = [field.lstrip('-') for field in self.ordering]
+        return heapq.merge(
+            *iterables, reverse=descending.pop(),
+            key=lambda row: tuple(getattr(row, field) for field in fields))
+
+    def _rows(self, rows) -> list:
+        rows = list(rows)
+        if self.prefetch:
+            prefetch_related_objects(rows, *self.prefetch)
+        return rows
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            try:
+                return self[index:index + 1][0]
+            except IndexError:
+                raise IndexError('ScatterQuerySet index out of range')
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            return self._rows(islice(self, start, None))
+        return self._rows(islice(self._merge(
+            [queryset[:stop] for queryset in self.querysets]), start, stop))
+
+    def __iter__(self):
+        rows = self._merge(
+            [queryset.iterator() for queryset in self.querysets])
+        return iter(self._rows(rows)) if self.prefetch else rows
+
+
+class ShardRouter:
+    """
+    Routes order queries carrying an order or customer instance hint to
+    the customer's shard, and migrates only this app's tables on the
+    shards other than default.
+    """
+
+    def _shard(self, model, **hints):
+        if model._meta.label_lower != ORDER_MODEL or not sharded():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._meta.label_lower == ORDER_MODEL:
+            # not a replica the order was read from
+            if instance._state.db in settings.ORDER_SHARDS:
+                return instance._state.db
+            return shard_for(instance.customer_id)
+        if instance._meta.label_lower == CUSTOMER_MODEL:
+            return shard_for(instance.pk)
+        return None
+
+    db_for_read = _shard
+    db_for_write = _shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels == {ORDER_MODEL, CUSTOMER_MODEL}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db != DEFAULT_DB_ALIAS and db in settings.ORDER_SHARDS:
+            return app_label == 'customer_orders_app'
+        return None
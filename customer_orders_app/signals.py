@@ -0,0 +1,68 @@
+'''
+Signal handlers that keep caches, and orders kept on other shards, in
+step with customer, order, token and user writes
+'''
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token
+from .caching import invalidate_customer
+from .models import Customer, Order
+from .sharding import delete_customer_orders
+
+
+def _invalidate_on_commit(customer_id, using: str) -> None:
+    """
+    Moves a customer's cache version once the write commits; bumped any
+    earlier, a concurrent read could cache the old rows under the new
+    version.
+    """
+    transaction.on_commit(
+        lambda: invalidate_customer(customer_id), using=using)
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def customer_changed(sender, instance, using, **kwargs):
+    """
+    Drops the cached detail response of a saved or deleted customer.
+    """
+    _invalidate_on_commit(instance.pk, using)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    """
+    Deletes the orders a deleted customer has on another shard.
+    """
+    delete_customer_orders(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, using, **kwargs):
+    """
+    Drops the cached detail response of the customer of a saved or
+    deleted order.
+    """
+    _invalidate_on_commit(instance.customer_id, using)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Stops a deleted token from authenticating from the cache.
+    """
+    forget_token(instance.key)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    """
+    Drops the cached token of a saved or deleted user, so changes such
+    as deactivation apply to the next request.
+    """
+    for key in Token.objects.filter(
+            user_id=instance.pk).values_list('key', flat=True):
+        forget_token(key)
@@ -0,0 +1,271 @@
+'''
+Batches order SMS notifications into multi-recipient gateway requests.
+
+Notifications are pushed onto a Redis list instead of becoming one job
+each. A flush job is scheduled SMS_BATCH_WINDOW seconds after the first
+notification of a window, or enqueued at once whenever SMS_BATCH_SIZE
+more notifications are waiting. The flush groups identical messages and
+sends each group as one request with a comma separated to list, then
+maps the gateway's per-recipient status back to the orders. Like single
+sends, batched notifications are claimed by dedupe key first, so one
+relayed twice is sent once.
+'''
+import json
+import logging
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import django_rq
+from django.conf import settings
+
+from . import delivery, sms_guard
+from .sms_sender import ACCEPTED_CODES, MAX_RETRIES, backoff, post_message
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'sms:pending'
+FLUSH_KEY = 'sms:flush-scheduled'
+
+
+def add(notifications: list) -> int:
+    """
+    Queues notifications for the next flush.
+
+    Args:
+        notifications: Dicts with the order_id, the dedupe_key, the
+        recipient number (to) and the message text.
+
+    Returns:
+        The number of notifications waiting, including these.
+    """
+    window = settings.SMS_BATCH_WINDOW
+    size = settings.SMS_BATCH_SIZE
+    connection = django_rq.get_connection('default')
+    with connection.pipeline() as pipe:
+        pipe.rpush(PENDING_KEY, *(
+            json.dumps(notification, default=str)
+            for notification in notifications))
+        # the marker outlives the window so a lost flush job is replaced
+        # by the next notification rather than never
+        pipe.set(FLUSH_KEY, 1, nx=True, px=math.ceil(window * 2000))
+        waiting, first = pipe.execute()
+
+    queue = django_rq.get_queue(settings.SMS_QUEUE)
+    if (waiting - len(notifications)) // size < waiting // size:
+        queue.enqueue(flush)
+    elif first:
+        queue.enqueue_in(timedelta(seconds=window), flush)
+    return waiting
+
+
+def _take(connection, size: int) -> list:
+    """
+    Removes and returns up to size notifications from the list.
+    """
+    with connection.pipeline() as pipe:
+        pipe.lrange(PENDING_KEY, 0, size - 1)
+        pipe.ltrim(PENDING_KEY, size, -1)
+        taken, _ = pipe.execute()
+    return [json.loads(raw) for raw in taken]
+
+
+def flush() -> dict:
+    """
+    Sends every waiting notification. Runs as an RQ job.
+
+    Notifications are removed from the list before they are sent; if
+    the worker dies mid-flush, the outbox relays them again later.
+
+    Returns:
+        The delivery status of each order, keyed by order id.
+    """
+    connection = django_rq.get_connection('default')
+    # notifications queued from here on schedule the next flush
+    connection.delete(FLUSH_KEY)
+    statuses = {}
+    while True:
+        notifications = _take(connection, settings.SMS_BATCH_SIZE)
+        if notifications:
+            delivered, put_off = _deliver(notifications)
+            statuses.update(delivered)
+            if put_off:
+                return statuses
+        if len(notifications) < settings.SMS_BATCH_SIZE:
+            return statuses
+
+
+def _deliver(notifications: list) -> tuple:
+    """
+    Sends the notifications not sent before and records the outcomes.
+
+    Each gateway request first passes the rate limiter and circuit
+    breaker; once they hold requests back, the notifications not yet
+    sent go back on the list for a flush rescheduled after the delay.
+    So do a group the gateway asked to retry, after a backoff, and the
+    groups after it, until the group has been sent SMS_MAX_RETRIES
+    more times.
+
+    Returns:
+        A tuple of the delivery status of each order sent and whether
+        the rest was put off.
+    """
+    claimed, sent = delivery.claim(
+        [notification['dedupe_key'] for notification in notifications])
+    if sent:
+        delivery.record(dict.fromkeys(sent))
+    fresh = [
+        notification for notification in notifications
+        if notification['dedupe_key'] in claimed]
+
+    statuses = {}
+    requests = 0
+    put_off = False
+    groups = list(group(fresh, settings.SMS_BATCH_MAX_RECIPIENTS))
+    for index, (message, recipients) in enumerate(groups):
+        delay = sms_guard.wait_to_send()
+        if delay is not None:
+            _put_off(
+                [notification for _, rest in groups[index:]
+                 for notification in rest.values()], delay)
+            put_off = True
+            break
+        result = post_message(','.join(recipients), message)
+        requests += 1
+        sms_guard.record(result)
+        attempt = max(
+            notification.get('attempt', 1)
+            for notification in recipients.values())
+        if result.retry and attempt <= MAX_RETRIES:
+            _put_off(
+                [dict(notification, attempt=attempt + 1)
+                 for notification in recipients.values()]
+                + [notification for _, rest in groups[index + 1:]
+                   for notification in rest.values()], backoff(attempt))
+            put_off = True
+            break
+        statuses.update(recipient_statuses(result, recipients))
+        delivery.settle({
+            notification['dedupe_key']: _error(
+                statuses[notification['order_id']])
+            for notification in recipients.values()})
+    _log(statuses, requests)
+    return statuses, put_off
+
+
+def _error(status: dict) -> str:
+    """
+    Returns why a notification was not delivered, or None if it was.
+    """
+    return None if status['ok'] else status['status'] or 'Failed'
+
+
+def _put_off(notifications: list, delay: float) -> None:
+    """
+    Returns notifications to the head of the list and reschedules the
+    flush after delay seconds.
+    """
+    delivery.release(
+        [notification['dedupe_key'] for notification in notifications])
+    connection = django_rq.get_connection('default')
+    with connection.pipeline() as pipe:
+        pipe.lpush(PENDING_KEY, *(
+            json.dumps(notification, default=str)
+            for notification in reversed(notifications)))
+        pipe.set(FLUSH_KEY, 1, px=max(1, math.ceil(delay * 2000)))
+        pipe.execute()
+    sms_guard.reschedule(flush, delay)
+    logger.info(
+        'Put off %d SMS notifications for %.1fs', len(notifications), delay)
+
+
+def group(notifications: list, max_recipients: int):
+    """
+    Groups notifications that share their message text.
+
+    A number appears at most once per group, so a customer with two
+    identical notifications gets two messages.
+
+    Yields:
+        Tuples of the message and a dict of recipient number to
+        notification, holding at most max_recipients numbers.
+    """
+    by_message = defaultdict(list)
+    for notification in notifications:
+        by_message[notification['message']].append(notification)
+
+    for message, members in by_message.items():
+        groups = []
+        for notification in members:
+            for recipients in groups:
+                if (notification['to'] not in recipients
+                        and len(recipients) < max_recipients):
+                    recipients[notification['to']] = notification
+                    break
+            else:
+                groups.append({notification['to']: notification})
+        for recipients in groups:
+            yield message, recipients
+
+
+def recipient_statuses(result, recipients: dict) -> dict:
+    """
+    Maps the per-recipient status of a gateway response back to orders.
+
+    Args:
+        result: The SmsResult of the request.
+        recipients: The request's notifications by recipient number.
+
+    Returns:
+        The delivery status of each order, keyed by order id: whether it
+        was accepted (ok), the gateway status and the message id.
+    """
+    reported = {
+        recipient.get('number'): recipient
+        for recipient in result.recipients}
+    statuses = {}
+    for number, notification in recipients.items():
+        recipient = reported.get(number)
+        if recipient is None:
+            status = {
+                'ok': False,
+                'status': result.error or 'Missing from response',
+                'message_id': None}
+        else:
+            status = {
+                'ok': recipient.get('statusCode') in ACCEPTED_CODES,
+                'status': recipient.get('status'),
+                'message_id': recipient.get('messageId')}
+        statuses[notification['order_id']] = status
+    return statuses
+
+
+def send_batch(notifications: list) -> dict:
+    """
+    Sends notifications with one gateway request per group, without
+    dedupe, rate limiting or the circuit breaker.
+
+    Returns:
+        The delivery status of each order, keyed by order id.
+    """
+    statuses = {}
+    requests = 0
+    for message, recipients in group(
+            notifications, settings.SMS_BATCH_MAX_RECIPIENTS):
+        result = post_message(','.join(recipients), message)
+        requests += 1
+        statuses.update(recipient_statuses(result, recipients))
+    _log(statuses, requests)
+    return statuses
+
+
+def _log(statuses: dict, requests: int) -> None:
+    failed = [
+        order_id for order_id, status in statuses.items()
+        if not status['ok']]
+    if statuses:
+        logger.info(
+            'Sent %d SMS notifications in %d requests, %d failed',
+            len(statuses), requests, len(failed))
+    if failed:
+        logger.warning('SMS not delivered for orders %s', failed)
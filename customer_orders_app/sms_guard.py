@@ -0,0 +1,202 @@
+'''
+Protects the SMS gateway, and the workers, when the gateway struggles.
+
+All workers share two pieces of state in Redis:
+
+- a token bucket refilled at SMS_RATE_LIMIT requests per second, up to
+  SMS_RATE_BURST, so the workers together never exceed the provider's
+  rate;
+- a circuit breaker that opens after SMS_BREAKER_THRESHOLD failed
+  requests within SMS_BREAKER_WINDOW seconds. While open, jobs are not
+  sent but rescheduled; after SMS_BREAKER_COOLDOWN seconds the breaker
+  turns half-open and lets a single trial request through, whose outcome
+  closes or reopens it.
+'''
+import random
+import time
+from datetime import timedelta
+
+import django_rq
+from django.conf import settings
+
+BUCKET_KEY = 'sms:bucket'
+FAILURES_KEY = 'sms:breaker:failures'
+OPEN_KEY = 'sms:breaker:open'
+TRIPPED_KEY = 'sms:breaker:tripped'
+TRIAL_KEY = 'sms:breaker:trial'
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Refills the bucket for the time elapsed since the last call, by the
+# Redis clock so workers on different hosts agree, then takes the
+# requested tokens if there are enough. Returns whether they were taken,
+# the seconds until they would be and the tokens left, as strings since
+# Lua numbers are returned to clients as integers.
+TOKEN_BUCKET = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local taken = 0
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    taken = 1
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {taken, tostring(wait), tostring(tokens)}
+'''
+
+
+def _connection():
+    return django_rq.get_connection('default')
+
+
+def take_tokens(count: int = 1) -> tuple:
+    """
+    Takes tokens from the shared bucket.
+
+    Args:
+        count: How many tokens to take; 0 only reads the bucket.
+
+    Returns:
+        A tuple of whether the tokens were taken, the seconds until they
+        would be available and the tokens left.
+    """
+    script = _connection().register_script(TOKEN_BUCKET)
+    taken, wait, tokens = script(
+        keys=[BUCKET_KEY],
+        args=[settings.SMS_RATE_LIMIT, settings.SMS_RATE_BURST, count])
+    return bool(taken), float(wait), float(tokens)
+
+
+def breaker_state() -> str:
+    """
+    Returns the state of the circuit breaker: closed, open or half-open.
+    """
+    connection = _connection()
+    if connection.exists(OPEN_KEY):
+        return OPEN
+    if connection.exists(TRIPPED_KEY):
+        return HALF_OPEN
+    return CLOSED
+
+
+def _allow() -> float:
+    """
+    Asks the breaker whether a request may be sent.
+
+    Returns:
+        None when it may, otherwise the seconds to wait.
+    """
+    connection = _connection()
+    state = breaker_state()
+    if state == CLOSED:
+        return None
+    if state == HALF_OPEN and connection.set(
+            TRIAL_KEY, 1, nx=True, ex=settings.SMS_BREAKER_COOLDOWN):
+        return None
+    remaining = connection.pttl(OPEN_KEY)
+    if remaining is None or remaining <= 0:
+        # half-open with the trial request already under way
+        return float(settings.SMS_BREAKER_COOLDOWN)
+    return remaining / 1000
+
+
+def wait_to_send() -> float:
+    """
+    Checks the breaker and takes a token before a gateway request.
+
+    Waits of up to SMS_RATE_MAX_WAIT seconds for a token are slept
+    through; longer ones, and an open breaker, are left to the caller,
+    which should reschedule rather than hold the worker.
+
+    Returns:
+        None when the request may be sent now, otherwise the seconds
+        after which to try again.
+    """
+    delay = _allow()
+    if delay is not None:
+        return delay
+    while True:
+        taken, wait, _ = take_tokens()
+        if taken:
+            return None
+        if wait > settings.SMS_RATE_MAX_WAIT:
+            return wait
+        time.sleep(wait)
+
+
+def is_failure(result) -> bool:
+    """
+    Tells whether a request failed because of the gateway: it could not
+    be reached, timed out, was throttled or had a server error. Rejected
+    requests and recipients are our own problem and do not count.
+    """
+    code = result.status_code
+    return code is None or code == 429 or code >= 500
+
+
+def record(result) -> None:
+    """
+    Feeds the outcome of a gateway request to the circuit breaker.
+
+    Args:
+        result: The SmsResult of the request.
+    """
+    connection = _connection()
+    if not is_failure(result):
+        if breaker_state() != CLOSED or connection.exists(FAILURES_KEY):
+            connection.delete(FAILURES_KEY, TRIPPED_KEY, TRIAL_KEY)
+        return
+
+    state = breaker_state()
+    if state == OPEN:
+        # a request sent before the breaker opened
+        return
+    with connection.pipeline() as pipe:
+        pipe.incr(FAILURES_KEY)
+        pipe.expire(FAILURES_KEY, settings.SMS_BREAKER_WINDOW)
+        failures, _ = pipe.execute()
+    if failures >= settings.SMS_BREAKER_THRESHOLD or state == HALF_OPEN:
+        with connection.pipeline() as pipe:
+            pipe.set(OPEN_KEY, 1, ex=settings.SMS_BREAKER_COOLDOWN)
+            pipe.set(TRIPPED_KEY, 1)
+            pipe.delete(FAILURES_KEY, TRIAL_KEY)
+            pipe.execute()
+
+
+def reschedule(func, delay: float, *args):
+    """
+    Enqueues a job to run again after delay seconds, plus up to a fifth
+    more so rescheduled jobs do not all return at the same moment.
+    """
+    delay += random.uniform(0, delay / 5)
+    return django_rq.get_queue(settings.SMS_QUEUE).enqueue_in(
+        timedelta(seconds=delay), func, *args)
+
+
+def status() -> dict:
+    """
+    Returns the breaker state and the tokens available, for monitoring.
+    """
+    connection = _connection()
+    _, _, tokens = take_tokens(0)
+    failures = connection.get(FAILURES_KEY)
+    return {
+        'breaker': breaker_state(),
+        'recent_failures': int(failures or 0),
+        'tokens': round(tokens, 2),
+        'rate_limit': settings.SMS_RATE_LIMIT,
+        'burst': settings.SMS_RATE_BURST,
+    }
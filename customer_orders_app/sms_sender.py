@@ -1,45 +1,232 @@
+'''
+Sends SMS notifications through the Africa's Talking messaging API.
 
+Each worker process keeps one pooled requests.Session, so consecutive
+jobs reuse a kept-alive connection instead of opening a new TCP and TLS
+connection per message. Each call makes a single request: only failures
+to connect, where nothing reached the gateway, are retried here, with
+jittered exponential backoff. Responses that ask for a retry (429, 502,
+503, 504) are marked for retry, and callers reschedule them through
+sms_guard so every request sent takes a token from the rate limiter.
+'''
 import os
-import requests
+import random
+import threading
+import time
 import logging
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+GATEWAY_URL = os.getenv(
+    'SMS_GATEWAY_URL',
+    'https://api.sandbox.africastalking.com/version1/messaging')
+USERNAME = os.getenv('AFRICASTALKING_USERNAME', 'sandbox')
+SENDER_ID = os.getenv('AFRICASTALKING_SENDER_ID', '44121')
+CONNECT_TIMEOUT = float(os.getenv('SMS_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.getenv('SMS_READ_TIMEOUT', 10))
+MAX_RETRIES = int(os.getenv('SMS_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.getenv('SMS_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.getenv('SMS_BACKOFF_MAX', 8))
+POOL_SIZE = int(os.getenv('SMS_POOL_SIZE', 4))
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Africa's Talking recipient status codes for a message that was
+# processed, sent or queued
+ACCEPTED_CODES = frozenset({100, 101, 102})
 
-def send_sms(recipient_number: str, order_data: dict) -> None:
+_local = threading.local()
+
+
+@dataclass
+class SmsResult:
     """
-    Sends an SMS notification to a recipient with order information.
+    The outcome of a send_sms call.
 
-    Args:
-        recipient_number: The phone number of the recipient.
-        order_data: A dictionary containing order information.
+    ok is True when the gateway accepted the request and every recipient
+    it reported on. retry is True when the request failed in a way that
+    may succeed if it is sent again later. recipients holds the gateway's
+    per-recipient entries (number, status, statusCode, messageId, cost).
+    """
+    ok: bool
+    status_code: int = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    error: str = None
+    recipients: list = field(default_factory=list)
+    retry: bool = False
 
-    Returns:
-        None
+
+def get_session() -> requests.Session:
     """
-    url = 'https://api.sandbox.africastalking.com/version1/messaging'
-    API_KEY = os.getenv("AFRICASTALKING_API_KEY")
-    USERNAME = 'sandbox'
-    item = order_data["item"]
-    message = f'Order for {item} at Kshs {order_data["amount"]} Created'
+    Returns the pooled session of the current process and thread.
+
+    Sessions are never shared across a fork: a worker that forks a
+    child per job gets a fresh session in the child rather than sockets
+    opened by its parent.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None or _local.pid != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept': 'application/json'})
+        _local.session = session
+        _local.pid = os.getpid()
+    return session
 
-    headers = {
-        'Accept': 'application/json',
-        'Content-Type': 'application/x-www-form-urlencoded',
-        'apiKey': API_KEY
-    }
 
+def backoff(attempt: int) -> float:
+    """
+    Returns how long to wait before retry number attempt (from 1), drawn
+    uniformly between zero and an exponentially growing cap ("full
+    jitter"), so workers that failed together do not retry together.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _recipients(response) -> list:
+    try:
+        return response.json()['SMSMessageData']['Recipients']
+    except (ValueError, KeyError, TypeError):
+        return []
+
+
+def connect_failed(err: requests.RequestException) -> bool:
+    """
+    Tells whether a request failed before a connection was made, so the
+    gateway cannot have received it.
+    """
+    if isinstance(err, requests.ConnectTimeout):
+        return True
+    # refused connections and failed DNS lookups reach requests as the
+    # reason of a urllib3 MaxRetryError
+    reason = getattr(err.args[0], 'reason', None) if err.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def request_parts(to: str, message: str) -> tuple:
+    """
+    Returns the form data and headers of a gateway request.
+    """
     data = {
         'username': USERNAME,
-        'to': f'{recipient_number}',
+        'to': to,
         'message': message,
-        'from': '44121'
+        'from': SENDER_ID
     }
+    headers = {'apiKey': os.getenv("AFRICASTALKING_API_KEY")}
+    return data, headers
 
-    try:
-        response = requests.post(url, headers=headers, data=data)
-        print(response.status_code)
 
-    except Exception as err:
-        print(f"An error occurred: {err}")
+def read_response(result: SmsResult, response) -> bool:
+    """
+    Fills in a result from a gateway response.
+
+    Args:
+        result: The SmsResult of the request.
+        response: A requests or httpx response.
+
+    Returns:
+        Whether the request should be retried.
+    """
+    result.status_code = response.status_code
+    result.recipients = _recipients(response)
+    if response.status_code >= 400:
+        result.error = f'HTTP {response.status_code}'
+        return response.status_code in RETRY_STATUSES
+    result.error = None
+    result.ok = all(
+        recipient.get('statusCode') in ACCEPTED_CODES
+        for recipient in result.recipients)
+    if not result.ok:
+        result.error = 'Rejected by the gateway'
+    return False
+
+
+def post_message(to: str, message: str) -> SmsResult:
+    """
+    Posts a message to the gateway in a single request.
+
+    Failures to connect are retried, as the gateway never saw them.
+    Anything else, read timeouts included, is not: the gateway may
+    already have accepted the message, and a retry would send it twice.
+
+    Args:
+        to: The recipient number, or several separated by commas.
+        message: The text of the SMS.
+
+    Returns:
+        An SmsResult describing the last attempt.
+    """
+    data, headers = request_parts(to, message)
+    session = get_session()
+    started = time.perf_counter()
+    result = SmsResult(ok=False)
+
+    for attempt in range(1, MAX_RETRIES + 2):
+        result.attempts = attempt
+        try:
+            response = session.post(
+                GATEWAY_URL, headers=headers, data=data,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except requests.RequestException as err:
+            result.status_code, result.error = None, str(err)
+            result.retry = connect_failed(err)
+        else:
+            result.retry = read_response(result, response)
+            break
+
+        if not result.retry or attempt > MAX_RETRIES:
+            break
+        time.sleep(backoff(attempt))
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def order_message(order_data: dict) -> str:
+    """
+    Returns the text of the SMS sent for an order.
+    """
+    item = order_data["item"]
+    return f'Order for {item} at Kshs {order_data["amount"]} Created'
+
+
+def summary_message(count: int, total) -> str:
+    """
+    Returns the text of the SMS that stands for several orders.
+    """
+    return f'{count} orders totalling Kshs {total} Created'
+
+
+def send_sms(recipient_number: str, order_data: dict) -> SmsResult:
+    """
+    Sends an SMS notification to a recipient with order information.
+
+    Args:
+        recipient_number: The phone number of the recipient.
+        order_data: A dictionary containing order information.
+
+    Returns:
+        An SmsResult, which RQ stores as the job's return value.
+    """
+    result = post_message(f'{recipient_number}', order_message(order_data))
+    if result.ok:
+        logger.info(
+            'SMS to %s sent in %.3fs (%d attempts)',
+            recipient_number, result.elapsed, result.attempts)
+    else:
+        logger.warning(
+            'SMS to %s failed after %d attempts: %s',
+            recipient_number, result.attempts, result.error)
+    return result
@@ -0,0 +1,117 @@
+'''
+In-memory stand-ins for the services the app talks to
+'''
+
+
+class FakePipeline:
+    """
+    Records pipelined commands for FakeRedis.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return command
+
+    def execute(self):
+        results = [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """
+    The few Redis commands used by the app, kept in memory. Expiry is
+    not modelled.
+    """
+
+    def __init__(self):
+        self.lists = {}
+        self.strings = {}
+        self.zsets = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(
+            value.encode() for value in values)
+        return len(self.lists[key])
+
+    def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:end + 1]
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:]
+        return True
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value if isinstance(value, bytes) else (
+            str(value).encode())
+        return True
+
+    def lpush(self, key, *values):
+        self.lists.setdefault(key, [])[:0] = [
+            value.encode() for value in reversed(values)]
+        return len(self.lists[key])
+
+    def incr(self, key):
+        value = int(self.strings.get(key, 0)) + 1
+        self.strings[key] = str(value).encode()
+        return value
+
+    def expire(self, key, seconds):
+        return key in self.strings
+
+    def exists(self, *keys):
+        return sum(key in self.strings for key in keys)
+
+    def pttl(self, key):
+        return 1000 if key in self.strings else -2
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    def delete(self, *keys):
+        return sum(
+            self.strings.pop(key, None) is not None for key in keys)
+
+    def zadd(self, key, mapping):
+        zset = self.zsets.setdefault(key, {})
+        added = sum(member not in zset for member in mapping)
+        zset.update(mapping)
+        return added
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        removed = [
+            member for member, score in zset.items()
+            if float(low) <= score <= float(high)]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    def zrangebyscore(self, key, low, high):
+        return [
+            member.encode()
+            for member, score in sorted(
+                self.zsets.get(key, {}).items(), key=lambda item: item[1])
+            if float(low) <= score <= float(high)]
@@ -0,0 +1,125 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+from customer_orders_app.aggregates import orders_archived
+from customer_orders_app.models import Customer, Order
+
+
+class CustomerAggregatesTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(
+            name='Jane', phone_number='+254700000001')
+
+    def add_order(self, amount):
+        response = self.client.post(reverse('add-order'), {
+            'customer_id': str(self.customer.id), 'item': 'Book',
+            'amount': amount}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(id=response.data['id'])
+
+    def assertAggregates(self, count, total, last_order_at):
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.order_count, count)
+        self.assertEqual(self.customer.total_amount, Decimal(total))
+        self.assertEqual(self.customer.last_order_at, last_order_at)
+
+    def test_kept_up_to_date_by_order_writes(self):
+        first = self.add_order(10)
+        second = self.add_order('2.50')
+        self.assertAggregates(2, '12.50', second.created_at)
+
+        self.client.put(
+            reverse('update-order', args=[first.id]), {'amount': 15},
+            format='json')
+        self.assertAggregates(2, '17.50', second.created_at)
+
+        self.client.delete(reverse('update-order', args=[second.id]))
+        self.assertAggregates(1, '15.00', first.created_at)
+        self.client.delete(reverse('update-order', args=[first.id]))
+        self.assertAggregates(0, '0.00', None)
+
+    def test_bulk_orders(self):
+        other = Customer.objects.create(
+            name='John', phone_number='+254700000002')
+        response = self.client.post(reverse('bulk-add-orders'), [
+            {'customer_id': str(self.customer.id), 'item': 'Pen',
+             'amount': 1},
+            {'customer_id': str(self.customer.id), 'item': 'Cup',
+             'amount': 2},
+            {'customer_id': str(other.id), 'item': 'Pen', 'amount': 4},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        latest = Order.objects.filter(customer=self.customer).latest(
+            'created_at').created_at
+        self.assertAggregates(2, '3.00', latest)
+        other.refresh_from_db()
+        self.assertEqual(other.order_count, 1)
+
+    @override_settings(CUSTOMER_CACHE_VERSIONS=True)
+    def test_opt_in(self):
+        self.add_order(10)
+        url = reverse('view_customer_info', args=[self.customer.id])
+        plain = self.client.get(url)
+        self.assertNotIn('order_count', plain.data['Customer_details'])
+        response = self.client.get(url, {'include': 'aggregates'})
+        details = response.data['Customer_details']
+        self.assertEqual(details['order_count'], 1)
+        self.assertEqual(details['total_amount'], '10.00')
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+        customers = self.client.get(
+            reverse('all_customers'), {'include': 'aggregates'})
+        self.assertEqual(customers.data['results'][0]['order_count'], 1)
+        self.assertNotIn(
+            'order_count',
+            self.client.get(reverse('all_customers')).data['results'][0])
+
+    def test_aggregates_are_read_only(self):
+        self.client.put(
+            reverse('update-customer', args=[self.customer.id]),
+            {'order_count': 99}, format='json')
+        self.assertAggregates(0, '0', None)
+
+    def test_list_etag_follows_aggregates(self):
+        url = reverse('all_customers')
+        etag = self.client.get(url, {'include': 'aggregates'})['ETag']
+        self.add_order(10)
+        response = self.client.get(
+            url, {'include': 'aggregates'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_archived_orders(self):
+        self.add_order(10)
+        self.add_order(5)
+        orders_archived({self.customer.id: (1, Decimal(10))})
+        self.assertAggregates(
+            1, '5.00', Order.objects.latest('created_at').created_at)
+        orders_archived({self.customer.id: (1, Decimal(5))})
+        self.assertAggregates(0, '0.00', None)
+
+    def test_reconcile(self):
+        order = self.add_order(10)
+        Customer.objects.filter(pk=self.customer.pk).update(
+            order_count=5, total_amount=1,
+            last_order_at=order.created_at - timedelta(days=1))
+        Customer.objects.create(name='John', phone_number='+254700000002')
+
+        out = StringIO()
+        call_command(
+            'reconcile_customer_aggregates', '--dry-run', stdout=out)
+        self.assertIn('Would repair 1 of 2 customers', out.getvalue())
+        call_command(
+            'reconcile_customer_aggregates', '--batch-size', '1', stdout=out)
+        self.assertIn('Repaired 1 of 2 customers', out.getvalue())
+        self.assertAggregates(1, '10.00', order.created_at)
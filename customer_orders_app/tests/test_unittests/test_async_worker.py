@@ -0,0 +1,189 @@
+import asyncio
+import unittest
+from unittest.mock import patch, Mock
+import httpx
+from customer_orders_app import async_worker, delivery, sms_sender
+from customer_orders_app.async_worker import AsyncSmsWorker, post_message_async
+from customer_orders_app.sms_sender import SmsResult
+
+
+def gateway_reply(status_code=201, status_code_of_recipient=101):
+    return httpx.Response(status_code, json={'SMSMessageData': {
+        'Message': 'Sent to 1/1',
+        'Recipients': [
+            {'number': '+254701036054',
+             'statusCode': status_code_of_recipient,
+             'status': 'Success', 'messageId': 'ATXid_0'}]}})
+
+
+def post(replies):
+    """
+    Runs post_message_async against a mocked gateway.
+
+    Returns:
+        The SmsResult and the requests the gateway received.
+    """
+    received = []
+
+    def handler(request):
+        received.append(request)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def run():
+        async with httpx.AsyncClient(
+                transport=httpx.MockTransport(handler)) as client:
+            return await post_message_async(
+                client, '+254701036054', 'Order for food at Kshs 11 Created')
+
+    return asyncio.run(run()), received
+
+
+@patch('customer_orders_app.async_worker.asyncio.sleep')
+class PostMessageAsyncTests(unittest.TestCase):
+
+    def test_success(self, mock_sleep):
+        result, received = post([gateway_reply()])
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(str(received[0].url), sms_sender.GATEWAY_URL)
+        self.assertIn(b'to=%2B254701036054', received[0].content)
+        mock_sleep.assert_not_called()
+
+    def test_retries_connection_errors(self, mock_sleep):
+        result, received = post([
+            httpx.ConnectError('refused'), gateway_reply()])
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_transient_status_left_to_the_caller(self, mock_sleep):
+        result, received = post([gateway_reply(503), gateway_reply()])
+
+        self.assertFalse(result.ok)
+        self.assertTrue(result.retry)
+        self.assertEqual(len(received), 1)
+
+    def test_read_timeout_not_retried(self, mock_sleep):
+        result, received = post([httpx.ReadTimeout('slow')])
+
+        self.assertFalse(result.ok)
+        self.assertIsNone(result.status_code)
+        self.assertEqual(len(received), 1)
+
+    def test_rejected_recipient(self, mock_sleep):
+        result, _ = post([gateway_reply(status_code_of_recipient=403)])
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error, 'Rejected by the gateway')
+
+
+def add(x, y):
+    return x + y
+
+
+def broken():
+    raise ValueError('boom')
+
+
+class AsyncSmsWorkerTests(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('customer_orders_app.async_worker.django_rq')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.worker = AsyncSmsWorker('sms', concurrency=10, threads=2)
+        self.addCleanup(self.worker.executor.shutdown)
+        self.worker.start = Mock()
+        self.worker.end = Mock()
+        self.worker.fail = Mock()
+
+    def job(self, func, *args):
+        return Mock(id='job-1', func=func, args=args, kwargs={})
+
+    def perform(self, job):
+        async def run():
+            self.worker.client = Mock()
+            await self.worker.perform(job)
+        asyncio.run(run())
+
+    @patch('customer_orders_app.async_worker.post_message_async')
+    @patch('customer_orders_app.async_worker.delivery.finish')
+    @patch('customer_orders_app.async_worker.delivery.prepare')
+    def test_sends_notification(self, mock_prepare, mock_finish, mock_post):
+        mock_prepare.return_value = True
+        mock_post.return_value = SmsResult(ok=True, status_code=201)
+
+        self.perform(self.job(
+            delivery.send_notification, 'order-created:1', '+254701036054',
+            'Order for food at Kshs 11 Created'))
+
+        mock_prepare.assert_called_once_with(
+            'order-created:1', '+254701036054',
+            'Order for food at Kshs 11 Created', 1)
+        mock_finish.assert_called_once_with(
+            'order-created:1', '+254701036054',
+            'Order for food at Kshs 11 Created', mock_post.return_value, 1)
+        self.assertEqual(self.worker.processed, 1)
+
+    @patch('customer_orders_app.async_worker.post_message_async')
+    @patch('customer_orders_app.async_worker.delivery.finish')
+    @patch('customer_orders_app.async_worker.delivery.prepare')
+    def test_skips_notification_not_prepared(
+            self, mock_prepare, mock_finish, mock_post):
+        mock_prepare.return_value = False
+
+        self.perform(self.job(
+            delivery.send_notification, 'order-created:1', '+254701036054',
+            'Order for food at Kshs 11 Created'))
+
+        mock_post.assert_not_called()
+        mock_finish.assert_not_called()
+
+    def test_runs_other_jobs_in_threads(self):
+        job = self.job(add, 1, 2)
+        self.perform(job)
+
+        self.worker.end.assert_called_once_with(
+            job, async_worker.JobStatus.FINISHED)
+        self.assertEqual(self.worker.processed, 1)
+
+    def test_failed_job(self):
+        job = self.job(broken)
+        self.perform(job)
+
+        self.worker.fail.assert_called_once()
+        self.assertIn('ValueError', self.worker.fail.call_args[0][1])
+        self.assertEqual(self.worker.failed, 1)
+
+    @patch('customer_orders_app.async_worker.close_old_connections')
+    def test_database_steps_drop_stale_connections(self, mock_close):
+        self.perform(self.job(add, 1, 2))
+
+        self.assertEqual(mock_close.call_count, 2)
+
+    @patch('customer_orders_app.async_worker.Job.fetch')
+    def test_drain_requeues_unfinished_jobs(self, mock_fetch):
+        self.worker.drain_timeout = 0.01
+        job = self.job(add)
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(60)
+
+        async def run():
+            with patch.object(self.worker, 'send', hang):
+                job.func = delivery.send_notification
+                self.worker.tasks.add(
+                    asyncio.create_task(self.worker.perform(job)))
+                await asyncio.sleep(0)
+                await self.worker.drain()
+
+        asyncio.run(run())
+        self.worker.queue.started_job_registry.remove.assert_called_once_with(
+            job)
+        self.worker.queue.enqueue_job.assert_called_once_with(
+            mock_fetch.return_value)
@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APIClient
+from django.contrib.auth.models import User
+from customer_orders_app.authentication import _token_key
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        """
+        Create a user with a token and authenticate with it.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('metrics')
+
+    def token_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return sum('authtoken_token' in query['sql'] for query in queries)
+
+    def test_token_lookup_cached(self):
+        self.assertEqual(self.token_queries(), 1)
+        self.assertEqual(self.token_queries(), 0)
+
+    def test_only_the_lookup_is_cached(self):
+        self.token_queries()
+        cached = cache.get(_token_key(self.token.key))
+        self.assertEqual(cached, {
+            'user_id': self.user.pk, 'key': self.token.key,
+            'is_active': True})
+
+    def test_user_changed_elsewhere(self):
+        """
+        Ensure the user is read fresh even when the entry was not dropped,
+        as happens in other processes without a shared cache.
+        """
+        self.token_queries()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertIsNone(cache.get(_token_key(self.token.key)))
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_deleted_token_refused(self):
+        self.token_queries()
+        self.token.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_regenerated_token(self):
+        self.token_queries()
+        response = self.client.post(reverse('token_obtain_pair'))
+        self.assertEqual(response.status_code, 201)
+        new_key = response.data['token']
+        self.assertNotEqual(new_key, self.token.key)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new_key}')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_revoked_token(self):
+        self.token_queries()
+        response = self.client.delete(reverse('token_obtain_pair'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_deactivated_user_refused(self):
+        self.token_queries()
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,138 @@
+from collections import Counter
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+from customer_orders_app.caching import (
+    customer_detail_stats, customer_version)
+from customer_orders_app.models import Customer, Order
+from django.contrib.auth.models import User
+
+
+@override_settings(CUSTOMER_CACHE_VERSIONS=True)
+class CustomerDetailCacheTests(APITestCase):
+    def setUp(self):
+        """
+        Create a customer with one order and warm its cached detail.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.customer = Customer.objects.create(
+            name="John Doe",
+            phone_number="+254703045843"
+        )
+        self.order = Order.objects.create(
+            customer=self.customer, item="bike", amount=1221)
+        self.url = reverse('view_customer_info', args=[self.customer.id])
+        self.client.get(self.url)
+
+    def test_hit_skips_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.data['orders'][0]['item'], 'bike')
+
+    def test_customer_update_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse('update-customer', args=[self.customer.id]),
+                {'name': 'Jane Doe'}, format='json')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['Customer_details']['name'], 'Jane Doe')
+
+    def test_customer_delete_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse('delete-customer', args=[self.customer.id]))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_order_create_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                customer=self.customer, item="helmet", amount=12)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['orders']), 2)
+
+    def test_order_update_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse('update-order', args=[self.order.id]),
+                {'item': 'car'}, format='json')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['orders'][0]['item'], 'car')
+
+    def test_order_delete_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['orders'], [])
+
+    def test_version_moves_on_commit(self):
+        """
+        Ensure a read between a write and its commit keeps the old version,
+        so whatever it caches is dropped once the write commits.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.name = 'Jane Doe'
+            self.customer.save()
+            version = customer_version(self.customer.id)
+            response = self.client.get(self.url)
+            self.assertEqual(
+                response.data['Customer_details']['name'], 'John Doe')
+        self.assertGreater(customer_version(self.customer.id), version)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['Customer_details']['name'], 'Jane Doe')
+
+    def redis_counters(self):
+        counters = Counter()
+        client = Mock()
+        client.incr.side_effect = lambda key: counters.update([key])
+        client.mget.side_effect = lambda *keys: [
+            counters.get(key) for key in keys]
+        patcher = patch(
+            'customer_orders_app.caching.get_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+    def test_hit_and_miss_counters(self):
+        client = self.redis_counters()
+        cache.clear()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(client.incr.call_count, 2)
+        self.assertEqual(customer_detail_stats(), {'hits': 1, 'misses': 1})
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(
+            response.data['customer_detail_cache'], {'hits': 1, 'misses': 1})
+
+    @override_settings(CUSTOMER_DETAIL_CACHE_STATS_RATE=0)
+    def test_counters_turned_off(self):
+        client = self.redis_counters()
+        self.client.get(self.url)
+        client.incr.assert_not_called()
+        self.assertEqual(customer_detail_stats(), {'hits': 0, 'misses': 0})
+
+    def test_counters_without_redis(self):
+        self.client.get(self.url)
+        self.assertEqual(customer_detail_stats(), {'hits': 0, 'misses': 0})
+
+    @override_settings(CUSTOMER_CACHE_VERSIONS=False)
+    def test_unshared_cache_serves_from_the_database(self):
+        """
+        Ensure a cache private to the process is not used to cache or
+        validate customers, as other processes would not see the changes.
+        """
+        Customer.objects.filter(pk=self.customer.pk).update(name='Jane Doe')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['Customer_details']['name'], 'Jane Doe')
+        self.assertNotIn('ETag', response)
+        self.assertIsNone(customer_version(self.customer.id))
@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from customer_orders_app.models import Customer, Order
+from django.contrib.auth.models import User
+
+
+@override_settings(CUSTOMER_CACHE_VERSIONS=True)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        """
+        Create a customer with one order.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.customer = Customer.objects.create(
+            name="John Doe",
+            phone_number="+254703045843"
+        )
+        self.order = Order.objects.create(
+            customer=self.customer, item="bike", amount=1221)
+
+    def _revalidate(self, url, params=None):
+        """
+        Fetches url, then fetches it again with the ETag it returned.
+        """
+        first = self.client.get(url, params)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', first)
+        second = self.client.get(
+            url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        return first, second
+
+    def test_updated_at_maintained(self):
+        updated_at = self.order.updated_at
+        self.client.put(
+            reverse('update-order', args=[self.order.id]),
+            {'item': 'car'}, format='json')
+        self.order.refresh_from_db()
+        self.assertGreater(self.order.updated_at, updated_at)
+
+    def test_customer_detail_not_modified(self):
+        url = reverse('view_customer_info', args=[self.customer.id])
+        first, _ = self._revalidate(url)
+        self.assertIn('Last-Modified', first)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+
+    def test_customer_detail_modified(self):
+        url = reverse('view_customer_info', args=[self.customer.id])
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                customer=self.customer, item="helmet", amount=1)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_customer_detail_if_modified_since(self):
+        url = reverse('view_customer_info', args=[self.customer.id])
+        first = self.client.get(url)
+        second = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_view_order_by_order_id(self):
+        url = reverse('view_order')
+        params = {'order_id': self.order.id}
+        _, second = self._revalidate(url, params)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.customer.name = 'Jane Doe'
+        self.customer.save()
+        third = self.client.get(
+            url, params, HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+
+    def test_view_order_by_customer_id(self):
+        url = reverse('view_order')
+        params = {'customer_id': self.customer.id}
+        first, second = self._revalidate(url, params)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse('update-order', args=[self.order.id]),
+                {'item': 'car'}, format='json')
+        third = self.client.get(
+            url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertEqual(third.data[0]['item'], 'car')
+
+    def test_order_list(self):
+        url = reverse('all_orders')
+        first, second = self._revalidate(url)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Order.objects.create(customer=self.customer, item="helmet", amount=1)
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertEqual(third.data['count'], 2)
+
+    def test_customer_list_cursor_mode(self):
+        url = reverse('all_customers')
+        _, second = self._revalidate(url, {'pagination': 'cursor'})
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,78 @@
+from django.db.backends.postgresql.base import Database
+from django.test import SimpleTestCase
+from customer_orders.postgresql_pool.base import IDLE, UNKNOWN, Pool
+
+
+class FakeInfo:
+    transaction_status = IDLE
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class PoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = Pool(max_size=2, timeout=0.01)
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_reuses_connections(self):
+        first = self.pool.take(self.connect)
+        self.pool.give_back(first)
+        self.assertIs(self.pool.take(self.connect), first)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_waits_for_a_free_connection(self):
+        self.pool.take(self.connect)
+        self.pool.take(self.connect)
+        with self.assertRaises(Database.OperationalError):
+            self.pool.take(self.connect)
+
+    def test_open_transaction_rolled_back(self):
+        connection = self.pool.take(self.connect)
+        connection.info.transaction_status = 2
+        self.pool.give_back(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(self.pool.take(self.connect), connection)
+
+    def test_broken_connections_discarded(self):
+        lost = self.pool.take(self.connect)
+        lost.info.transaction_status = UNKNOWN
+        closed = self.pool.take(self.connect)
+        closed.closed = 2
+        self.pool.give_back(lost)
+        self.pool.give_back(closed)
+
+        self.assertFalse(self.pool.idle)
+        self.assertTrue(lost.closed)
+        self.pool.take(self.connect)
+        self.pool.take(self.connect)
+        self.assertEqual(len(self.opened), 4)
+
+    def test_failed_health_check(self):
+        self.pool.give_back(self.pool.take(self.connect))
+        connection = self.pool.take(self.connect, check=lambda c: False)
+        self.assertIsNot(connection, self.opened[0])
+        self.assertTrue(self.opened[0].closed)
+
+    def test_discard(self):
+        connection = self.pool.take(self.connect)
+        self.pool.give_back(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertFalse(self.pool.idle)
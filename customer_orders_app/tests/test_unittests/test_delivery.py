@@ -0,0 +1,117 @@
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from customer_orders_app import delivery
+from customer_orders_app.models import OrderNotification
+from customer_orders_app.sms_sender import MAX_RETRIES, SmsResult
+from .fakes import FakeRedis
+import uuid
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_DELAY=60)
+class SendNotificationTests(TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch(
+            'customer_orders_app.delivery.django_rq.get_connection',
+            return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the token bucket is a Lua script, which FakeRedis cannot run
+        patcher = patch(
+            'customer_orders_app.sms_guard.take_tokens',
+            return_value=(True, 0.0, 10.0))
+        self.take_tokens = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.notification = OrderNotification.objects.create(
+            order_id=uuid.uuid4(), dedupe_key='order-created:1',
+            to='+254703045843', message='Order for pen at Kshs 10 Created',
+            status=OrderNotification.QUEUED, attempts=1)
+
+    def send(self):
+        return delivery.send_notification(
+            'order-created:1', '+254703045843',
+            'Order for pen at Kshs 10 Created')
+
+    @patch('customer_orders_app.delivery.post_message')
+    def test_sent_once(self, mock_post):
+        mock_post.return_value = SmsResult(ok=True, status_code=201)
+
+        self.assertTrue(self.send().ok)
+        self.assertIsNone(self.send())
+
+        mock_post.assert_called_once_with(
+            '+254703045843', 'Order for pen at Kshs 10 Created')
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, OrderNotification.SENT)
+
+    @patch('customer_orders_app.delivery.post_message')
+    def test_claimed_elsewhere_is_skipped(self, mock_post):
+        self.redis.set('sms:dedupe:order-created:1', delivery.SENDING)
+        self.assertIsNone(self.send())
+        mock_post.assert_not_called()
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, OrderNotification.QUEUED)
+
+    @patch('customer_orders_app.delivery.post_message')
+    def test_failure_released_for_retry(self, mock_post):
+        mock_post.return_value = SmsResult(
+            ok=False, status_code=503, error='HTTP 503')
+
+        self.assertFalse(self.send().ok)
+
+        self.assertIsNone(self.redis.get('sms:dedupe:order-created:1'))
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, OrderNotification.PENDING)
+        self.assertEqual(self.notification.last_error, 'HTTP 503')
+        self.assertGreater(
+            self.notification.available_at, self.notification.created_at)
+
+    @patch('customer_orders_app.delivery.post_message')
+    @patch('customer_orders_app.sms_guard.reschedule')
+    def test_retry_rescheduled(self, mock_reschedule, mock_post):
+        mock_post.return_value = SmsResult(
+            ok=False, status_code=503, error='HTTP 503', retry=True)
+
+        self.send()
+
+        mock_post.assert_called_once()
+        job, _, *args = mock_reschedule.call_args.args
+        self.assertIs(job, delivery.send_notification)
+        self.assertEqual(args, [
+            'order-created:1', '+254703045843',
+            'Order for pen at Kshs 10 Created', 2])
+        self.assertIsNone(self.redis.get('sms:dedupe:order-created:1'))
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, OrderNotification.QUEUED)
+
+        mock_reschedule.reset_mock()
+        delivery.send_notification(*args[:3], MAX_RETRIES + 1)
+        mock_reschedule.assert_not_called()
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, OrderNotification.PENDING)
+
+    @patch('customer_orders_app.delivery.post_message')
+    def test_failed_after_max_attempts(self, mock_post):
+        OrderNotification.objects.update(attempts=2)
+        mock_post.return_value = SmsResult(
+            ok=False, status_code=401, error='HTTP 401')
+
+        self.send()
+
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, OrderNotification.FAILED)
+
+    @patch('customer_orders_app.delivery.post_message')
+    @patch('customer_orders_app.sms_guard.reschedule')
+    @patch('customer_orders_app.sms_guard.wait_to_send', return_value=12.0)
+    def test_put_off_while_limited(self, mock_wait, mock_reschedule,
+                                   mock_post):
+        self.assertIsNone(self.send())
+
+        mock_post.assert_not_called()
+        mock_reschedule.assert_called_once_with(
+            delivery.send_notification, 12.0, 'order-created:1',
+            '+254703045843', 'Order for pen at Kshs 10 Created', 1)
+        # the claim is released so the rescheduled job can send
+        self.assertIsNone(self.redis.get('sms:dedupe:order-created:1'))
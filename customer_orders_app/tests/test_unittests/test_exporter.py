@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from customer_orders_app import exporter
+from customer_orders_app.models import Customer, Order
+from django.contrib.auth.models import User
+
+
+class ExportRowsTests(TestCase):
+
+    def setUp(self):
+        self.john = Customer.objects.create(
+            name="John Doe", phone_number="+254703045843")
+        self.jane = Customer.objects.create(
+            name="Jane Doe", phone_number="+254703045844")
+        self.orders = [
+            Order.objects.create(
+                customer=self.john if i % 2 else self.jane,
+                item=f"Item {i}", amount=i)
+            for i in range(4)]
+        # spread the orders one day apart, oldest first
+        now = timezone.now()
+        for days, order in enumerate(reversed(self.orders)):
+            Order.objects.filter(pk=order.pk).update(
+                created_at=now - timedelta(days=days))
+
+    def test_all_rows_oldest_first(self):
+        rows = list(exporter.export_rows())
+        self.assertEqual(
+            [row[0] for row in rows], [order.id for order in self.orders])
+        self.assertEqual(rows[1][5:], ('John Doe', '+254703045843'))
+
+    def test_filter_by_customer(self):
+        rows = list(exporter.export_rows(customer_id=self.john.id))
+        self.assertEqual(
+            [row[1] for row in rows], ['Item 1', 'Item 3'])
+
+    def test_filter_by_date_range(self):
+        now = timezone.now()
+        rows = list(exporter.export_rows(
+            created_after=now - timedelta(days=2, hours=1),
+            created_before=now - timedelta(hours=1)))
+        self.assertEqual(
+            [row[1] for row in rows], ['Item 1', 'Item 2'])
+
+    def test_ndjson_lines(self):
+        lines = list(exporter.ndjson_lines(exporter.export_rows()))
+        self.assertEqual(len(lines), 4)
+        first = json.loads(lines[0])
+        self.assertEqual(first['id'], str(self.orders[0].id))
+        self.assertEqual(first['amount'], '0.00')
+        self.assertEqual(first['customer_name'], 'Jane Doe')
+
+    def test_csv_lines(self):
+        text = ''.join(exporter.csv_lines(exporter.export_rows()))
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[3]['item'], 'Item 3')
+        self.assertEqual(rows[3]['customer_phone_number'], '+254703045843')
+
+    def test_missing_values(self):
+        """
+        Ensure a missing value is exported as null, not the text "None".
+        """
+        row = list(exporter.export_rows())[0][:5] + (None, None)
+        line = json.loads(next(exporter.ndjson_lines([row])))
+        self.assertIsNone(line['customer_name'])
+        self.assertEqual(line['created_at'], row[3].isoformat())
+        text = ''.join(exporter.csv_lines([row]))
+        self.assertTrue(text.splitlines()[1].endswith(',,'))
+
+
+class OrderExportViewTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(
+            name="John Doe", phone_number="+254703045843")
+        for i in range(3):
+            Order.objects.create(
+                customer=self.customer, item=f"Item {i}", amount=i)
+        self.url = reverse('export-orders')
+
+    def content(self, response) -> str:
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_by_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('orders.ndjson', response['Content-Disposition'])
+        lines = self.content(response).splitlines()
+        self.assertEqual(
+            [json.loads(line)['item'] for line in lines],
+            ['Item 0', 'Item 1', 'Item 2'])
+
+    def test_csv(self):
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(rows[0], exporter.FIELDS)
+        self.assertEqual(len(rows), 4)
+
+    def test_filters(self):
+        other = Customer.objects.create(
+            name="Jane Doe", phone_number="+254703045844")
+        Order.objects.create(customer=other, item="Other", amount=1)
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+
+        response = self.client.get(self.url, {
+            'customer_id': other.id,
+            'created_after': '2000-01-01',
+            'created_before': tomorrow})
+        lines = self.content(response).splitlines()
+        self.assertEqual([json.loads(line)['item'] for line in lines],
+                         ['Other'])
+
+        response = self.client.get(
+            self.url, {'created_after': tomorrow})
+        self.assertEqual(self.content(response), '')
+
+    def test_invalid_parameters(self):
+        for params in ({'output': 'xml'},
+                       {'customer_id': 'nope'},
+                       {'created_after': 'yesterday'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,49 @@
+'''
+Defines unittest for primary key generation
+'''
+import time
+import uuid
+from django.test import TestCase, override_settings
+from customer_orders_app.ids import new_id, uuid7
+from customer_orders_app.models import Customer
+
+
+class Uuid7Tests(TestCase):
+
+    def test_version_and_variant(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_embeds_timestamp(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        after = time.time_ns() // 1_000_000
+        self.assertTrue(before <= value.int >> 80 <= after)
+
+    def test_time_ordered(self):
+        """
+        Test that ids from later milliseconds sort after earlier ones.
+        """
+        first = uuid7()
+        time.sleep(0.002)
+        second = uuid7()
+        self.assertLess(first, second)
+        self.assertLess(str(first), str(second))
+
+    def test_unique(self):
+        self.assertEqual(len({uuid7() for _ in range(1000)}), 1000)
+
+
+class NewIdTests(TestCase):
+
+    @override_settings(UUID_VERSION=4)
+    def test_random_by_default(self):
+        self.assertEqual(new_id().version, 4)
+
+    @override_settings(UUID_VERSION=7)
+    def test_time_ordered_ids(self):
+        customer = Customer.objects.create(
+            name="John Doe", phone_number="+254703045843")
+        self.assertIsInstance(customer.id, uuid.UUID)
+        self.assertEqual(customer.id.version, 7)
@@ -0,0 +1,103 @@
+import io
+import json
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from customer_orders_app.importer import import_customers
+from customer_orders_app.models import Customer
+from django.contrib.auth.models import User
+
+CSV = '''name,phone_number
+John Doe,+254703045843
+Jane Doe,+254 703 045 844
+Bad Phone,0703045845
+,+254703045846
+Jane Again,+254703045844
+Existing,+254703045800
+'''
+
+
+class ImportCustomersTests(TestCase):
+
+    def setUp(self):
+        self.existing = Customer.objects.create(
+            name="Old Name", phone_number="+254703045800")
+
+    def test_csv_report(self):
+        report = import_customers(io.StringIO(CSV), 'csv', batch_size=2)
+        self.assertEqual(report.rows, 6)
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.duplicates, 2)
+        self.assertEqual(report.rejected, 2)
+        self.assertEqual(
+            [reject['line'] for reject in report.rejects], [4, 5])
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_phone_numbers_normalized(self):
+        import_customers(io.StringIO(CSV), 'csv')
+        customer = Customer.objects.get(name='Jane Doe')
+        self.assertEqual(customer.phone_number, '+254703045844')
+
+    def test_existing_customers_kept(self):
+        import_customers(io.StringIO(CSV), 'csv')
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'Old Name')
+
+    def test_update_existing(self):
+        report = import_customers(
+            io.StringIO(CSV), 'csv', update_existing=True)
+        self.assertEqual(report.updated, 1)
+        self.assertEqual(report.duplicates, 1)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'Existing')
+
+    def test_ndjson(self):
+        lines = [
+            json.dumps({'name': 'John Doe', 'phone_number': '+254703045843'}),
+            'not json',
+            json.dumps(['not', 'an', 'object']),
+            '',
+        ]
+        report = import_customers(io.StringIO('\n'.join(lines)), 'ndjson')
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.rejected, 2)
+
+    def test_command(self):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as handle:
+            handle.write(CSV)
+            handle.flush()
+            call_command('import_customers', handle.name, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['created'], 2)
+
+
+class CustomerImportViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('import-customers')
+
+    def test_upload_csv(self):
+        upload = SimpleUploadedFile('customers.csv', CSV.encode())
+        response = self.client.post(
+            self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertIn('rows_per_second', response.data)
+
+    def test_missing_file(self):
+        response = self.client.post(self.url, {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bad_format(self):
+        upload = SimpleUploadedFile('customers.csv', CSV.encode())
+        response = self.client.post(
+            self.url, {'file': upload, 'format': 'xml'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,133 @@
+import time
+import jwt
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from unittest.mock import patch
+from customer_orders_app.jwt_auth import (
+    REVOKED_KEY, RotatingTokenBackend, revocations)
+from django.contrib.auth.models import User
+from .fakes import FakeRedis
+
+
+class RotatingTokenBackendTests(APITestCase):
+
+    def test_rotated_key_still_verifies(self):
+        old = RotatingTokenBackend({'k1': 'first'}, algorithm='HS256')
+        new = RotatingTokenBackend(
+            {'k2': 'second', 'k1': 'first'}, algorithm='HS256')
+
+        token = old.encode({'user_id': 1})
+        self.assertEqual(jwt.get_unverified_header(token)['kid'], 'k1')
+        self.assertEqual(new.decode(token), {'user_id': 1})
+        self.assertEqual(
+            jwt.get_unverified_header(new.encode({}))['kid'], 'k2')
+
+    def test_retired_key_refused(self):
+        old = RotatingTokenBackend({'k1': 'first'}, algorithm='HS256')
+        new = RotatingTokenBackend({'k2': 'second'}, algorithm='HS256')
+        with self.assertRaises(TokenBackendError):
+            new.decode(old.encode({'user_id': 1}))
+
+    def test_forged_kid_refused(self):
+        backend = RotatingTokenBackend({'k1': 'first'}, algorithm='HS256')
+        token = jwt.encode(
+            {'user_id': 1}, 'guess', algorithm='HS256',
+            headers={'kid': 'k1'})
+        with self.assertRaises(TokenBackendError):
+            backend.decode(token)
+
+
+@override_settings(JWT_REVOCATION_REFRESH=60)
+class JwtAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch(
+            'customer_orders_app.jwt_auth.get_client',
+            return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        revocations.revoked = set()
+        revocations.loaded_at = None
+
+        User.objects.create_user(username='testuser', password='testpass')
+        self.client = APIClient()
+        response = self.client.post(
+            reverse('jwt-obtain'),
+            {'username': 'testuser', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 200)
+        self.access = response.data['access']
+        self.refresh = response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.url = reverse('all_customers')
+
+    def test_authenticates_without_queries_on_the_user(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([
+            query for query in queries
+            if 'auth_user' in query['sql'] or 'authtoken' in query['sql']])
+
+    def test_bad_signature_refused(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {self.access[:-2]}xx')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_refresh(self):
+        response = self.client.post(
+            reverse('jwt-refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_revoke(self):
+        response = self.client.post(
+            reverse('jwt-revoke'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        response = self.client.post(
+            reverse('jwt-refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 401)
+        self.client.credentials()
+        response = self.client.post(
+            reverse('jwt-revoke'), {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 400)
+
+    def test_revocations_from_other_processes(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        jti = jwt.decode(
+            self.access, options={'verify_signature': False})['jti']
+        self.redis.zadd(REVOKED_KEY, {jti: time.time() + 300})
+
+        # the copy held by this process is refreshed once it is stale
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        revocations.loaded_at -= 60
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_unreachable_redis_keeps_the_list(self):
+        self.client.post(reverse('jwt-revoke'), {'refresh': self.refresh})
+        revocations.loaded_at -= 60
+        with patch.object(
+                self.redis, 'zrangebyscore',
+                side_effect=RedisConnectionError('down')), \
+                self.assertLogs('customer_orders_app.jwt_auth', 'WARNING'):
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_without_redis_url(self):
+        with patch(
+                'customer_orders_app.jwt_auth.get_client', return_value=None):
+            response = self.client.post(
+                reverse('jwt-revoke'), {'refresh': self.refresh})
+            self.assertEqual(response.status_code, 204)
+            revocations.loaded_at -= 60
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertFalse(self.redis.zrangebyscore(REVOKED_KEY, 0, '+inf'))
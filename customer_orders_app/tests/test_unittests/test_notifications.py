@@ -0,0 +1,182 @@
+import io
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest.mock import patch
+from customer_orders_app import notifications
+from customer_orders_app.delivery import send_notification
+from customer_orders_app.models import Customer, Order, OrderNotification
+
+
+class NotificationOutboxTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name="John Doe", phone_number="+254703045843")
+        self.orders = [
+            Order.objects.create(
+                customer=self.customer, item=f"Item {i}", amount=i)
+            for i in range(3)]
+        notifications.add_order_notifications(self.orders)
+
+    def test_add_order_notifications(self):
+        notification = OrderNotification.objects.get(
+            order_id=self.orders[1].id)
+        self.assertEqual(
+            notification.dedupe_key, f'order-created:{self.orders[1].id}')
+        self.assertEqual(notification.to, '+254703045843')
+        self.assertEqual(
+            notification.message, 'Order for Item 1 at Kshs 1 Created')
+        self.assertEqual(notification.status, OrderNotification.PENDING)
+
+    @override_settings(SMS_BATCH_WINDOW=0)
+    @patch('customer_orders_app.notifications.django_rq.get_queue')
+    def test_relay_enqueues_due_notifications(self, mock_get_queue):
+        OrderNotification.objects.filter(
+            order_id=self.orders[2].id).update(
+                available_at=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(notifications.relay(), 2)
+
+        jobs = mock_get_queue.return_value.enqueue_many.call_args.args[0]
+        self.assertEqual(len(jobs), 2)
+        self.assertIs(jobs[0].func, send_notification)
+        relayed = OrderNotification.objects.filter(
+            status=OrderNotification.QUEUED)
+        self.assertEqual(relayed.count(), 2)
+        self.assertEqual({n.attempts for n in relayed}, {1})
+        # queued notifications are not relayed again until they are due
+        self.assertEqual(notifications.relay(), 0)
+
+    @override_settings(SMS_BATCH_WINDOW=0)
+    @patch('customer_orders_app.notifications.django_rq.get_queue')
+    def test_relay_batch_size(self, mock_get_queue):
+        self.assertEqual(notifications.relay(batch_size=2), 2)
+        self.assertEqual(notifications.relay(batch_size=2), 1)
+
+    @override_settings(SMS_BATCH_WINDOW=0)
+    @patch('customer_orders_app.notifications.django_rq.get_queue')
+    def test_failed_dispatch_leaves_notifications_due(self, mock_get_queue):
+        mock_get_queue.return_value.enqueue_many.side_effect = (
+            ConnectionError('redis down'))
+
+        with self.assertRaises(ConnectionError):
+            notifications.relay()
+
+        self.assertEqual(
+            OrderNotification.objects.filter(
+                status=OrderNotification.PENDING, attempts=0).count(), 3)
+
+    @override_settings(SMS_BATCH_WINDOW=1)
+    @patch('customer_orders_app.notifications.sms_batcher.add')
+    def test_relay_to_batcher(self, mock_add):
+        notifications.relay()
+        batch = mock_add.call_args.args[0]
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch[0], {
+            'order_id': str(self.orders[0].id),
+            'dedupe_key': f'order-created:{self.orders[0].id}',
+            'to': '+254703045843',
+            'message': 'Order for Item 0 at Kshs 0 Created'})
+
+    @override_settings(SMS_BATCH_WINDOW=0)
+    @patch('customer_orders_app.notifications.django_rq.get_queue')
+    def test_relay_command(self, mock_get_queue):
+        out = io.StringIO()
+        call_command(
+            'relay_notifications', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('Relayed 3 notifications', out.getvalue())
+        self.assertFalse(OrderNotification.objects.filter(
+            status=OrderNotification.PENDING).exists())
+
+
+@override_settings(SMS_BATCH_WINDOW=0, SMS_COALESCE_WINDOW=60)
+@patch('customer_orders_app.notifications.django_rq')
+class CoalescingTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name="John Doe", phone_number="+254703045843")
+        self.other = Customer.objects.create(
+            name="Jane Doe", phone_number="+254701036054")
+
+    def add(self, customer, item, amount):
+        order = Order.objects.create(
+            customer=customer, item=item, amount=amount)
+        notifications.add_order_notifications([order])
+        return order
+
+    def relay(self, mock_rq):
+        # relay once the first window is over
+        OrderNotification.objects.filter(
+            dedupe_key=OrderNotification.objects.first().dedupe_key,
+        ).update(available_at=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            relayed = notifications.relay()
+        jobs = mock_rq.get_queue.return_value.enqueue_many.call_args.args[0]
+        return relayed, [job.args for job in jobs]
+
+    def test_waits_out_the_window(self, mock_rq):
+        self.add(self.customer, 'pen', 10)
+        self.assertEqual(notifications.relay(), 0)
+
+    def test_orders_summarised(self, mock_rq):
+        first = self.add(self.customer, 'pen', 10)
+        self.add(self.customer, 'book', 25)
+        self.add(self.customer, 'ink', '5.50')
+
+        relayed, jobs = self.relay(mock_rq)
+
+        self.assertEqual(relayed, 1)
+        self.assertEqual(jobs, [(
+            f'coalesced:order-created:{first.id}', '+254703045843',
+            '3 orders totalling Kshs 40.50 Created')])
+        self.assertEqual(OrderNotification.objects.filter(
+            status=OrderNotification.MERGED).count(), 3)
+        mock_rq.get_connection.return_value.incrby.assert_called_once_with(
+            notifications.SENDS_SAVED_KEY, 3)
+
+    def test_duplicates_sent_once(self, mock_rq):
+        self.add(self.customer, 'pen', 10)
+        self.add(self.customer, 'pen', 10)
+
+        relayed, jobs = self.relay(mock_rq)
+
+        self.assertEqual(jobs, [
+            (jobs[0][0], '+254703045843', 'Order for pen at Kshs 10 Created')])
+        self.assertEqual(OrderNotification.objects.filter(
+            status=OrderNotification.MERGED).count(), 1)
+        mock_rq.get_connection.return_value.incrby.assert_called_once_with(
+            notifications.SENDS_SAVED_KEY, 1)
+
+    def test_numbers_kept_apart(self, mock_rq):
+        self.add(self.customer, 'pen', 10)
+        self.add(self.other, 'book', 25)
+        OrderNotification.objects.update(available_at=timezone.now())
+
+        relayed, jobs = self.relay(mock_rq)
+
+        self.assertEqual(relayed, 2)
+        mock_rq.get_connection.return_value.incrby.assert_not_called()
+
+    def test_retries_not_merged_again(self, mock_rq):
+        self.add(self.customer, 'pen', 10)
+        self.add(self.customer, 'book', 25)
+        self.relay(mock_rq)
+        OrderNotification.objects.filter(
+            status=OrderNotification.QUEUED).update(
+                status=OrderNotification.PENDING,
+                available_at=timezone.now())
+        self.add(self.customer, 'ink', 5)
+
+        relayed, jobs = self.relay(mock_rq)
+
+        self.assertEqual(relayed, 1)
+        self.assertEqual(jobs[0][2], '2 orders totalling Kshs 35.00 Created')
+
+    def test_metrics(self, mock_rq):
+        mock_rq.get_connection.return_value.get.return_value = b'7'
+        self.assertEqual(
+            notifications.coalescing_stats(),
+            {'window': 60, 'sends_saved': 7})
@@ -0,0 +1,184 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from customer_orders_app.models import Customer, Order
+from django.contrib.auth.models import User
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        """
+        Create a customer with enough orders to span several pages.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.login(username='testuser', password='testpassword')
+
+        self.customer = Customer.objects.create(
+            name="John Doe",
+            phone_number="+254703045843"
+        )
+        self.orders = [
+            Order.objects.create(
+                item=f"item_{i}", amount=100 * i, customer=self.customer)
+            for i in range(1, 13)
+        ]
+        self.url = reverse('all_orders')
+
+    def _ids(self, response):
+        return [result['id'] for result in response.data['results']]
+
+    def test_first_page(self):
+        """
+        Ensure the first cursor page has no count and no previous link.
+        """
+        response = self.client.get(
+            self.url, {'pagination': 'cursor', 'page_size': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(
+            self._ids(response), [str(o.id) for o in self.orders[:5]])
+
+    def test_forward_traversal(self):
+        """
+        Ensure following next links walks every order exactly once.
+        """
+        seen = []
+        response = self.client.get(
+            self.url, {'pagination': 'cursor', 'page_size': 5})
+        seen += self._ids(response)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += self._ids(response)
+        self.assertEqual(seen, [str(o.id) for o in self.orders])
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_backward_traversal(self):
+        """
+        Ensure the previous link returns the page before the current one.
+        """
+        first = self.client.get(
+            self.url, {'pagination': 'cursor', 'page_size': 5})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(self._ids(back), self._ids(first))
+        self.assertIsNone(back.data['previous'])
+        self.assertIsNotNone(back.data['next'])
+
+    def test_page_size_is_capped(self):
+        """
+        Ensure the requested page size cannot exceed the hard cap.
+        """
+        for i in range(13, 120):
+            Order.objects.create(
+                item=f"item_{i}", amount=i, customer=self.customer)
+        response = self.client.get(
+            self.url, {'pagination': 'cursor', 'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_invalid_cursor(self):
+        """
+        Ensure a tampered cursor token returns 404.
+        """
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_customer_list_cursor(self):
+        """
+        Ensure the customer list supports cursor pagination too.
+        """
+        response = self.client.get(
+            reverse('all_customers'), {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+
+class CountModeTests(APITestCase):
+    def setUp(self):
+        """
+        Create twelve orders, enough for two pages of ten.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.customer = Customer.objects.create(
+            name="John Doe",
+            phone_number="+254703045843"
+        )
+        for i in range(1, 13):
+            Order.objects.create(
+                item=f"item_{i}", amount=100 * i, customer=self.customer)
+        self.url = reverse('all_orders')
+        cache.clear()
+
+    def test_exact_count_is_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 12)
+
+    def test_count_none(self):
+        """
+        Ensure count=none skips COUNT(*) and still links the next page.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'count': 'none'})
+        self.assertIsNone(response.data['count'])
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+    def test_count_none_last_page(self):
+        response = self.client.get(self.url, {'count': 'none', 'page': 2})
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_count_none_past_the_end(self):
+        response = self.client.get(self.url, {'count': 'none', 'page': 5})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_count_none_rejects_last_page(self):
+        """
+        Ensure page=last is refused when no count says which page is last.
+        """
+        response = self.client.get(self.url, {'count': 'none', 'page': 'last'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('count=exact', str(response.data['detail']))
+        response = self.client.get(self.url, {'page': 'last'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_estimate_falls_back_to_exact(self):
+        """
+        Ensure databases without a planner estimate report the exact count.
+        """
+        response = self.client.get(self.url, {'count': 'estimate'})
+        self.assertEqual(response.data['count'], 12)
+
+    @override_settings(LIST_COUNT_CACHE_MIN_ROWS=10)
+    def test_large_counts_are_cached(self):
+        """
+        Ensure a cached count is served without another COUNT(*).
+        """
+        self.client.get(self.url)
+        Order.objects.create(item="extra", amount=1, customer=self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 12)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+    def test_small_counts_are_not_cached(self):
+        self.client.get(self.url)
+        Order.objects.create(item="extra", amount=1, customer=self.customer)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 13)
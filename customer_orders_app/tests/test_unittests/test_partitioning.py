@@ -0,0 +1,120 @@
+import gzip
+import os
+from datetime import datetime, timedelta, timezone
+from tempfile import TemporaryDirectory
+from unittest import skipIf, skipUnless
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from customer_orders_app.models import Customer, Order
+from customer_orders_app.partitioning import (
+    DEFAULT_PARTITION, add_months, archive_partition, convert,
+    create_partitions, is_partitioned, month_start, partition_name,
+    partitions)
+
+
+def month(year, number):
+    return datetime(year, number, 1, tzinfo=timezone.utc)
+
+
+class MonthTests(SimpleTestCase):
+
+    def test_month_start(self):
+        nairobi = timezone(timedelta(hours=3))
+        moment = datetime(2024, 3, 1, 1, 30, tzinfo=nairobi)
+        self.assertEqual(month_start(moment), month(2024, 2))
+        self.assertEqual(
+            month_start(datetime(2024, 3, 31, 23, tzinfo=timezone.utc)),
+            month(2024, 3))
+
+    def test_add_months(self):
+        self.assertEqual(add_months(month(2024, 11), 3), month(2025, 2))
+        self.assertEqual(add_months(month(2024, 1), -1), month(2023, 12))
+        self.assertEqual(add_months(month(2024, 1), -13), month(2022, 12))
+
+    def test_partition_name(self):
+        self.assertEqual(
+            partition_name(month(2024, 7)), 'customer_orders_app_order_2024_07')
+
+
+class ArchiveOptionsTests(SimpleTestCase):
+
+    def test_current_month_never_archived(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_orders', '--older-than', '0')
+
+
+@skipIf(connection.vendor == 'postgresql', 'Partitioning is supported')
+class UnsupportedDatabaseTests(TestCase):
+
+    def test_commands_refuse(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_orders', '--convert')
+        with self.assertRaises(CommandError):
+            call_command('archive_orders')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+class PartitioningTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name='Jane', phone_number='+254700000001')
+        self.now = month_start(datetime.now(timezone.utc))
+        for months_ago in range(3):
+            order = Order.objects.create(
+                customer=self.customer, item=f'Item {months_ago}', amount=1)
+            Order.objects.filter(id=order.id).update(
+                created_at=add_months(self.now, -months_ago)
+                + timedelta(days=1))
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+    def test_convert(self):
+        self.assertFalse(is_partitioned(connection))
+        self.assertEqual(convert(connection, add_months(self.now, 1)), 3)
+        self.assertTrue(is_partitioned(connection))
+        self.assertEqual(
+            list(partitions(connection)),
+            [add_months(self.now, count) for count in range(-2, 2)])
+        self.assertEqual(self.count(partition_name(self.now)), 1)
+
+        order = Order.objects.create(
+            customer=self.customer, item='Book', amount=10)
+        order.item = 'Pen'
+        order.save()
+        self.assertEqual(Order.objects.get(id=order.id).item, 'Pen')
+        self.assertEqual(len(self.customer.orders.all()), 4)
+
+    def test_create_partitions_moves_default_rows(self):
+        convert(connection, self.now)
+        later = add_months(self.now, 2)
+        Order.objects.filter(item='Item 0').update(
+            created_at=later + timedelta(days=1))
+        self.assertEqual(self.count(DEFAULT_PARTITION), 1)
+
+        created = create_partitions(connection, self.now, later)
+        self.assertEqual(
+            created,
+            [partition_name(add_months(self.now, 1)), partition_name(later)])
+        self.assertEqual(self.count(DEFAULT_PARTITION), 0)
+        self.assertEqual(self.count(partition_name(later)), 1)
+        self.assertEqual(create_partitions(connection, self.now, later), [])
+
+    def test_archive_partition(self):
+        convert(connection, self.now)
+        oldest = add_months(self.now, -2)
+        with TemporaryDirectory() as directory:
+            path, totals = archive_partition(connection, oldest, directory)
+            self.assertEqual(totals, {self.customer.id: (1, 1)})
+            with gzip.open(path, 'rt') as file:
+                lines = file.read().splitlines()
+            self.assertEqual(os.listdir(directory), [os.path.basename(path)])
+        self.assertTrue(lines[0].startswith('id,created_at,'))
+        self.assertIn('Item 2', lines[1])
+        self.assertNotIn(oldest, partitions(connection))
+        self.assertEqual(Order.objects.count(), 2)
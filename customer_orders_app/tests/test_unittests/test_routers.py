@@ -0,0 +1,115 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from unittest.mock import patch
+from customer_orders_app import routers
+from customer_orders_app.models import Customer, Order
+from customer_orders_app.routers import (
+    ReplicaRouter, ReplicaRoutingMiddleware, primary_if_recent)
+
+
+class ReadView:
+    replica_reads = True
+
+
+class PrimaryView:
+    pass
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=2)
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser')
+        self.router = ReplicaRouter()
+        patcher = patch(
+            'customer_orders_app.routers.replica_lag', return_value=0.0)
+        self.lag = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method='get', view_class=ReadView, handle=None):
+        """
+        Sends a request through the middleware to a view that returns
+        where Order reads are routed, after calling handle.
+        """
+        routed = []
+
+        def view(request):
+            if handle is not None:
+                handle()
+            routed.append(self.router.db_for_read(Order))
+            return HttpResponse()
+        view.cls = view_class
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = getattr(RequestFactory(), method)('/')
+        request.user = self.user
+        middleware(request)
+        return routed[0]
+
+    def test_safe_reads_go_to_a_replica(self):
+        self.assertEqual(self.request(), 'replica1')
+
+    def test_other_requests_go_to_the_primary(self):
+        self.assertEqual(self.request('post'), 'default')
+        self.assertEqual(self.request(view_class=PrimaryView), 'default')
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_read_your_writes(self):
+        def write():
+            Customer.objects.create(name='Jane', phone_number='+254700000001')
+
+        self.assertEqual(self.request('post', handle=write), 'default')
+        self.assertEqual(self.request(), 'default')
+
+        cache.delete(f'replica-pin:{self.user.pk}')
+        self.assertEqual(self.request(), 'replica1')
+
+    def test_lagging_replica_skipped(self):
+        self.lag.return_value = 5.0
+        self.assertEqual(self.request(), 'default')
+        self.lag.return_value = None
+        self.assertEqual(self.request(), 'default')
+
+    def test_recent_changes_read_from_the_primary(self):
+        def recent():
+            with primary_if_recent(timezone.now()):
+                return self.router.db_for_read(Order)
+
+        def old():
+            with primary_if_recent(timezone.now() - timedelta(minutes=1)):
+                return self.router.db_for_read(Order)
+
+        routed = []
+        self.request(handle=lambda: routed.extend([recent(), old()]))
+        self.assertEqual(routed, ['default', 'replica1'])
+
+    def test_writes_go_to_the_primary(self):
+        customer = Customer(name='Jane', phone_number='+254700000001')
+        customer._state.db = 'replica1'
+        self.assertEqual(
+            self.router.db_for_write(Customer, instance=customer), 'default')
+        self.assertFalse(
+            self.router.allow_migrate('replica1', 'customer_orders_app'))
+
+
+class ReplicaLagTests(TestCase):
+
+    def setUp(self):
+        routers._lags.clear()
+        self.addCleanup(routers._lags.clear)
+
+    def test_lag_checked_once_per_interval(self):
+        self.assertEqual(routers.replica_lag('default'), 0.0)
+        checked_at, _ = routers._lags['default']
+        routers.replica_lag('default')
+        self.assertEqual(routers._lags['default'][0], checked_at)
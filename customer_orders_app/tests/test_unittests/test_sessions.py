@@ -0,0 +1,80 @@
+import os
+import runpy
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+import customer_orders.settings
+from django.contrib.sessions.backends.cache import SessionStore as CacheStore
+from django.contrib.sessions.backends.db import SessionStore as DbStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+CACHE_ENGINE = 'django.contrib.sessions.backends.cache'
+CACHED_DB_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+class MigrateSessionsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.live = DbStore()
+        self.live['_auth_user_id'] = '1'
+        self.live.create()
+        expired = DbStore()
+        expired['_auth_user_id'] = '2'
+        expired.create()
+        Session.objects.filter(session_key=expired.session_key).update(
+            expire_date=timezone.now() - timedelta(minutes=1))
+
+    def migrate(self, *args):
+        out = StringIO()
+        call_command('migrate_sessions', *args, stdout=out)
+        return out.getvalue()
+
+    @override_settings(SESSION_ENGINE=CACHE_ENGINE)
+    def test_copies_live_sessions(self):
+        self.assertIn('Copied 1 sessions, deleted 0 rows', self.migrate())
+
+        store = CacheStore(self.live.session_key)
+        self.assertEqual(store['_auth_user_id'], '1')
+        self.assertEqual(Session.objects.count(), 2)
+
+    @override_settings(SESSION_ENGINE=CACHE_ENGINE)
+    def test_delete_copied_rows(self):
+        self.assertIn('deleted 1 rows', self.migrate('--delete'))
+        self.assertFalse(
+            Session.objects.filter(session_key=self.live.session_key).exists())
+        self.assertEqual(
+            CacheStore(self.live.session_key)['_auth_user_id'], '1')
+
+    @override_settings(SESSION_ENGINE=CACHED_DB_ENGINE)
+    def test_cached_db_rows_kept(self):
+        self.assertIn('Copied 1 sessions', self.migrate())
+        with self.assertRaises(CommandError):
+            self.migrate('--delete')
+
+    def test_db_engine_refused(self):
+        with self.assertRaises(CommandError):
+            self.migrate()
+
+
+class SessionBackendSettingTests(SimpleTestCase):
+
+    def load_settings(self, backend):
+        with patch.dict(os.environ, SESSION_BACKEND=backend):
+            return runpy.run_path(customer_orders.settings.__file__)
+
+    def test_known_backend(self):
+        self.assertIn(
+            self.load_settings('cache')['SESSION_ENGINE'],
+            customer_orders.settings.SESSION_ENGINES.values())
+
+    def test_unknown_backend_refused(self):
+        with self.assertRaisesMessage(
+                ImproperlyConfigured, 'one of db, cached_db, cache'):
+            self.load_settings('redis')
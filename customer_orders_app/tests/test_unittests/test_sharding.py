@@ -0,0 +1,222 @@
+from io import StringIO
+from unittest import skipUnless
+from uuid import uuid4
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from customer_orders_app import sharding
+from customer_orders_app.models import Customer, Order
+from customer_orders_app.sharding import (
+    HashRing, ScatterQuerySet, ShardRouter, get_order_or_404, shard_for)
+
+SHARDS = ['default', 'shard1', 'shard2']
+
+
+class HashRingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.keys = [str(uuid4()) for _ in range(2000)]
+
+    def test_spreads_keys(self):
+        ring = HashRing(SHARDS)
+        counts = {node: 0 for node in SHARDS}
+        for key in self.keys:
+            counts[ring.node_for(key)] += 1
+        for count in counts.values():
+            self.assertGreater(count, len(self.keys) / len(SHARDS) / 2)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        before, after = HashRing(SHARDS), HashRing(SHARDS + ['shard3'])
+        moved = [
+            key for key in self.keys
+            if before.node_for(key) != after.node_for(key)]
+        self.assertTrue(moved)
+        self.assertLess(len(moved), len(self.keys) / 2)
+        self.assertEqual({after.node_for(key) for key in moved}, {'shard3'})
+
+
+@override_settings(ORDER_SHARDS=SHARDS)
+class ShardRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ShardRouter()
+        self.customer = Customer(name='Jane', phone_number='+254700000001')
+        self.shard = shard_for(self.customer.id)
+
+    def test_routes_by_customer(self):
+        order = Order(customer=self.customer, item='Book', amount=10)
+        self.assertEqual(
+            self.router.db_for_write(Order, instance=order), self.shard)
+        self.assertEqual(
+            self.router.db_for_read(Order, instance=self.customer),
+            self.shard)
+
+    def test_instance_keeps_its_shard(self):
+        order = Order(customer=self.customer, item='Book', amount=10)
+        order._state.db = 'shard2'
+        self.assertEqual(
+            self.router.db_for_write(Order, instance=order), 'shard2')
+        order._state.db = 'replica1'
+        self.assertEqual(
+            self.router.db_for_write(Order, instance=order), self.shard)
+
+    def test_leaves_other_queries(self):
+        self.assertIsNone(self.router.db_for_read(Order))
+        self.assertIsNone(
+            self.router.db_for_write(Customer, instance=self.customer))
+        with override_settings(ORDER_SHARDS=['default']):
+            self.assertIsNone(
+                self.router.db_for_read(Order, instance=self.customer))
+
+    def test_migrates_only_the_app_on_shards(self):
+        self.assertTrue(
+            self.router.allow_migrate('shard1', 'customer_orders_app'))
+        self.assertFalse(self.router.allow_migrate('shard1', 'auth'))
+        self.assertIsNone(self.router.allow_migrate('default', 'auth'))
+
+
+@override_settings(ORDER_SHARDS=['default'])
+class ScatterQuerySetTests(TestCase):
+    """
+    Two disjoint querysets on default stand in for two shards.
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name='Jane', phone_number='+254700000001')
+        self.orders = [
+            Order.objects.create(
+                customer=self.customer, item='Book' if i % 2 else 'Pen',
+                amount=i)
+            for i in range(6)]
+        self.scatter = ScatterQuerySet([
+            Order.objects.filter(item='Book'),
+            Order.objects.filter(item='Pen')])
+
+    def test_merges_in_order(self):
+        self.assertEqual(list(self.scatter), self.orders)
+        self.assertEqual(
+            list(self.scatter.order_by('-created_at', '-id')),
+            self.orders[::-1])
+        self.assertEqual(self.scatter.count(), 6)
+
+    def test_slicing(self):
+        self.assertEqual(self.scatter[1:4], self.orders[1:4])
+        self.assertEqual(self.scatter[4], self.orders[4])
+        with self.assertRaises(IndexError):
+            self.scatter[6]
+
+    def test_filter_and_prefetch(self):
+        scatter = self.scatter.filter(amount__gte=3).prefetch_related(
+            'customer')
+        with self.assertNumQueries(3):
+            rows = list(scatter)
+            self.assertEqual(rows[0].customer, self.customer)
+        self.assertEqual(rows, self.orders[3:])
+
+    def test_mixed_directions(self):
+        with self.assertRaises(ValueError):
+            list(self.scatter.order_by('created_at', '-id'))
+
+
+@override_settings(ORDER_SHARDS=['default'])
+class UnshardedTests(TestCase):
+
+    def test_everything_stays_on_default(self):
+        customer = Customer.objects.create(
+            name='Jane', phone_number='+254700000001')
+        order = Order.objects.create(customer=customer, item='Book', amount=1)
+        self.assertEqual(shard_for(customer.id), 'default')
+        self.assertIsInstance(
+            sharding.scatter(Order.objects.all()), type(Order.objects.all()))
+        self.assertEqual(get_order_or_404(order.id), order)
+        with self.assertRaises(Http404):
+            get_order_or_404(uuid4())
+
+        out = StringIO()
+        call_command('rebalance_orders', stdout=out)
+        self.assertIn('Moved 0 orders', out.getvalue())
+
+
+@skipUnless(
+    len(settings.ORDER_SHARDS) > 1, 'Needs ORDER_SHARD_URLS to be set')
+class ShardedOrderTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(
+                name=f'Customer {i}', phone_number=f'+2547000000{i:02d}')
+            for i in range(20)]
+        for customer in self.customers:
+            Order.objects.create(customer=customer, item='Book', amount=10)
+        Order.objects.bulk_create([
+            Order(customer=customer, item='Pen', amount=2)
+            for customer in self.customers])
+
+    def stored(self):
+        return {
+            alias: list(Order.objects.using(alias).values_list(
+                'customer_id', flat=True))
+            for alias in settings.ORDER_SHARDS}
+
+    def test_orders_stored_on_their_customers_shard(self):
+        stored = self.stored()
+        self.assertEqual(sum(map(len, stored.values())), 40)
+        for alias, customer_ids in stored.items():
+            for customer_id in customer_ids:
+                self.assertEqual(shard_for(customer_id), alias)
+
+    def test_customer_orders(self):
+        customer = self.customers[0]
+        self.assertEqual(
+            sorted(order.item for order in customer.orders.all()),
+            ['Book', 'Pen'])
+
+    def test_order_list_and_lookup(self):
+        user = User.objects.create_user(username='testuser')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse('all_orders'))
+        self.assertEqual(response.status_code, 200)
+        rows = list(sharding.scatter(Order.objects.all()))
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(
+            rows, sorted(rows, key=lambda order: (order.created_at, order.id)))
+
+        order = rows[-1]
+        response = client.get(reverse('view_order'), {'order_id': order.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_order_or_404(order.id), order)
+
+    def test_deleting_a_customer_deletes_its_orders(self):
+        customer = self.customers[0]
+        alias = shard_for(customer.id)
+        customer.delete()
+        self.assertFalse(
+            Order.objects.using(alias).filter(customer_id=customer.id))
+
+    def test_rebalance(self):
+        with override_settings(ORDER_SHARDS=['default']):
+            for customer in self.customers:
+                Order.objects.create(customer=customer, item='Cup', amount=1)
+        misplaced = Order.objects.filter(item='Cup').exclude(
+            customer_id__in=[
+                customer.id for customer in self.customers
+                if shard_for(customer.id) == 'default']).count()
+
+        out = StringIO()
+        call_command('rebalance_orders', '--dry-run', stdout=out)
+        self.assertIn(f'Would move {misplaced} orders', out.getvalue())
+        call_command('rebalance_orders', '--batch-size', '3', stdout=out)
+        self.assertIn(f'Moved {misplaced} orders', out.getvalue())
+
+        stored = self.stored()
+        self.assertEqual(sum(map(len, stored.values())), 60)
+        for alias, customer_ids in stored.items():
+            for customer_id in customer_ids:
+                self.assertEqual(shard_for(customer_id), alias)
@@ -0,0 +1,187 @@
+import json
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from customer_orders_app import sms_batcher
+from customer_orders_app.sms_sender import SmsResult
+from .fakes import FakeRedis
+
+
+def notification(order_id, to, message='Order for pen at Kshs 10 Created'):
+    return {'order_id': order_id, 'dedupe_key': f'order-created:{order_id}',
+            'to': to, 'message': message}
+
+
+def accepted(to: str, message: str) -> SmsResult:
+    return SmsResult(ok=True, status_code=201, attempts=1, recipients=[
+        {'number': number, 'status': 'Success', 'statusCode': 101,
+         'messageId': f'ATXid_{number}'}
+        for number in to.split(',')])
+
+
+@override_settings(
+    SMS_BATCH_WINDOW=2, SMS_BATCH_SIZE=3, SMS_BATCH_MAX_RECIPIENTS=2)
+class SmsBatcherTests(TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch(
+            'customer_orders_app.sms_batcher.django_rq.get_connection',
+            return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the token bucket is a Lua script, which FakeRedis cannot run
+        patcher = patch(
+            'customer_orders_app.sms_guard.take_tokens',
+            return_value=(True, 0.0, 10.0))
+        self.take_tokens = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch(
+            'customer_orders_app.sms_batcher.django_rq.get_queue')
+        self.queue = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_first_notification_schedules_flush(self):
+        sms_batcher.add([notification('1', '+254700000001')])
+        sms_batcher.add([notification('2', '+254700000002')])
+
+        self.queue.enqueue_in.assert_called_once()
+        delay, job = self.queue.enqueue_in.call_args.args
+        self.assertEqual(delay.total_seconds(), 2)
+        self.assertIs(job, sms_batcher.flush)
+        self.queue.enqueue.assert_not_called()
+
+    def test_full_batch_flushes_at_once(self):
+        waiting = sms_batcher.add([
+            notification(str(i), f'+25470000000{i}') for i in range(4)])
+
+        self.assertEqual(waiting, 4)
+        self.queue.enqueue.assert_called_once_with(sms_batcher.flush)
+
+    def test_group_identical_messages(self):
+        groups = list(sms_batcher.group([
+            notification('1', '+254700000001'),
+            notification('2', '+254700000002'),
+            notification('3', '+254700000001'),
+            notification('4', '+254700000003'),
+            notification('5', '+254700000001', 'Other message'),
+        ], max_recipients=2))
+
+        self.assertEqual(
+            [(message, [n['order_id'] for n in recipients.values()])
+             for message, recipients in groups],
+            [('Order for pen at Kshs 10 Created', ['1', '2']),
+             ('Order for pen at Kshs 10 Created', ['3', '4']),
+             ('Other message', ['5'])])
+
+    @patch('customer_orders_app.sms_batcher.post_message',
+           side_effect=accepted)
+    def test_flush_sends_one_request_per_group(self, mock_post):
+        sms_batcher.add([
+            notification('1', '+254700000001'),
+            notification('2', '+254700000002'),
+            notification('3', '+254700000003', 'Other message')])
+        sms_batcher.add([notification('4', '+254700000004')])
+
+        statuses = sms_batcher.flush()
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(
+            mock_post.call_args_list[0].args,
+            ('+254700000001,+254700000002',
+             'Order for pen at Kshs 10 Created'))
+        self.assertEqual(set(statuses), {'1', '2', '3', '4'})
+        self.assertEqual(statuses['2'], {
+            'ok': True, 'status': 'Success',
+            'message_id': 'ATXid_+254700000002'})
+        self.assertEqual(self.redis.lists[sms_batcher.PENDING_KEY], [])
+        self.assertNotIn(sms_batcher.FLUSH_KEY, self.redis.strings)
+        self.assertEqual(
+            self.redis.get('sms:dedupe:order-created:1'), b'sent')
+
+    @patch('customer_orders_app.sms_batcher.post_message',
+           side_effect=accepted)
+    def test_flush_skips_notifications_sent_before(self, mock_post):
+        self.redis.set('sms:dedupe:order-created:1', b'sent')
+        sms_batcher.add([
+            notification('1', '+254700000001'),
+            notification('2', '+254700000002')])
+
+        statuses = sms_batcher.flush()
+
+        mock_post.assert_called_once_with(
+            '+254700000002', 'Order for pen at Kshs 10 Created')
+        self.assertEqual(set(statuses), {'2'})
+
+    @patch('customer_orders_app.sms_guard.reschedule')
+    @patch('customer_orders_app.sms_batcher.post_message',
+           side_effect=accepted)
+    def test_flush_put_off_while_limited(self, mock_post, mock_reschedule):
+        self.take_tokens.side_effect = [
+            (True, 0.0, 0.0), (False, 30.0, 0.0)]
+        sms_batcher.add([
+            notification('1', '+254700000001'),
+            notification('2', '+254700000002', 'Other message'),
+            notification('3', '+254700000003', 'Third message')])
+
+        statuses = sms_batcher.flush()
+
+        self.assertEqual(set(statuses), {'1'})
+        mock_reschedule.assert_called_once_with(sms_batcher.flush, 30.0)
+        pending = [
+            json.loads(raw)['order_id']
+            for raw in self.redis.lists[sms_batcher.PENDING_KEY]]
+        self.assertEqual(pending, ['2', '3'])
+        self.assertIsNone(self.redis.get('sms:dedupe:order-created:2'))
+
+    @patch('customer_orders_app.sms_guard.reschedule')
+    @patch('customer_orders_app.sms_batcher.post_message')
+    def test_flush_put_off_when_asked_to_retry(
+            self, mock_post, mock_reschedule):
+        mock_post.return_value = SmsResult(
+            ok=False, status_code=503, error='HTTP 503', retry=True)
+        sms_batcher.add([
+            notification('1', '+254700000001'),
+            notification('2', '+254700000002', 'Other message')])
+
+        self.assertEqual(sms_batcher.flush(), {})
+
+        mock_post.assert_called_once()
+        self.assertIs(mock_reschedule.call_args.args[0], sms_batcher.flush)
+        pending = [
+            json.loads(raw)
+            for raw in self.redis.lists[sms_batcher.PENDING_KEY]]
+        self.assertEqual(
+            [(n['order_id'], n.get('attempt')) for n in pending],
+            [('1', 2), ('2', None)])
+
+    @patch('customer_orders_app.sms_batcher.post_message')
+    def test_per_recipient_status(self, mock_post):
+        mock_post.return_value = SmsResult(
+            ok=False, status_code=201, recipients=[
+                {'number': '+254700000001', 'status': 'Success',
+                 'statusCode': 101, 'messageId': 'ATXid_1'},
+                {'number': '+254700000002', 'status': 'InvalidPhoneNumber',
+                 'statusCode': 403}])
+
+        with self.assertLogs('customer_orders_app.sms_batcher', 'WARNING'):
+            statuses = sms_batcher.send_batch([
+                notification('1', '+254700000001'),
+                notification('2', '+254700000002')])
+
+        self.assertTrue(statuses['1']['ok'])
+        self.assertEqual(statuses['2'], {
+            'ok': False, 'status': 'InvalidPhoneNumber', 'message_id': None})
+
+    @patch('customer_orders_app.sms_batcher.post_message')
+    def test_failed_request_fails_every_recipient(self, mock_post):
+        mock_post.return_value = SmsResult(
+            ok=False, status_code=503, error='HTTP 503')
+
+        with self.assertLogs('customer_orders_app.sms_batcher', 'WARNING'):
+            statuses = sms_batcher.send_batch([
+                notification('1', '+254700000001'),
+                notification('2', '+254700000002')])
+
+        self.assertEqual(
+            [status['status'] for status in statuses.values()],
+            ['HTTP 503', 'HTTP 503'])
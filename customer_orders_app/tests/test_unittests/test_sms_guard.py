@@ -0,0 +1,102 @@
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch
+from customer_orders_app import sms_guard
+from customer_orders_app.sms_sender import SmsResult
+from .fakes import FakeRedis
+
+FAILED = SmsResult(ok=False, status_code=503, error='HTTP 503')
+SENT = SmsResult(ok=True, status_code=201)
+
+
+@override_settings(
+    SMS_BREAKER_THRESHOLD=3, SMS_BREAKER_COOLDOWN=30,
+    SMS_RATE_LIMIT=10, SMS_RATE_BURST=20, SMS_RATE_MAX_WAIT=1)
+class SmsGuardTests(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch(
+            'customer_orders_app.sms_guard.django_rq.get_connection',
+            return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the token bucket is a Lua script, which FakeRedis cannot run
+        patcher = patch(
+            'customer_orders_app.sms_guard.take_tokens',
+            return_value=(True, 0.0, 10.0))
+        self.take_tokens = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_closed_by_default(self):
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.CLOSED)
+        self.assertIsNone(sms_guard.wait_to_send())
+
+    def test_opens_after_threshold(self):
+        for _ in range(2):
+            sms_guard.record(FAILED)
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.CLOSED)
+        sms_guard.record(FAILED)
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.OPEN)
+        self.assertEqual(sms_guard.wait_to_send(), 1.0)
+        self.take_tokens.assert_not_called()
+
+    def test_success_resets_failures(self):
+        for _ in range(2):
+            sms_guard.record(FAILED)
+        sms_guard.record(SENT)
+        sms_guard.record(FAILED)
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.CLOSED)
+
+    def test_client_errors_do_not_count(self):
+        for _ in range(3):
+            sms_guard.record(SmsResult(ok=False, status_code=401))
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.CLOSED)
+
+    def test_half_open_allows_one_trial(self):
+        for _ in range(3):
+            sms_guard.record(FAILED)
+        # the cooldown passes
+        self.redis.delete(sms_guard.OPEN_KEY)
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.HALF_OPEN)
+
+        self.assertIsNone(sms_guard.wait_to_send())
+        self.assertEqual(sms_guard.wait_to_send(), 30.0)
+
+        sms_guard.record(SENT)
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.CLOSED)
+        self.assertIsNone(sms_guard.wait_to_send())
+
+    def test_failed_trial_reopens(self):
+        for _ in range(3):
+            sms_guard.record(FAILED)
+        self.redis.delete(sms_guard.OPEN_KEY)
+        sms_guard.wait_to_send()
+        sms_guard.record(FAILED)
+        self.assertEqual(sms_guard.breaker_state(), sms_guard.OPEN)
+
+    @patch('customer_orders_app.sms_guard.time.sleep')
+    def test_short_token_waits_are_slept(self, mock_sleep):
+        self.take_tokens.side_effect = [
+            (False, 0.25, 0.0), (True, 0.0, 0.0)]
+        self.assertIsNone(sms_guard.wait_to_send())
+        mock_sleep.assert_called_once_with(0.25)
+
+    @patch('customer_orders_app.sms_guard.time.sleep')
+    def test_long_token_waits_are_returned(self, mock_sleep):
+        self.take_tokens.return_value = (False, 5.0, 0.0)
+        self.assertEqual(sms_guard.wait_to_send(), 5.0)
+        mock_sleep.assert_not_called()
+
+    @patch('customer_orders_app.sms_guard.django_rq.get_queue')
+    def test_reschedule_is_jittered(self, mock_get_queue):
+        sms_guard.reschedule(print, 10, 'a')
+        delay, func, arg = mock_get_queue.return_value.enqueue_in.call_args.args
+        self.assertTrue(10 <= delay.total_seconds() <= 12)
+        self.assertEqual((func, arg), (print, 'a'))
+
+    def test_status(self):
+        sms_guard.record(FAILED)
+        self.assertEqual(sms_guard.status(), {
+            'breaker': 'closed', 'recent_failures': 1, 'tokens': 10.0,
+            'rate_limit': 10, 'burst': 20})
+        self.take_tokens.assert_called_with(0)
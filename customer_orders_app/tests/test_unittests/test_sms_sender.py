@@ -1,36 +1,165 @@
 import unittest
-from customer_orders_app.sms_sender import send_sms
+from customer_orders_app import sms_sender
+from customer_orders_app.sms_sender import send_sms, get_session, backoff
 from unittest.mock import patch, Mock
 import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
 
 
+def refused():
+    reason = NewConnectionError(None, 'Connection refused')
+    return requests.ConnectionError(
+        MaxRetryError(None, sms_sender.GATEWAY_URL, reason))
+
+
+def gateway_response(status_code=201, status_codes=(101,)):
+    response = Mock()
+    response.status_code = status_code
+    response.ok = status_code < 400
+    response.json.return_value = {'SMSMessageData': {
+        'Message': 'Sent to 1/1',
+        'Recipients': [
+            {'number': '+254701036054', 'statusCode': code,
+             'status': 'Success' if code == 101 else 'InvalidPhoneNumber',
+             'messageId': f'ATXid_{i}'}
+            for i, code in enumerate(status_codes)]}}
+    return response
+
+
+@patch('customer_orders_app.sms_sender.time.sleep')
+@patch('customer_orders_app.sms_sender.get_session')
 class SendSmsTests(unittest.TestCase):
 
-    @patch('customer_orders_app.sms_sender.requests.post')
-    def test_send_sms_success(self, mock_post):
+    def test_send_sms_success(self, mock_session, mock_sleep):
         """
         Test sending SMS successfully.
         """
-        mock_response = Mock()
-        mock_response.json.return_value = {'status': 'success'}
-        mock_post.return_value = mock_response
+        mock_post = mock_session.return_value.post
+        mock_post.return_value = gateway_response()
 
         with patch(
             'customer_orders_app.sms_sender.os.getenv',
                 return_value='fake_api_key'):
-            send_sms('+254701036054', {'item': 'food', 'amount': 11})
+            result = send_sms('+254701036054', {'item': 'food', 'amount': 11})
 
         mock_post.assert_called_once_with(
-            'https://api.sandbox.africastalking.com/version1/messaging',
-            headers={
-                'Accept': 'application/json',
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'apiKey': 'fake_api_key'
-            },
+            sms_sender.GATEWAY_URL,
+            headers={'apiKey': 'fake_api_key'},
             data={
                 'username': 'sandbox',
                 'to': '+254701036054',
                 'message': 'Order for food at Kshs 11 Created',
                 'from': '44121'
-            }
+            },
+            timeout=(sms_sender.CONNECT_TIMEOUT, sms_sender.READ_TIMEOUT)
         )
+        self.assertTrue(result.ok)
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(result.recipients[0]['messageId'], 'ATXid_0')
+        mock_sleep.assert_not_called()
+
+    def test_transient_status_left_to_the_caller(
+            self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.side_effect = [gateway_response(503), gateway_response()]
+
+        with self.assertLogs('customer_orders_app.sms_sender', 'WARNING'):
+            result = send_sms(
+                '+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertFalse(result.ok)
+        self.assertTrue(result.retry)
+        self.assertEqual(result.attempts, 1)
+        mock_sleep.assert_not_called()
+
+    def test_retries_connection_errors(self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.side_effect = [
+            requests.ConnectTimeout('slow'), gateway_response()]
+
+        result = send_sms('+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+
+    def test_gives_up_after_max_retries(self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.side_effect = refused()
+
+        with self.assertLogs('customer_orders_app.sms_sender', 'WARNING'):
+            result = send_sms(
+                '+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertFalse(result.ok)
+        self.assertTrue(result.retry)
+        self.assertEqual(result.attempts, sms_sender.MAX_RETRIES + 1)
+        self.assertEqual(mock_sleep.call_count, sms_sender.MAX_RETRIES)
+        self.assertIn('refused', result.error)
+
+    def test_dropped_connection_not_retried(self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.side_effect = requests.ConnectionError('Connection reset')
+
+        with self.assertLogs('customer_orders_app.sms_sender', 'WARNING'):
+            result = send_sms(
+                '+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertFalse(result.retry)
+        self.assertEqual(result.attempts, 1)
+        mock_sleep.assert_not_called()
+
+    def test_read_timeout_not_retried(self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.side_effect = requests.ReadTimeout('no answer')
+
+        with self.assertLogs('customer_orders_app.sms_sender', 'WARNING'):
+            result = send_sms(
+                '+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.attempts, 1)
+        mock_sleep.assert_not_called()
+
+    def test_client_error_not_retried(self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.return_value = gateway_response(401)
+
+        with self.assertLogs('customer_orders_app.sms_sender', 'WARNING'):
+            result = send_sms(
+                '+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.status_code, 401)
+        self.assertEqual(result.attempts, 1)
+
+    def test_rejected_recipient(self, mock_session, mock_sleep):
+        mock_post = mock_session.return_value.post
+        mock_post.return_value = gateway_response(201, status_codes=(403,))
+
+        with self.assertLogs('customer_orders_app.sms_sender', 'WARNING'):
+            result = send_sms(
+                '+254701036054', {'item': 'food', 'amount': 11})
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.recipients[0]['statusCode'], 403)
+
+
+class SessionTests(unittest.TestCase):
+
+    def test_session_reused(self):
+        self.assertIs(get_session(), get_session())
+
+    def test_new_session_after_fork(self):
+        session = get_session()
+        with patch('customer_orders_app.sms_sender.os.getpid',
+                   return_value=-1):
+            self.assertIsNot(get_session(), session)
+
+    def test_backoff_is_jittered_and_capped(self):
+        for attempt in range(1, 10):
+            cap = min(sms_sender.BACKOFF_MAX,
+                      sms_sender.BACKOFF_BASE * 2 ** attempt)
+            delays = {backoff(attempt) for _ in range(20)}
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+            self.assertGreater(len(delays), 1)
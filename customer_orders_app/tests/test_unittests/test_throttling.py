@@ -0,0 +1,131 @@
+from django.core.cache import cache
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from unittest.mock import Mock, patch
+from django.test import SimpleTestCase, override_settings
+from customer_orders_app import throttling
+from customer_orders_app.redis_client import get_client
+from customer_orders_app.throttling import (
+    SlidingWindowThrottle, take_in_cache)
+from customer_orders_app.models import Customer
+from django.contrib.auth.models import User
+
+
+class SlidingWindowThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        throttling._redis_down_until = 0.0
+        patcher = patch(
+            'customer_orders_app.throttling.get_client', return_value=Mock())
+        self.get_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(
+            name="John Doe", phone_number="+254703045843")
+
+    @patch('customer_orders_app.throttling.take')
+    def test_one_call_per_request(self, mock_take):
+        mock_take.return_value = (True, 0.0)
+        self.client.get(reverse('all_orders'))
+
+        mock_take.assert_called_once_with([
+            (f'throttle:user:{self.user.pk}', 500, 3600),
+            (f'throttle:order-reads:{self.user.pk}', 300, 60),
+        ])
+
+    @patch('customer_orders_app.throttling.take')
+    def test_anonymous_requests_counted_once(self, mock_take):
+        class View:
+            throttle_scopes = {'POST': 'order-writes'}
+
+        mock_take.return_value = (True, 0.0)
+        request = Request(APIRequestFactory().post('/'))
+        self.assertTrue(SlidingWindowThrottle().allow_request(request, View()))
+        mock_take.assert_called_once_with([
+            ('throttle:anon:127.0.0.1', 100, 3600),
+            ('throttle:order-writes:127.0.0.1', 60, 60),
+        ])
+
+    @patch('customer_orders_app.throttling.take')
+    def test_throttled_with_retry_after(self, mock_take):
+        mock_take.return_value = (False, 12.3)
+
+        response = self.client.post(
+            reverse('add-order'),
+            {'customer_id': str(self.customer.id), 'item': 'pen',
+             'amount': 10},
+            format='json')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '13')
+
+    @patch('customer_orders_app.throttling.take')
+    def test_methods_without_scope(self, mock_take):
+        class View:
+            throttle_scopes = {'POST': 'order-writes'}
+
+        mock_take.return_value = (True, 0.0)
+        request = Request(APIRequestFactory().get('/'))
+        self.assertTrue(SlidingWindowThrottle().allow_request(request, View()))
+        mock_take.assert_called_once_with(
+            [('throttle:anon:127.0.0.1', 100, 3600)])
+
+    @patch('customer_orders_app.throttling.take')
+    def test_without_redis_url(self, mock_take):
+        self.get_client.return_value = None
+
+        response = self.client.get(reverse('all_orders'))
+
+        self.assertEqual(response.status_code, 200)
+        mock_take.assert_not_called()
+        self.assertEqual(
+            len(cache.get(f'throttle:user:{self.user.pk}')), 1)
+        self.assertEqual(
+            len(cache.get(f'throttle:order-reads:{self.user.pk}')), 1)
+
+    @patch('customer_orders_app.throttling.take')
+    def test_falls_back_to_the_cache(self, mock_take):
+        mock_take.side_effect = RedisConnectionError('down')
+
+        for _ in range(2):
+            response = self.client.get(reverse('all_orders'))
+            self.assertEqual(response.status_code, 200)
+
+        # Redis is left alone after the first failure
+        self.assertEqual(mock_take.call_count, 1)
+        self.assertEqual(
+            len(cache.get(f'throttle:user:{self.user.pk}')), 2)
+
+    def test_cache_admits_only_if_every_window_has_room(self):
+        windows = [('throttle:a', 2, 60), ('throttle:b', 1, 30)]
+        self.assertEqual(take_in_cache(windows), (True, 0.0))
+
+        admitted, wait = take_in_cache(windows)
+        self.assertFalse(admitted)
+        self.assertTrue(0 < wait <= 30)
+        self.assertEqual(len(cache.get('throttle:a')), 1)
+
+
+class RedisClientTests(SimpleTestCase):
+
+    def setUp(self):
+        get_client.cache_clear()
+        self.addCleanup(get_client.cache_clear)
+
+    @override_settings(REDIS_URL=None)
+    def test_none_without_redis_url(self):
+        self.assertIsNone(get_client())
+
+    @override_settings(
+        REDIS_URL='redis://localhost:6390/0', REDIS_REQUEST_TIMEOUT=0.1)
+    def test_short_timeouts(self):
+        client = get_client()
+        self.assertIs(get_client(), client)
+        options = client.connection_pool.connection_kwargs
+        self.assertEqual(options['socket_connect_timeout'], 0.1)
+        self.assertEqual(options['socket_timeout'], 0.1)
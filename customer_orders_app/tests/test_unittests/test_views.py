@@ -1,9 +1,11 @@
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
-from customer_orders_app.models import Customer, Order
-from customer_orders_app.sms_sender import send_sms
+from customer_orders_app.models import Customer, Order, OrderNotification
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from unittest.mock import patch
 
 
@@ -601,8 +603,8 @@ class OrderCreateViewTests(APITestCase):
 
         self.url = reverse('add-order')
 
-    @patch('customer_orders_app.views.django_rq.enqueue')
-    def test_create_order_success(self, mock_enqueue):
+    @patch('customer_orders_app.notifications.django_rq')
+    def test_create_order_success(self, mock_django_rq):
         """
         Ensure the endpoint creates a new order successfully with valid data.
         """
@@ -618,8 +620,12 @@ class OrderCreateViewTests(APITestCase):
         self.assertEqual(response.data['amount'], '1212.00')
         self.assertEqual(response.data['customer']['id'], data['customer_id'])
 
-        mock_enqueue.assert_called_once_with(
-            send_sms, '+254703045843', {'item': 'phone', 'amount': 1212})
+        [notification] = OrderNotification.objects.all()
+        self.assertEqual(str(notification.order_id), response.data['id'])
+        self.assertEqual(notification.to, '+254703045843')
+        self.assertEqual(notification.status, OrderNotification.PENDING)
+        # the request path leaves Redis to the relay
+        self.assertFalse(mock_django_rq.mock_calls)
 
     def test_create_order_invalid_customer(self):
         """
@@ -776,3 +782,188 @@ class OrderUpdateViewTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['item'], 'phone')
         self.assertEqual(float(response.data['amount']), 1212.00)
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Guards the order read paths against N+1 queries: every endpoint must
+    stay within a fixed number of queries however many orders it returns.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.customers = [
+            Customer.objects.create(
+                name=f"Customer {i}", phone_number=f"+25470304584{i}")
+            for i in range(5)
+        ]
+        self.orders = [
+            Order.objects.create(
+                item=f"item_{i}", amount=10 * i, customer=customer)
+            for i, customer in enumerate(self.customers * 2)
+        ]
+
+    def assertQueryBudget(self, budget, method, *args, **kwargs):
+        """
+        Calls the client method and fails if it issues more than
+        budget queries. Savepoints are not counted: outside of a test
+        they are the BEGIN and COMMIT of the view's transaction.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = method(*args, **kwargs)
+        statements = [
+            query['sql'] for query in queries.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertLessEqual(
+            len(statements), budget, '\n'.join(statements))
+        return response
+
+    def test_order_list_budget(self):
+        response = self.assertQueryBudget(
+            2, self.client.get, reverse('all_orders'))
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_order_list_cursor_budget(self):
+        response = self.assertQueryBudget(
+            1, self.client.get, reverse('all_orders'),
+            {'pagination': 'cursor'})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_view_order_by_order_id_budget(self):
+        self.assertQueryBudget(
+            1, self.client.get, reverse('view_order'),
+            {'order_id': self.orders[0].id})
+
+    def test_view_order_by_customer_id_budget(self):
+        response = self.assertQueryBudget(
+            2, self.client.get, reverse('view_order'),
+            {'customer_id': self.customers[0].id})
+        self.assertEqual(len(response.data), 2)
+
+    def test_view_customer_budget(self):
+        self.assertQueryBudget(
+            2, self.client.get,
+            reverse('view_customer_info', args=[self.customers[0].id]))
+
+    def test_add_order_budget(self):
+        data = {
+            'customer_id': str(self.customers[0].id),
+            'item': 'phone',
+            'amount': 1212
+        }
+        # customer, order, customer aggregates and outbox row
+        response = self.assertQueryBudget(
+            4, self.client.post, reverse('add-order'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_order_budget(self):
+        self.assertQueryBudget(
+            2, self.client.put,
+            reverse('update-order', args=[self.orders[0].id]),
+            {'item': 'Laptop'}, format='json')
+
+
+class BulkOrderCreateViewTests(APITestCase):
+    def setUp(self):
+        """
+        Create sample customers for testing.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.customer1 = Customer.objects.create(
+            name="John Doe",
+            phone_number="+254703045843"
+        )
+        self.customer2 = Customer.objects.create(
+            name="Jane Doe",
+            phone_number="+254703045844"
+        )
+        self.url = reverse('bulk-add-orders')
+
+    def test_create_orders_success(self):
+        """
+        Ensure all orders and their notifications are written with one
+        INSERT each.
+        """
+        data = [
+            {'customer_id': str(self.customer1.id), 'item': 'phone',
+             'amount': 1212},
+            {'customer_id': str(self.customer2.id), 'item': 'bike',
+             'amount': '99.50'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(
+            response.data['created'][1]['customer']['id'],
+            str(self.customer2.id))
+        self.assertEqual(Order.objects.count(), 2)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+
+        self.assertEqual(
+            sorted(OrderNotification.objects.values_list(
+                'order_id', flat=True)),
+            sorted(Order.objects.values_list('id', flat=True)))
+
+    def test_per_item_errors(self):
+        """
+        Ensure invalid items are reported by index and the rest created.
+        """
+        data = [
+            {'customer_id': str(self.customer1.id), 'item': 'phone',
+             'amount': 1212},
+            {'customer_id': str(self.customer1.id), 'item': 'phone',
+             'amount': 'invalid'},
+            {'customer_id': 'd177ccaf-6c98-4d1c-b625-6fbaf4ae62c3',
+             'item': 'phone', 'amount': 1},
+            {'item': 'phone', 'amount': 1},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 1)
+        self.assertEqual(
+            [error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertIn('amount', response.data['errors'][0]['errors'])
+        self.assertIn('customer_id', response.data['errors'][1]['errors'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_all_invalid(self):
+        data = [{'customer_id': 'String', 'item': '', 'amount': 1}]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], [])
+        self.assertFalse(OrderNotification.objects.exists())
+
+    def test_not_a_list(self):
+        response = self.client.post(
+            self.url, {'item': 'phone'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BULK_ORDER_MAX_ITEMS=2)
+    def test_too_many_orders(self):
+        data = [{'customer_id': str(self.customer1.id), 'item': 'phone',
+                 'amount': 1}] * 3
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+
+    @patch('customer_orders_app.notifications.OrderNotification.objects'
+           '.bulk_create')
+    def test_orders_rolled_back_with_notifications(self, mock_bulk_create):
+        mock_bulk_create.side_effect = ValueError('outbox unavailable')
+        data = [{'customer_id': str(self.customer1.id), 'item': 'phone',
+                 'amount': 1}]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
@@ -0,0 +1,206 @@
+'''
+A throttle that shares its counters across every API process.
+
+DRF's rate throttles keep request histories in the default cache, which
+is per-process memory unless REDIS_URL is set, so each worker enforces
+the full rate on its own. SlidingWindowThrottle keeps a sliding window
+log per client in Redis sorted sets instead. It is the only throttle
+class, and applies every limit of a request at once: the anon rate per
+IP address for anonymous requests or the user rate per user, and the
+rate of the scope the view names for the request method. One script
+call per request drops the entries older than each window and admits
+the request only if every window has room, logging it in all of them. A
+throttled response carries a Retry-After header with the seconds until
+every window has room again.
+
+Redis is reached through the client of redis_client, which gives up
+after REDIS_REQUEST_TIMEOUT seconds. Without REDIS_URL the throttle
+keeps the same windows in the default cache. If Redis cannot be reached,
+it falls back to the cache too and leaves Redis alone for
+THROTTLE_REDIS_RETRY seconds.
+'''
+import logging
+import time
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from redis.exceptions import RedisError
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+from .redis_client import get_client
+
+logger = logging.getLogger(__name__)
+
+KEY_FORMAT = 'throttle:%(scope)s:%(ident)s'
+# seconds per unit of a rate, by the unit's first letter, as in DRF
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Checks the windows of KEYS, with the limit and length in milliseconds
+# of each in ARGV, by the Redis clock. Logs the request in all of them
+# only if each has room. Returns whether it was admitted and the
+# milliseconds until every full window has room again.
+SLIDING_WINDOWS = '''
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local wait = 0
+local full = false
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2 - 1])
+    local window = tonumber(ARGV[i * 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        full = true
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        local until_free = window
+        if oldest[2] then
+            until_free = tonumber(oldest[2]) + window - now
+        end
+        wait = math.max(wait, until_free)
+    end
+end
+if full then
+    return {0, wait}
+end
+local member = ARGV[#KEYS * 2 + 1]
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, ARGV[i * 2])
+end
+return {1, 0}
+'''
+
+_redis_down_until = 0.0
+
+
+@lru_cache(maxsize=None)
+def _script():
+    return get_client().register_script(SLIDING_WINDOWS)
+
+
+def parse_rate(rate: str) -> tuple:
+    """
+    Parses a rate such as '100/hour' into the number of requests and
+    the length of the window in seconds.
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def take(windows: list) -> tuple:
+    """
+    Logs a request in sliding windows in Redis if every one of them is
+    under its limit.
+
+    Args:
+        windows: (Redis key, most requests allowed, length in seconds)
+            of each window.
+
+    Returns:
+        A tuple of whether the request was admitted and the seconds
+        until every window has room again.
+    """
+    args = []
+    for _, limit, window in windows:
+        args += [limit, window * 1000]
+    admitted, wait = _script()(
+        keys=[key for key, _, _ in windows],
+        args=args + [uuid.uuid4().hex])
+    return bool(admitted), wait / 1000
+
+
+def take_in_cache(windows: list) -> tuple:
+    """
+    Does what take does with request histories in the default cache, as
+    DRF's rate throttles keep them: lists of request times, newest
+    first. Reading and writing them is not atomic, so concurrent
+    requests may each be admitted past a limit.
+    """
+    now = time.time()
+    histories = cache.get_many([key for key, _, _ in windows])
+    wait = 0.0
+    for key, limit, window in windows:
+        history = [
+            moment for moment in histories.get(key, [])
+            if moment > now - window]
+        histories[key] = history
+        if len(history) >= limit:
+            until_free = history[-1] + window - now if history else window
+            wait = max(wait, until_free)
+    if wait:
+        return False, wait
+    for key, _, window in windows:
+        cache.set(key, [now] + histories[key], window)
+    return True, 0.0
+
+
+class SlidingWindowThrottle(throttling.BaseThrottle):
+    """
+    Limits requests by every rate that applies to them, in one sliding
+    window check.
+
+    Anonymous requests are limited per IP address at the anon rate and
+    authenticated ones per user at the user rate. A view can add a rate
+    per request method with throttle_scopes, for example
+    {'POST': 'order-writes'}, counted per user, or per IP address when
+    anonymous. Rates missing from DEFAULT_THROTTLE_RATES, or set to
+    None, do not limit requests.
+    """
+
+    @property
+    def rates(self) -> dict:
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def get_windows(self, request, view) -> list:
+        """
+        Returns (key, most requests allowed, length in seconds) of each
+        window the request is counted in.
+        """
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+            scopes = ['user']
+        else:
+            ident = self.get_ident(request)
+            scopes = ['anon']
+        scope = getattr(view, 'throttle_scopes', {}).get(request.method)
+        if scope:
+            if scope not in self.rates:
+                raise ImproperlyConfigured(
+                    f"No default throttle rate set for '{scope}' scope")
+            scopes.append(scope)
+
+        windows = []
+        for scope in scopes:
+            rate = self.rates.get(scope)
+            if rate is not None:
+                key = KEY_FORMAT % {'scope': scope, 'ident': ident}
+                windows.append((key, *parse_rate(rate)))
+        return windows
+
+    def allow_request(self, request, view) -> bool:
+        global _redis_down_until
+
+        self.retry_after = None
+        windows = self.get_windows(request, view)
+        if not windows:
+            return True
+
+        if (get_client() is not None
+                and time.monotonic() >= _redis_down_until):
+            try:
+                admitted, self.retry_after = take(windows)
+                return admitted
+            except RedisError as error:
+                logger.warning(
+                    'Throttling in the cache, Redis is unavailable: %s',
+                    error)
+                _redis_down_until = (
+                    time.monotonic() + settings.THROTTLE_REDIS_RETRY)
+        admitted, self.retry_after = take_in_cache(windows)
+        return admitted
+
+    def wait(self):
+        return self.retry_after
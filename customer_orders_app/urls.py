@@ -4,8 +4,10 @@ Module defines routes for Customer and Order Views
 from django.urls import path
 from .views import (
     CustomerView, OrderView,
-    CustomerListView, OrderListView, 
-    ObtainToken)
+    CustomerListView, OrderListView,
+    ObtainToken, MetricsView, BulkOrderView,
+    CustomerImportView, OrderExportView, RevokeJwtView)
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
 
@@ -16,6 +18,10 @@ urlpatterns = [
         CustomerView.as_view(),
         name='view_customer_info'),
     path('add-customer/', CustomerView.as_view(), name='add-customer'),
+    path(
+        'import-customers/',
+        CustomerImportView.as_view(),
+        name='import-customers'),
     path(
         'update-customer/<str:customer_id>',
         CustomerView.as_view(),
@@ -28,11 +34,21 @@ urlpatterns = [
     # paths to CRUD operations for order
     path('get-orders/', OrderListView.as_view(), name='all_orders'),
     path('view-order/', OrderView.as_view(), name='view_order'),
+    path('export-orders/', OrderExportView.as_view(), name='export-orders'),
     path('add-order/', OrderView.as_view(), name='add-order'),
+    path(
+        'bulk-add-orders/',
+        BulkOrderView.as_view(),
+        name='bulk-add-orders'),
     path(
         'update-order/<str:order_id>',
         OrderView.as_view(),
         name='update-order'),
 
     path('token/', ObtainToken.as_view(), name='token_obtain_pair'),
+    path('token/jwt/', TokenObtainPairView.as_view(), name='jwt-obtain'),
+    path(
+        'token/jwt/refresh/', TokenRefreshView.as_view(), name='jwt-refresh'),
+    path('token/jwt/revoke/', RevokeJwtView.as_view(), name='jwt-revoke'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -5,18 +5,53 @@ order classes
 from .models import Customer, Order
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.http import HttpRequest
-from .serialisers import CustomerSerialiser, OrderSerialiser
+from django.http import HttpRequest, StreamingHttpResponse
+from .serialisers import (
+    AGGREGATE_FIELDS,
+    CustomerSerialiser,
+    OrderSerialiser,
+    BulkOrderItemSerialiser,
+    include_aggregates)
 from django.shortcuts import get_object_or_404
 from .decorator import handle_exceptions
+from .pagination import ListPagination
+from .caching import (
+    invalidate_customer,
+    customer_version,
+    get_customer_detail,
+    set_customer_detail,
+    customer_detail_stats)
+from .conditional import (
+    ConditionalListMixin,
+    customer_validators,
+    make_etag,
+    not_modified,
+    set_validators)
+from .routers import primary_if_recent
+from . import aggregates, sharding
+from .sharding import get_order_or_404
 from rest_framework.generics import ListAPIView
-from rest_framework.authentication import (
-    SessionAuthentication,
-    TokenAuthentication)
+from rest_framework.authentication import SessionAuthentication
+from rest_framework_simplejwt.authentication import (
+    JWTStatelessUserAuthentication)
+from rest_framework_simplejwt.exceptions import TokenError
+from .authentication import CachedTokenAuthentication
+from .jwt_auth import AccessToken, RefreshToken
 from rest_framework.permissions import IsAuthenticated
-from .sms_sender import send_sms
-import django_rq
 from rest_framework.authtoken.models import Token
+from django.conf import settings
+from .notifications import add_order_notifications, coalescing_stats
+from . import sms_guard
+from redis.exceptions import RedisError
+from django.db import transaction
+from .importer import FORMATS, import_customers
+from . import exporter
+from rest_framework.parsers import MultiPartParser
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
+import io
+import uuid
 
 
 class ObtainToken(APIView):
@@ -38,35 +73,158 @@ class ObtainToken(APIView):
         user = request.user
         token, _ = Token.objects.get_or_create(user=user)
         return Response({'token': token.key}, status=200)
-    
 
+    @handle_exceptions
+    def post(self, request):
+        """
+        Handles POST request to replace the token of the
+        authenticated user with a new one.
+
+        Returns:
+            Response: A JSON response containing the new
+            token key with a status code of 201.
+        """
+        with transaction.atomic():
+            Token.objects.filter(user=request.user).delete()
+            token = Token.objects.create(user=request.user)
+        return Response({'token': token.key}, status=201)
+
+    @handle_exceptions
+    def delete(self, request):
+        """
+        Handles DELETE request to revoke the token of the
+        authenticated user.
+
+        Returns:
+            Response: An empty response with a status code of 204.
+        """
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=204)
 
-class CustomerListView(ListAPIView):
+
+class RevokeJwtView(APIView):
+    """
+    Revokes a JWT refresh token and, when the request is authenticated
+    with one, the access token it carries.
+    """
+    authentication_classes = [JWTStatelessUserAuthentication]
+    # holding the refresh token is what allows revoking it
+    permission_classes = []
+
+    @handle_exceptions
+    def post(self, request: HttpRequest) -> Response:
+        """
+        Handles POST request with the refresh token to revoke.
+
+        Args:
+            request: The HTTP request object, with the refresh token.
+
+        Returns:
+            An empty Response with a status code of 204, or 400 if the
+            refresh token is invalid, expired or already revoked.
+        """
+        try:
+            refresh = RefreshToken(request.data.get('refresh', ''))
+        except TokenError as error:
+            return Response({'error': str(error)}, 400)
+        refresh.revoke()
+        if isinstance(request.auth, AccessToken):
+            request.auth.revoke()
+        return Response(status=204)
+
+
+class MetricsView(APIView):
+    """
+    Reports counters used to monitor the API.
+    """
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: HttpRequest) -> Response:
+        """
+        Returns the current value of the monitoring counters.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            A Response object with the counters grouped by component.
+        """
+        try:
+            detail_cache = customer_detail_stats()
+        except RedisError as error:
+            detail_cache = {'error': str(error)}
+        try:
+            sms = sms_guard.status()
+            coalescing = coalescing_stats()
+        except RedisError as error:
+            sms = coalescing = {'error': str(error)}
+        return Response({
+            'customer_detail_cache': detail_cache,
+            'sms_gateway': sms,
+            'sms_coalescing': coalescing,
+        })
+
+
+class CustomerListView(ConditionalListMixin, ListAPIView):
     """
     A view that returns a list of all customers. Pagination is added
 
     This view retrieves all customer objects from the database and serializes
-    them using CustomerSerialiser.
+    them using CustomerSerialiser. Pass ?pagination=cursor to page with
+    cursor tokens instead of page numbers.
     """
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    replica_reads = True
+    pagination_class = ListPagination
     queryset = Customer.objects.all()
     serializer_class = CustomerSerialiser
 
+    def get_etag_parts(self, instance) -> tuple:
+        parts = super().get_etag_parts(instance)
+        if include_aggregates(self.request):
+            # the aggregates change without touching updated_at
+            parts += tuple(
+                getattr(instance, field) for field in AGGREGATE_FIELDS)
+        return parts
+
 
-class OrderListView(ListAPIView):
+class OrderListView(ConditionalListMixin, ListAPIView):
     """
     A view that returns a list of all orders. With pagination
 
     This view retrieves all order objects
     from the database and serializes them using OrderSerialiser.
+    Pass ?pagination=cursor to page with cursor tokens instead of
+    page numbers.
     """
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'GET': 'order-reads'}
+    replica_reads = True
+    pagination_class = ListPagination
 
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('customer')
     serializer_class = OrderSerialiser
 
+    def get_queryset(self):
+        if sharding.sharded():
+            # merged from every shard; customers are read from default
+            return sharding.scatter(
+                Order.objects.all()).prefetch_related('customer')
+        return super().get_queryset()
+
+    def get_etag_parts(self, instance) -> tuple:
+        return (
+            instance.pk, instance.updated_at, instance.customer.updated_at)
+
 
 class CustomerView(APIView):
     """
@@ -76,8 +234,11 @@ class CustomerView(APIView):
     and deleting Customer objects.
     """
 
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    replica_reads = True
 
     @handle_exceptions
     def get(self, request: HttpRequest, customer_id: str) -> Response:
@@ -90,18 +251,33 @@ class CustomerView(APIView):
 
         Returns:
             A Response object containing the serialized data
-            of the specified customer include.
-        """
-        customer = get_object_or_404(
-            Customer.objects.prefetch_related('orders'),
-            id=customer_id)
-        customer_info = {
-            'Customer_details': CustomerSerialiser(customer).data,
-            'orders': customer.orders.all().values(
-                'created_at',
-                'item',
-                'amount')}
-        return Response(customer_info)
+            of the specified customer include. Pass ?include=aggregates
+            to add the customer's order aggregates.
+        """
+        with_aggregates = include_aggregates(request)
+        variant = 'detail-aggregates' if with_aggregates else 'detail'
+        version = customer_version(customer_id)
+        etag, last_modified = customer_validators(
+            customer_id, version, f'customer-{variant}')
+        if (response := not_modified(
+                request, etag, last_modified)) is not None:
+            return response
+
+        customer_info = get_customer_detail(customer_id, version, variant)
+        if customer_info is None:
+            # cached under the current version, so it must be read from
+            # a database that has the change behind it
+            with primary_if_recent(last_modified):
+                customer = get_object_or_404(Customer, id=customer_id)
+                customer_info = {
+                    'Customer_details': CustomerSerialiser(
+                        customer, aggregates=with_aggregates).data,
+                    'orders': list(customer.orders.all().values(
+                        'created_at',
+                        'item',
+                        'amount'))}
+            set_customer_detail(customer.id, version, customer_info, variant)
+        return set_validators(Response(customer_info), etag, last_modified)
 
     def post(self, request: HttpRequest,) -> Response:
         """
@@ -166,6 +342,111 @@ class CustomerView(APIView):
         return Response(f'Successfully  deleted {name.upper}')
 
 
+class CustomerImportView(APIView):
+    """
+    Imports customers from an uploaded CSV or NDJSON file.
+    """
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    @handle_exceptions
+    def post(self, request: HttpRequest) -> Response:
+        """
+        Imports the customers in the uploaded file.
+
+        Args:
+            request: The HTTP request object with the file in the
+            'file' field and optionally 'format' set to csv or ndjson.
+            Pass 'update_existing' to update the names of customers
+            that already exist.
+
+        Returns:
+            A Response object with the import report.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response('Please upload a file', 400)
+        fmt = request.data.get('format')
+        if fmt is None:
+            fmt = 'ndjson' if upload.name.endswith(
+                ('.ndjson', '.jsonl')) else 'csv'
+        if fmt not in FORMATS:
+            return Response(f'format must be one of {", ".join(FORMATS)}', 400)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        report = import_customers(
+            stream, fmt,
+            update_existing=request.data.get('update_existing') in (
+                '1', 'true', 'True', 'on'))
+        return Response(report.as_dict(), 201 if report.created else 200)
+
+
+class OrderExportView(APIView):
+    """
+    Streams orders with their customer as NDJSON or CSV.
+    """
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_scopes = {'GET': 'order-reads'}
+
+    @handle_exceptions
+    def get(self, request: HttpRequest) -> StreamingHttpResponse:
+        """
+        Streams the orders matching the query parameters.
+
+        Args:
+            request: The HTTP request object. Optional query parameters
+            are output (ndjson or csv, default ndjson), customer_id,
+            created_after and created_before (ISO dates or datetimes).
+
+        Returns:
+            A StreamingHttpResponse with one order per line, or a
+            Response with an error message.
+        """
+        params = request.query_params
+        output = params.get('output', 'ndjson')
+        if output not in exporter.RENDERERS:
+            return Response('output must be ndjson or csv', 400)
+
+        filters = {}
+        if customer_id := params.get('customer_id'):
+            filters['customer_id'] = uuid.UUID(customer_id)
+        for name in ('created_after', 'created_before'):
+            if value := params.get(name):
+                filters[name] = self.parse_time(name, value)
+
+        rows = exporter.export_rows(**filters)
+        response = StreamingHttpResponse(
+            exporter.RENDERERS[output](rows),
+            content_type=exporter.CONTENT_TYPES[output])
+        response['Content-Disposition'] = (
+            f'attachment; filename="orders.{output}"')
+        return response
+
+    def parse_time(self, name: str, value: str) -> datetime:
+        """
+        Parses an ISO date or datetime query parameter; dates mean
+        midnight in the current time zone.
+
+        Raises:
+            ValueError: If the value is neither.
+        """
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f'{name} must be an ISO date or datetime')
+            moment = datetime.combine(day, time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+
 class OrderView(APIView):
     """
     Handles HTTP requests related to Order objects.
@@ -173,8 +454,14 @@ class OrderView(APIView):
     Includes methods for retrieving, creating, updating,
     and deleting Order objects.
     """
-    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {
+        'POST': 'order-writes', 'PUT': 'order-writes',
+        'DELETE': 'order-writes'}
+    replica_reads = True
 
     @handle_exceptions
     def get(self, request: HttpRequest) -> Response:
@@ -193,17 +480,36 @@ class OrderView(APIView):
         many = False
 
         if order_id := request.query_params.get('order_id'):
-            orders = get_object_or_404(Order, id=order_id)
+            orders = get_order_or_404(order_id)
+            last_modified = max(
+                orders.updated_at, orders.customer.updated_at)
+            etag = make_etag(
+                'order', orders.pk,
+                orders.updated_at, orders.customer.updated_at)
+            if (response := not_modified(
+                    request, etag, last_modified)) is not None:
+                return response
 
         elif customer_id := request.query_params.get('customer_id'):
-            customer = get_object_or_404(
-                Customer.objects.prefetch_related('orders'), id=customer_id)
-            orders = customer.orders.all()
+            etag, last_modified = customer_validators(
+                customer_id, customer_version(customer_id), 'orders')
+            if (response := not_modified(
+                    request, etag, last_modified)) is not None:
+                return response
+            # the ETag names the current version, so the orders must be
+            # read from a database that has the change behind it
+            with primary_if_recent(last_modified):
+                customer = get_object_or_404(Customer, id=customer_id)
+                # the related manager hands the customer to every order,
+                # so serialising the nested customer costs no extra queries
+                orders = list(customer.orders.all())
             many = True
         else:
             return Response('Please pass customer_id or order_id', 400)
 
-        return Response(self.serialize_orders(orders, many))
+        return set_validators(
+            Response(self.serialize_orders(orders, many)),
+            etag, last_modified)
 
     def serialize_orders(self, orders, many=False):
         return OrderSerialiser(orders, many=many).data
@@ -226,13 +532,12 @@ class OrderView(APIView):
         amount = request.data.get('amount')
 
         customer = get_object_or_404(Customer, id=customer_id)
-        data = {'customer_id': customer_id, 'item': item, 'amount': amount}
-
-        order = Order.objects.create(**data)
+        data = {'customer': customer, 'item': item, 'amount': amount}
 
-        django_rq.enqueue(
-            send_sms, customer.phone_number, {
-                'item': item, 'amount': amount})
+        with sharding.atomic(customer.id):
+            order = Order.objects.create(**data)
+            aggregates.orders_added([order])
+            add_order_notifications([order])
         return Response(OrderSerialiser(order).data, 201)
 
     @handle_exceptions
@@ -251,11 +556,14 @@ class OrderView(APIView):
             of the updated Order or error messages.
         """
 
-        order = get_object_or_404(Order, id=order_id)
+        order = get_order_or_404(order_id)
+        previous_amount = order.amount
         serialiser = OrderSerialiser(
             order, data=request.data, partial=True)
         if serialiser.is_valid():
-            serialiser.save()
+            with sharding.atomic(order.customer_id):
+                serialiser.save()
+                aggregates.order_amount_changed(order, previous_amount)
             return Response(serialiser.data)
         return Response(serialiser.errors, 400)
 
@@ -273,7 +581,81 @@ class OrderView(APIView):
             indicating the deletion of the Order.
         """
 
-        order = get_object_or_404(Order, id=order_id)
+        order = get_order_or_404(order_id)
         order_name = str(order)
-        order.delete()
+        with sharding.atomic(order.customer_id):
+            order.delete()
+            aggregates.order_removed(order)
         return Response(f'{order_name} Successfully deleted')
+
+
+class BulkOrderView(APIView):
+    """
+    Creates many orders in one request.
+
+    All referenced customers are fetched in one query, and the valid
+    orders and their SMS notifications are written with one bulk INSERT
+    each.
+    """
+    authentication_classes = [
+        SessionAuthentication, CachedTokenAuthentication,
+        JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_scopes = {'POST': 'order-writes'}
+
+    @handle_exceptions
+    def post(self, request: HttpRequest) -> Response:
+        """
+        Creates the orders listed in the HTTP request.
+
+        Args:
+            request: The HTTP request object whose body is a list of
+            orders, each with a customer_id, item and amount.
+
+        Returns:
+            A Response object with the serialized created orders and
+            the errors of the rejected ones by their index in the list.
+            The status is 201 when at least one order was created and
+            400 otherwise.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response('Please pass a list of orders', 400)
+        if len(items) > settings.BULK_ORDER_MAX_ITEMS:
+            return Response(
+                f'Please pass at most {settings.BULK_ORDER_MAX_ITEMS} orders',
+                400)
+
+        serialisers = [BulkOrderItemSerialiser(data=item) for item in items]
+        customer_ids = {
+            serialiser.validated_data['customer_id']
+            for serialiser in serialisers if serialiser.is_valid()}
+        customers = Customer.objects.in_bulk(customer_ids)
+
+        orders, errors = [], []
+        for index, serialiser in enumerate(serialisers):
+            if not serialiser.is_valid():
+                errors.append({'index': index, 'errors': serialiser.errors})
+                continue
+            data = serialiser.validated_data
+            customer = customers.get(data['customer_id'])
+            if customer is None:
+                errors.append({'index': index, 'errors': {
+                    'customer_id': ['No Customer matches the given query.']}})
+                continue
+            orders.append(Order(
+                customer=customer, item=data['item'], amount=data['amount']))
+
+        if orders:
+            with sharding.atomic(*{order.customer_id for order in orders}):
+                Order.objects.bulk_create(orders)
+                aggregates.orders_added(orders)
+                add_order_notifications(orders)
+            # bulk_create sends no post_save signals
+            for customer_id in {order.customer_id for order in orders}:
+                invalidate_customer(customer_id)
+
+        return Response({
+            'created': OrderSerialiser(orders, many=True).data,
+            'errors': errors,
+        }, 201 if orders else 400)
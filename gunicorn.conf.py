@@ -0,0 +1,56 @@
+'''
+Gunicorn settings, read when gunicorn starts from the project root:
+
+    gunicorn customer_orders.wsgi
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn customer_orders.asgi
+
+WORKERS (or WEB_CONCURRENCY) worker processes, one unless set, each
+with GUNICORN_THREADS threads (sync workers only). With
+DB_MAX_CONNECTIONS, the number of database connections the web servers
+may use, and no DB_POOL_SIZE, each worker gets a connection pool of its
+share of them.
+
+DB_CONN_MAX_AGE must be 0 under the uvicorn (ASGI) worker class. There
+Django runs each request's database work on a thread pool, and the end
+of a request does not close the connections those threads keep, so
+persistent connections pile up until the database refuses new ones. It
+defaults to 0 with that worker class; use DB_POOL_SIZE to reuse
+connections instead.
+'''
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(
+    os.environ.get('WORKERS') or os.environ.get('WEB_CONCURRENCY') or 1)
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+asgi = 'uvicorn' in worker_class.lower()
+
+if asgi:
+    # read by the settings when each worker loads the application
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+if os.environ.get('DB_MAX_CONNECTIONS') and not os.environ.get('DB_POOL_SIZE'):
+    # read by the settings when each worker loads the application
+    os.environ['DB_POOL_SIZE'] = str(
+        max(1, int(os.environ['DB_MAX_CONNECTIONS']) // workers))
+
+
+def when_ready(server):
+    if asgi and int(os.environ['DB_CONN_MAX_AGE']):
+        server.log.warning(
+            'DB_CONN_MAX_AGE must be 0 under %s: persistent connections '
+            'are not closed after ASGI requests', worker_class)
+    pool_size = int(os.environ.get('DB_POOL_SIZE', 0))
+    if pool_size:
+        server.log.info(
+            'Database connections: up to %d, a pool of %d per worker',
+            workers * pool_size, pool_size)
+    elif worker_class in ('sync', 'gthread'):
+        server.log.info(
+            'Database connections: up to %d, one per thread',
+            workers * threads)
+    else:
+        server.log.info(
+            'Database connections: one per request, unbounded; set '
+            'DB_POOL_SIZE or DB_MAX_CONNECTIONS to limit them')